@@ -4,7 +4,7 @@ import logging
 from azure.cosmos.exceptions import CosmosHttpResponseError
 from azure.functions import HttpRequest, HttpResponse
 from utils import create_error_response, get_quizzes_container, get_user_container
-from utils.gpt import answer_quiz
+from utils.gpt import answer_quiz, get_route_metrics, get_scheduler_metrics
 from datetime import datetime
 
 # Proxy to CosmosDB
@@ -94,6 +94,8 @@ def main(req: HttpRequest) -> HttpResponse:
     # Answer quiz using GPT
     try:
         correct_answers = answer_quiz(answer_body)
+        logging.info("OpenAI scheduler: %s", get_scheduler_metrics())
+        logging.info("Model routes: %s", get_route_metrics())
 
         current_scores = quiz.get("scores", [])
 
@@ -0,0 +1,232 @@
+"""
+Measures the per-call latency of OpenAI requests with a new client per call, as the
+message functions originally did, against the shared pooled client from
+utils.gpt.get_async_openai_client.
+
+Run from the azure folder:
+
+    python -m benchmarks.client_reuse_benchmark --calls 50 --concurrency 4 --handshake-ms 60
+
+No OpenAI account is needed. Both modes send real HTTPS requests through the openai SDK to
+a local stand-in for the chat completions endpoint, with a self-signed certificate, so
+every new connection pays a real TLS handshake. A local handshake is much faster than one
+to a remote endpoint, so the stand-in also holds the first request on every connection
+for --handshake-ms, roughly the extra round trips of TCP and TLS. Each response takes
+--latency-ms. The number of connections each mode opened is reported with its latencies.
+"""
+
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import os
+import ssl
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from benchmarks.settings import use_placeholder_settings
+
+modes = ("new-client", "shared")
+messages = [
+    {"role": "system", "content": "Give me a fact."},
+    {"role": "user", "content": "Rivers"},
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50, help="calls per mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="calls in flight")
+    parser.add_argument("--latency-ms", type=float, default=50, help="time to answer a call")
+    parser.add_argument("--handshake-ms", type=float, default=60, help="added to a new connection")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cert_dir:
+        cert_file, key_file = writeCertificate(cert_dir)
+        server = StandInChatService(args.latency_ms / 1000, args.handshake_ms / 1000)
+        port = server.start(cert_file, key_file)
+
+        # Read by both clients, before utils.gpt is imported
+        os.environ["SSL_CERT_FILE"] = cert_file
+        os.environ["OpenAIBaseUrl"] = f"https://127.0.0.1:{port}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+        use_placeholder_settings()
+
+        results = []
+        for mode in modes:
+            server.connections = 0
+            start = time.perf_counter()
+            latencies = runCalls(mode, args.calls, args.concurrency)
+            results.append(
+                {
+                    "mode": mode,
+                    "calls": args.calls,
+                    "seconds": time.perf_counter() - start,
+                    "latency_p50_ms": statistics.median(latencies) * 1000,
+                    "latency_p95_ms": statistics.quantiles(latencies, n=20)[-1] * 1000,
+                    "connections": server.connections,
+                }
+            )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(
+            f"{result['mode']:<10} {result['calls']} calls  wall {result['seconds']:6.2f}s  "
+            f"p50 {result['latency_p50_ms']:6.1f}ms  p95 {result['latency_p95_ms']:6.1f}ms  "
+            f"{result['connections']:3d} connections"
+        )
+
+
+def runCalls(mode: str, calls: int, concurrency: int) -> list[float]:
+    """
+    Sends the calls of one mode, `concurrency` at a time.
+
+    Returns:
+        list[float]: The latency of every call in seconds.
+    """
+    from openai import OpenAI
+    from utils import run_coroutine
+    from utils.gpt import get_async_openai_client
+    from utils.gpt.client import openai_base_url
+
+    def callWithNewClient(_) -> float:
+        start = time.perf_counter()
+        with OpenAI(base_url=openai_base_url, max_retries=0) as client:
+            client.chat.completions.create(model="gpt-3.5-turbo", messages=messages)
+        return time.perf_counter() - start
+
+    async def callShared(slots: asyncio.Semaphore) -> float:
+        async with slots:
+            start = time.perf_counter()
+            await get_async_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo", messages=messages
+            )
+            return time.perf_counter() - start
+
+    async def callAllShared() -> list[float]:
+        slots = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[callShared(slots) for _ in range(calls)])
+
+    if mode == "new-client":
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(callWithNewClient, range(calls)))
+    return run_coroutine(callAllShared())
+
+
+def writeCertificate(cert_dir: str) -> tuple[str, str]:
+    """
+    Writes a self-signed certificate for 127.0.0.1.
+
+    Returns:
+        tuple[str, str]: The paths of the certificate and of its key.
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+
+    cert_file = os.path.join(cert_dir, "cert.pem")
+    key_file = os.path.join(cert_dir, "key.pem")
+    with open(cert_file, "wb") as file:
+        file.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_file, "wb") as file:
+        file.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+    return cert_file, key_file
+
+
+class StandInChatService:
+    """
+    A local HTTPS stand-in for the chat completions endpoint. It runs on its own event loop
+    in a background thread and counts the connections it accepts.
+    """
+
+    def __init__(self, latency: float, handshake: float):
+        self.latency = latency
+        self.handshake = handshake
+        self.connections = 0
+        self._seen = weakref.WeakSet()
+
+    def start(self, cert_file: str, key_file: str) -> int:
+        """
+        Starts the service on a free local port.
+
+        Returns:
+            int: The port.
+        """
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(cert_file, key_file)
+
+        loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.complete)
+        runner = web.AppRunner(app, access_log=None)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0, ssl_context=ssl_context)
+        loop.run_until_complete(site.start())
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        return runner.addresses[0][1]
+
+    async def complete(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if request.transport not in self._seen:
+            # The round trips a remote endpoint needs for a new connection
+            self._seen.add(request.transport)
+            self.connections += 1
+            await asyncio.sleep(self.handshake)
+        await asyncio.sleep(self.latency)
+
+        return web.json_response(
+            {
+                "id": f"chatcmpl-{uuid.uuid4()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "Rivers flow downhill."},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 12, "completion_tokens": 4, "total_tokens": 16},
+            }
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Compares extracting documents in memory, as convert_buffer_to_text does, with the original
+path that wrote each download to a temporary file and reopened it from disk. Each mode runs
+in a fresh process, so its peak RSS isn't affected by the other, and the wall time, peak
+RSS above the loaded corpus and bytes written to disk are reported per mode.
+
+Run from the azure folder:
+
+    python -m benchmarks.extraction_benchmark --scale 2 --repeats 3
+
+DOCX and PPTX files go through textract in the temporary file mode when it is installed,
+as they originally did, otherwise through the native extractor reading the file back from
+disk.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.memory import peak_rss
+from benchmarks.settings import use_placeholder_settings
+from benchmarks.synthetic_documents import extensions, make_corpus
+
+modes = ("temp-file", "in-memory")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="multiplies the document lengths")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        corpus = []
+        for name, mime, data in make_corpus(args.seed, args.scale):
+            path = os.path.join(corpus_dir, name)
+            with open(path, "wb") as file:
+                file.write(data)
+            corpus.append((path, mime))
+
+        results = []
+        for mode in modes:
+            runs = []
+            for _ in range(args.repeats):
+                # A fresh interpreter per run, so each peak RSS is its own
+                with ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                ) as executor:
+                    runs.append(executor.submit(runExtraction, mode, corpus).result())
+            results.append(summarise(mode, runs))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(
+            f"{result['mode']:<10} wall p50 {result['seconds_p50']:6.2f}s  "
+            f"peak RSS +{result['peak_rss_mb']:6.1f}MB  "
+            f"disk writes {result['disk_mb']:6.1f}MB  chars {result['chars']}"
+        )
+        for mime, seconds in result["seconds_by_type"].items():
+            print(f"    {extensions[mime]:<5} {seconds:6.2f}s")
+
+
+def runExtraction(mode: str, corpus: list[tuple[str, str]]) -> dict:
+    """
+    Extracts the whole corpus in one mode. Runs in its own process.
+    """
+    use_placeholder_settings()
+    from utils.files import convert_buffer_to_text
+
+    # The downloaded bytes are in memory in both modes
+    documents = []
+    for path, mime in corpus:
+        with open(path, "rb") as file:
+            documents.append((mime, file.read()))
+    peak_before = peak_rss()
+
+    seconds_by_type = {}
+    disk_bytes = 0
+    chars = 0
+    start = time.perf_counter()
+    for mime, data in documents:
+        document_start = time.perf_counter()
+        if mode == "in-memory":
+            text = convert_buffer_to_text(data, mime)
+        else:
+            text = extractThroughTempFile(data, mime)
+            disk_bytes += len(data)
+        seconds_by_type[mime] = (
+            seconds_by_type.get(mime, 0.0) + time.perf_counter() - document_start
+        )
+        chars += len(text)
+
+    return {
+        "seconds": time.perf_counter() - start,
+        "seconds_by_type": seconds_by_type,
+        "peak_rss": peak_rss() - peak_before,
+        "disk_bytes": disk_bytes,
+        "chars": chars,
+    }
+
+
+def extractThroughTempFile(data: bytes, mime: str) -> str:
+    """
+    The original extraction: write the download to a temporary file and open it by path.
+    """
+    import fitz
+    from utils.files import clean_text
+    from utils.files.office_xml import iter_docx_paragraphs, iter_pptx_slides
+
+    with tempfile.NamedTemporaryFile(suffix="." + extensions[mime], delete=False) as temp_file:
+        temp_file.write(data)
+    try:
+        if mime == "application/pdf":
+            pdf_document = fitz.open(temp_file.name)
+            text = "".join(page.get_text() for page in pdf_document)
+            pdf_document.close()
+        else:
+            try:
+                import textract
+
+                text = textract.process(temp_file.name).decode("utf-8")
+            except ImportError:
+                with open(temp_file.name, "rb") as file:
+                    if extensions[mime] == "docx":
+                        text = "\n".join(iter_docx_paragraphs(file))
+                    else:
+                        text = "\n".join("\n".join(slide) for slide in iter_pptx_slides(file))
+        return clean_text(text)
+    finally:
+        os.remove(temp_file.name)
+
+
+def summarise(mode: str, runs: list[dict]) -> dict:
+    """
+    Combines the runs of a mode.
+    """
+    mimes = runs[0]["seconds_by_type"]
+    return {
+        "mode": mode,
+        "runs": len(runs),
+        "seconds_p50": statistics.median(run["seconds"] for run in runs),
+        "seconds_by_type": {
+            mime: statistics.median(run["seconds_by_type"][mime] for run in runs) for mime in mimes
+        },
+        "peak_rss_mb": max(run["peak_rss"] for run in runs) / 2**20,
+        "disk_mb": runs[0]["disk_bytes"] / 2**20,
+        "chars": runs[0]["chars"],
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Measures how long createFillBlanksQuestions takes to turn facts into fill-gaps questions in
+each of its modes: one request per fact one after another, one request for all the facts,
+and one request per fact with up to FillGapsConcurrency in flight.
+
+Run from the azure folder:
+
+    python -m benchmarks.fill_gaps_benchmark --facts 5 10 --repeats 10 --latency-ms 800
+
+No OpenAI account is needed: every request is answered by the deterministic fake backend
+after --latency-ms, drawn from --latency, plus --ms-per-token for every token of the
+answer, since a model writes one option set after another and a batch of them takes that
+much longer to come back. The response cache is turned off and the scheduler's rate limits
+are lifted, so every mode reaches the backend for every fact. The number of requests each
+mode sent is reported with its latencies; in batched mode it includes the retries of facts
+the batch had no valid options for.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import statistics
+import time
+
+from benchmarks.settings import use_placeholder_settings
+
+topics = ("cells", "rivers", "markets", "volcanoes", "engines", "languages")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--facts", type=int, nargs="+", default=[5, 10], help="facts per call")
+    parser.add_argument("--repeats", type=int, default=10, help="calls per mode and size")
+    parser.add_argument("--latency", default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--ms-per-token", type=float, default=30, help="added per answer token")
+    parser.add_argument("--malformed-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    use_placeholder_settings()
+    os.environ["ResponseCache"] = "false"
+    os.environ["OpenAIRequestsPerMinute"] = str(10**9)
+    os.environ["OpenAITokensPerMinute"] = str(10**12)
+
+    # Imported once the settings are in place
+    from utils import run_coroutine
+    from utils.gpt import close_scheduler, set_llm_backend
+    from utils.gpt.fake_backend import FakeBackend
+
+    create_quiz = importlib.import_module("utils.gpt.create_quiz")
+
+    class TokenPacedBackend(FakeBackend):
+        async def create_chat_completion(self, **kwargs):
+            completion = await super().create_chat_completion(**kwargs)
+            # The prompts of createFillBlanksQuestions aren't streamed
+            delay = completion.usage.completion_tokens * args.ms_per_token / 1000
+            await asyncio.sleep(delay)
+            with self._lock:
+                self.stats["latency_seconds"] += delay
+            return completion
+
+    backend = TokenPacedBackend(
+        seed=args.seed,
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        malformed_rate=args.malformed_rate,
+    )
+    set_llm_backend(backend)
+
+    results = []
+    for num_facts in args.facts:
+        for mode in create_quiz.fill_gaps_modes:
+            latencies = []
+            requests = 0
+            questions = 0
+            for repeat in range(args.repeats):
+                facts = sourceFacts(random.Random(f"{args.seed}:{num_facts}:{repeat}"), num_facts)
+                before = backend.stats["requests"]
+                start = time.perf_counter()
+                created = run_coroutine(create_quiz.createFillBlanksQuestions(facts, mode=mode))
+                latencies.append(time.perf_counter() - start)
+                requests += backend.stats["requests"] - before
+                questions += len(created)
+            results.append(
+                {
+                    "mode": mode,
+                    "facts": num_facts,
+                    "runs": args.repeats,
+                    "latency_p50_ms": statistics.median(latencies) * 1000,
+                    "latency_p95_ms": percentile95(latencies) * 1000,
+                    "requests_per_run": requests / args.repeats,
+                    "questions_per_run": questions / args.repeats,
+                }
+            )
+
+    # The scheduler's dispatcher lives as long as the worker, stop it before the loop goes away
+    run_coroutine(close_scheduler())
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(
+            f"{result['mode']:<10} {result['facts']:3d} facts  "
+            f"p50 {result['latency_p50_ms']:7.1f}ms  p95 {result['latency_p95_ms']:7.1f}ms  "
+            f"{result['requests_per_run']:5.1f} requests  "
+            f"{result['questions_per_run']:5.1f} questions"
+        )
+
+
+def percentile95(values: list[float]) -> float:
+    """
+    The 95th percentile of the values, or the only value when there is just one.
+    """
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=20)[-1]
+
+
+def sourceFacts(rng: random.Random, count: int) -> list[str]:
+    """
+    Makes reproducible facts about a random topic.
+    """
+    topic = rng.choice(topics)
+    vocabulary = [
+        "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(4, 10))) for _ in range(200)
+    ]
+    return [
+        f"The {topic} " + " ".join(rng.choices(vocabulary, k=rng.randint(8, 16))) + "."
+        for _ in range(count)
+    ]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import resource
+import sys
+
+
+def peak_rss() -> int:
+    """
+    Returns the peak resident set size of the current process in bytes.
+
+    Returns:
+        int: The peak RSS.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,105 @@
+"""
+Measures the throughput of the text normaliser used by clean_text against the original
+two-pass clean_text, which rebuilt its pattern on every call. Each input is cleaned whole
+and, as convert_buffer_to_text does, one page-sized section at a time.
+
+Run from the azure folder:
+
+    python -m benchmarks.normaliser_benchmark --sizes-mb 1 10 50
+"""
+
+import argparse
+import json
+import random
+import re
+import statistics
+import string
+import time
+
+from benchmarks.settings import use_placeholder_settings
+from benchmarks.synthetic_documents import sentences
+
+# Characters of text in a page-sized section
+section_chars = 3000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeats", type=int, default=3, help="runs per size and mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    use_placeholder_settings()
+    from utils.files.clean_text import get_normaliser
+
+    modes = {
+        "original": originalCleanText,
+        "ascii": get_normaliser(keep_unicode=False).normalise,
+        "unicode": get_normaliser(keep_unicode=True).normalise,
+    }
+
+    results = []
+    for size_mb in args.sizes_mb:
+        text = rawText(random.Random(args.seed), size_mb * 2**20)
+        sections = [
+            text[start : start + section_chars] for start in range(0, len(text), section_chars)
+        ]
+        for mode, clean in modes.items():
+            for granularity in ("whole", "sections"):
+                runs = []
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    if granularity == "whole":
+                        clean(text)
+                    else:
+                        for section in sections:
+                            clean(section)
+                    runs.append(time.perf_counter() - start)
+
+                seconds = statistics.median(runs)
+                results.append(
+                    {
+                        "size_mb": size_mb,
+                        "mode": mode,
+                        "granularity": granularity,
+                        "seconds_p50": seconds,
+                        "mb_per_second": size_mb / seconds,
+                    }
+                )
+                if not args.json:
+                    print(
+                        f"{size_mb:>4}MB {mode:<9} {granularity:<9} "
+                        f"p50 {seconds:7.3f}s  {size_mb / seconds:7.1f}MB/s"
+                    )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+def originalCleanText(raw_text: str) -> str:
+    # clean_text before the normaliser, kept here as the baseline
+    cleaned_text = re.sub(r"[^a-zA-Z0-9\s" + re.escape(string.punctuation) + "]", "", raw_text)
+    cleaned_text = re.sub(r"\s+", " ", cleaned_text)
+    return cleaned_text.strip()
+
+
+def rawText(rng: random.Random, size: int) -> str:
+    """
+    Makes extracted-looking text of about `size` characters: sentences with accented
+    letters, runs of whitespace, line breaks and bullet characters.
+    """
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraph = "  ".join(sentences(rng, rng.randint(2, 8))) + rng.choice(
+            ["\n", "\n\n", " • ", "\t\n"]
+        )
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return "".join(paragraphs)[:size]
+
+
+if __name__ == "__main__":
+    main()
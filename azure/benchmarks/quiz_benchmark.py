@@ -0,0 +1,236 @@
+"""
+Benchmarks quiz generation and grading against the deterministic fake LLM backend, so it
+needs no network access and costs nothing. Every mix of question types is run at every
+quiz size, and for each run it reports the end-to-end latency, the number of requests, how
+many of them were in flight on average, the malformed objects the fake injected and what
+create_quiz discarded and topped up because of them. At the end it reports the latency,
+tokens and estimated cost of each model route.
+
+Run from the azure folder:
+
+    python -m benchmarks.quiz_benchmark --sizes 3 10 30 --latency-ms 800 --malformed-rate 0.05
+
+Settings that are read when utils is imported get placeholder values if they aren't set;
+nothing connects to Azure. The response cache and the question bank are turned off, so
+every prompt reaches the backend, and the scheduler's rate limits are lifted unless given,
+so the results show the pipeline rather than the account's limits.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import time
+
+from benchmarks.settings import use_placeholder_settings
+
+topics = ("cells", "rivers", "markets", "volcanoes", "engines", "languages")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 10, 30])
+    parser.add_argument("--repeats", type=int, default=3, help="runs per mix and size")
+    parser.add_argument("--latency", default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--malformed-rate", type=float, default=0.05)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=10**9)
+    parser.add_argument("--tokens-per-minute", type=int, default=10**12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--text-words", type=int, default=3000, help="words of source text")
+    parser.add_argument("--no-grading", action="store_true", help="only generate quizzes")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    use_placeholder_settings()
+    os.environ["ResponseCache"] = "false"
+    os.environ["OpenAIRequestsPerMinute"] = str(args.requests_per_minute)
+    os.environ["OpenAITokensPerMinute"] = str(args.tokens_per_minute)
+    os.environ.pop("QuestionBankContainer", None)
+
+    # Imported once the settings are in place
+    from utils import run_coroutine
+    from utils.gpt import (
+        answer_quiz,
+        close_scheduler,
+        create_quiz,
+        get_route_metrics,
+        set_llm_backend,
+    )
+    from utils.gpt.fake_backend import FakeBackend
+    from utils.validate_quiz_settings import question_type_options
+
+    backend = FakeBackend(
+        seed=args.seed,
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        malformed_rate=args.malformed_rate,
+        rate_limit_rate=args.rate_limit_rate,
+    )
+    set_llm_backend(backend)
+
+    mixes = [
+        list(mix)
+        for size in range(1, len(question_type_options) + 1)
+        for mix in itertools.combinations(question_type_options, size)
+    ]
+
+    results = []
+    for mix, num_questions in itertools.product(mixes, args.sizes):
+        runs = []
+        for repeat in range(args.repeats):
+            rng = random.Random(f"{args.seed}:{'+'.join(mix)}:{num_questions}:{repeat}")
+            topic = rng.choice(topics)
+            text = sourceText(rng, topic, args.text_words)
+            runs.append(
+                runScenario(
+                    backend, create_quiz, answer_quiz, mix, num_questions, topic, text, args
+                )
+            )
+        results.append(summarise(mix, num_questions, runs))
+        if not args.json:
+            printSummary(results[-1])
+
+    # The scheduler's dispatcher lives as long as the worker, stop it before the loop goes away
+    run_coroutine(close_scheduler())
+
+    if args.json:
+        print(json.dumps({"scenarios": results, "routes": get_route_metrics()}, indent=2))
+    else:
+        printRoutes(get_route_metrics())
+
+
+def runScenario(backend, create_quiz, answer_quiz, mix, num_questions, topic, text, args):
+    """
+    Generates (and grades) one quiz, returning its measurements.
+    """
+    before = dict(backend.stats)
+    report = {}
+    questions = []
+    generation_error = None
+    start = time.perf_counter()
+    try:
+        questions = create_quiz(num_questions, mix, topic, text, fresh=True, report=report)
+    except Exception as e:
+        generation_error = type(e).__name__
+    generation_seconds = time.perf_counter() - start
+
+    grading_seconds = None
+    grading_error = None
+    if not args.no_grading and questions:
+        # Half of the answers are right
+        answer_body = [
+            {
+                "question_id": question["question_id"],
+                "question": question["question"],
+                "user_answer": (
+                    question.get("correct_answer", "")
+                    if question["question_id"] % 2
+                    else "not the answer"
+                ),
+                "type": question["type"],
+                "correct_answer": question.get("correct_answer", ""),
+            }
+            | ({"options": question["options"]} if question["type"] == "multi-choice" else {})
+            for question in questions
+        ]
+        start = time.perf_counter()
+        try:
+            answer_quiz(answer_body)
+        except Exception as e:
+            grading_error = type(e).__name__
+        grading_seconds = time.perf_counter() - start
+
+    stats = {name: backend.stats[name] - before[name] for name in backend.stats}
+    return {
+        "generation_seconds": generation_seconds,
+        "generation_error": generation_error,
+        "grading_seconds": grading_seconds,
+        "grading_error": grading_error,
+        "questions": len(questions),
+        "report": report,
+        "backend": stats,
+    }
+
+
+def summarise(mix, num_questions, runs) -> dict:
+    """
+    Combines the runs of a scenario.
+    """
+    generation = [run["generation_seconds"] for run in runs]
+    grading = [run["grading_seconds"] for run in runs if run["grading_seconds"] is not None]
+    busy = sum(run["backend"]["latency_seconds"] for run in runs)
+    elapsed = sum(generation) + sum(grading)
+
+    discarded = {}
+    for run in runs:
+        for reason, count in run["report"].get("discarded", {}).items():
+            discarded[reason] = discarded.get(reason, 0) + count
+
+    return {
+        "question_types": mix,
+        "num_questions": num_questions,
+        "runs": len(runs),
+        "generation_p50": statistics.median(generation),
+        "generation_max": max(generation),
+        "grading_p50": statistics.median(grading) if grading else None,
+        "generation_errors": sum(run["generation_error"] is not None for run in runs),
+        "grading_errors": sum(run["grading_error"] is not None for run in runs),
+        "short_quizzes": sum(run["questions"] < num_questions for run in runs),
+        "requests": sum(run["backend"]["requests"] for run in runs) / len(runs),
+        "rate_limited": sum(run["backend"]["rate_limited"] for run in runs),
+        "parallelism": busy / elapsed if elapsed else 0.0,
+        "malformed": sum(run["backend"]["malformed"] for run in runs),
+        "discarded": discarded,
+        "top_up_rounds": sum(sum(run["report"].get("top_up_rounds", {}).values()) for run in runs),
+    }
+
+
+def printSummary(summary: dict) -> None:
+    grading = summary["grading_p50"]
+    print(
+        f"{'+'.join(summary['question_types']):<36} n={summary['num_questions']:<3} "
+        f"gen p50 {summary['generation_p50']:6.2f}s max {summary['generation_max']:6.2f}s  "
+        f"grade p50 {'-' if grading is None else f'{grading:.2f}s':>6}  "
+        f"req {summary['requests']:5.1f}  par {summary['parallelism']:4.1f}  "
+        f"malformed {summary['malformed']:<3} top-ups {summary['top_up_rounds']:<3} "
+        f"short {summary['short_quizzes']} errors {summary['generation_errors']}"
+        f"/{summary['grading_errors']} "
+        f"discarded {summary['discarded']}"
+    )
+
+
+def printRoutes(routes: dict) -> None:
+    print()
+    for route, models in routes.items():
+        if route == "fallback":
+            continue
+        for model, metrics in models.items():
+            print(
+                f"{route:<17} {model:<20} calls {metrics['calls']:<5} "
+                f"errors {metrics['errors']:<3} p50 {metrics['latency_p50']:6.2f}s "
+                f"p95 {metrics['latency_p95']:6.2f}s  tokens {metrics['prompt_tokens']}"
+                f"+{metrics['completion_tokens']}  cost ${metrics['cost']:.4f}"
+            )
+    if routes["fallback"]:
+        print("On their fallback model:", ", ".join(routes["fallback"]))
+
+
+def sourceText(rng: random.Random, topic: str, num_words: int) -> str:
+    """
+    Makes reproducible source text about a topic, one paragraph per line.
+    """
+    vocabulary = [topic] + [
+        "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(4, 10))) for _ in range(400)
+    ]
+    words = rng.choices(vocabulary, k=num_words)
+    return "\n".join(
+        " ".join(words[start : start + 80]) + "." for start in range(0, len(words), 80)
+    )
+
+
+if __name__ == "__main__":
+    main()
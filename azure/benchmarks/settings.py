@@ -0,0 +1,21 @@
+"""
+Placeholder values for the settings that are read when utils is imported, so the
+benchmarks can import it without any Azure resources. Nothing connects to them.
+"""
+
+import os
+
+placeholder_settings = {
+    "AzureCosmosDBConnectionString": "AccountEndpoint=https://localhost:8081/;AccountKey=a2V5;",
+    "Database": "benchmark",
+    "AzureStorageConnectionString": "UseDevelopmentStorage=true",
+    "DocumentBlobContainer": "benchmark",
+    "DocumentQueue": "benchmark",
+    "PubSubConnectionString": "Endpoint=https://localhost;AccessKey=a2V5;Version=1.0;",
+}
+
+
+def use_placeholder_settings() -> None:
+    """Sets every placeholder setting that isn't already set."""
+    for name, value in placeholder_settings.items():
+        os.environ.setdefault(name, value)
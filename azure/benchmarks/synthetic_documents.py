@@ -0,0 +1,221 @@
+"""
+Builds reproducible synthetic PDF, DOCX and PPTX files for the benchmarks. PDFs are made
+with PyMuPDF, DOCX and PPTX files are written as minimal Office Open XML packages, so no
+extra dependencies are needed.
+"""
+
+import io
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+import fitz
+
+docx_mime = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+pptx_mime = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+pdf_mime = "application/pdf"
+extensions = {pdf_mime: "pdf", docx_mime: "docx", pptx_mime: "pptx"}
+
+word_ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+drawing_ns = "http://schemas.openxmlformats.org/drawingml/2006/main"
+presentation_ns = "http://schemas.openxmlformats.org/presentationml/2006/main"
+relationships_ns = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+package_relationships_ns = "http://schemas.openxmlformats.org/package/2006/relationships"
+slide_relationship = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide"
+
+
+def sentences(rng: random.Random, count: int, words_per_sentence: int = 14) -> list[str]:
+    """
+    Makes sentences of random lowercase words, with a few accented letters.
+
+    Args:
+        rng (random.Random): The random generator.
+        count (int): The number of sentences.
+        words_per_sentence (int, optional): Words in each sentence. Defaults to 14.
+
+    Returns:
+        list[str]: The sentences.
+    """
+    letters = "abcdefghijklmnopqrstuvwxyz" * 8 + "éàü"
+    return [
+        " ".join(
+            "".join(rng.choices(letters, k=rng.randint(3, 10))) for _ in range(words_per_sentence)
+        ).capitalize()
+        + "."
+        for _ in range(count)
+    ]
+
+
+def make_pdf(rng: random.Random, pages: int, sentences_per_page: int = 30) -> bytes:
+    """
+    Makes a PDF with a block of text on every page.
+
+    Args:
+        rng (random.Random): The random generator.
+        pages (int): The number of pages.
+        sentences_per_page (int, optional): Sentences on each page. Defaults to 30.
+
+    Returns:
+        bytes: The PDF file.
+    """
+    document = fitz.open()
+    for _ in range(pages):
+        page = document.new_page()
+        page.insert_textbox(
+            fitz.Rect(40, 40, page.rect.width - 40, page.rect.height - 40),
+            " ".join(sentences(rng, sentences_per_page)),
+            fontsize=8,
+        )
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+def make_docx(rng: random.Random, paragraphs: int) -> bytes:
+    """
+    Makes a DOCX file with one sentence or more in each paragraph.
+
+    Args:
+        rng (random.Random): The random generator.
+        paragraphs (int): The number of paragraphs.
+
+    Returns:
+        bytes: The DOCX file.
+    """
+    body = "".join(
+        f"<w:p><w:r><w:t>{escape(' '.join(sentences(rng, rng.randint(1, 4))))}</w:t></w:r></w:p>"
+        for _ in range(paragraphs)
+    )
+    return _package(
+        {
+            "[Content_Types].xml": _content_types(
+                {
+                    "/word/document.xml": "application/vnd.openxmlformats-officedocument."
+                    "wordprocessingml.document.main+xml"
+                }
+            ),
+            "_rels/.rels": _relationships(
+                {
+                    "rId1": (
+                        "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+                        "officeDocument",
+                        "word/document.xml",
+                    )
+                }
+            ),
+            "word/document.xml": f'<w:document xmlns:w="{word_ns}"><w:body>{body}</w:body>'
+            "</w:document>",
+        }
+    )
+
+
+def make_pptx(rng: random.Random, slides: int, paragraphs_per_slide: int = 6) -> bytes:
+    """
+    Makes a PPTX file with a text box of short paragraphs on every slide.
+
+    Args:
+        rng (random.Random): The random generator.
+        slides (int): The number of slides.
+        paragraphs_per_slide (int, optional): Paragraphs on each slide. Defaults to 6.
+
+    Returns:
+        bytes: The PPTX file.
+    """
+    parts = {}
+    for number in range(1, slides + 1):
+        paragraphs = "".join(
+            f"<a:p><a:r><a:t>{escape(sentence)}</a:t></a:r></a:p>"
+            for sentence in sentences(rng, paragraphs_per_slide)
+        )
+        parts[f"ppt/slides/slide{number}.xml"] = (
+            f'<p:sld xmlns:p="{presentation_ns}" xmlns:a="{drawing_ns}"><p:cSld><p:spTree>'
+            f"<p:sp><p:txBody>{paragraphs}</p:txBody></p:sp></p:spTree></p:cSld></p:sld>"
+        )
+
+    slide_ids = "".join(
+        f'<p:sldId id="{255 + number}" r:id="rId{number}"/>' for number in range(1, slides + 1)
+    )
+    return _package(
+        {
+            "[Content_Types].xml": _content_types(
+                {
+                    "/ppt/presentation.xml": "application/vnd.openxmlformats-officedocument."
+                    "presentationml.presentation.main+xml"
+                }
+            ),
+            "_rels/.rels": _relationships(
+                {
+                    "rId1": (
+                        "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+                        "officeDocument",
+                        "ppt/presentation.xml",
+                    )
+                }
+            ),
+            "ppt/presentation.xml": f'<p:presentation xmlns:p="{presentation_ns}" '
+            f'xmlns:r="{relationships_ns}"><p:sldIdLst>{slide_ids}</p:sldIdLst>'
+            "</p:presentation>",
+            "ppt/_rels/presentation.xml.rels": _relationships(
+                {
+                    f"rId{number}": (slide_relationship, f"slides/slide{number}.xml")
+                    for number in range(1, slides + 1)
+                }
+            ),
+            **parts,
+        }
+    )
+
+
+def make_corpus(seed: int = 0, scale: int = 1) -> list[tuple[str, str, bytes]]:
+    """
+    Makes a mixed corpus of small, medium and large documents of every supported type.
+
+    Args:
+        seed (int, optional): The random seed. Defaults to 0.
+        scale (int, optional): Multiplies the length of every document. Defaults to 1.
+
+    Returns:
+        list[tuple[str, str, bytes]]: The name, MIME type and contents of each document.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for size in (5, 40, 150):
+        length = size * scale
+        corpus.append((f"{length}-pages.pdf", pdf_mime, make_pdf(rng, length)))
+        corpus.append((f"{length * 20}-paragraphs.docx", docx_mime, make_docx(rng, length * 20)))
+        corpus.append((f"{length}-slides.pptx", pptx_mime, make_pptx(rng, length)))
+    return corpus
+
+
+def _package(parts: dict[str, str]) -> bytes:
+    # [Content_Types].xml goes first, file type sniffing relies on the order of the parts
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in parts.items():
+            archive.writestr(name, '<?xml version="1.0" encoding="UTF-8"?>' + content)
+    return buffer.getvalue()
+
+
+def _content_types(overrides: dict[str, str]) -> str:
+    return (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Default Extension="rels" '
+        'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        + "".join(
+            f'<Override PartName="{name}" ContentType="{content_type}"/>'
+            for name, content_type in overrides.items()
+        )
+        + "</Types>"
+    )
+
+
+def _relationships(relationships: dict[str, tuple[str, str]]) -> str:
+    return (
+        f'<Relationships xmlns="{package_relationships_ns}">'
+        + "".join(
+            f'<Relationship Id="{relationship_id}" Type="{relationship_type}" Target="{target}"/>'
+            for relationship_id, (relationship_type, target) in relationships.items()
+        )
+        + "</Relationships>"
+    )
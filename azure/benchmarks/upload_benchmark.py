@@ -0,0 +1,222 @@
+"""
+Measures the upload latency of large files: the original upload, a new AsyncBlobClient per
+file sending each file in a single Put Blob on a fresh event loop per request, against
+upload_blob_blocks, which stages blocks in parallel through the shared container client on
+the worker event loop.
+
+Run from the azure folder:
+
+    python -m benchmarks.upload_benchmark --files 3 --size-mb 30 --repeats 3
+
+No storage account is needed. Both modes talk through the real SDK to a local stand-in for
+the Blob service, which throttles every request to --connection-mbps and adds --latency-ms
+before it answers, roughly what a single connection to a storage account sees. The gain
+depends on those two settings, so set them to what the function app measures.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from xml.etree import ElementTree
+
+from aiohttp import web
+from benchmarks.settings import use_placeholder_settings
+
+modes = ("single-put", "blocks")
+account_name = "devstoreaccount1"
+container_name = "benchmark"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=3, help="files per request")
+    parser.add_argument("--size-mb", type=int, default=30, help="size of each file")
+    parser.add_argument("--repeats", type=int, default=3, help="requests per mode")
+    parser.add_argument("--latency-ms", type=float, default=20, help="added to every request")
+    parser.add_argument(
+        "--connection-mbps", type=float, default=25, help="MB/s of a single request body"
+    )
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    server = StandInBlobService(args.latency_ms / 1000, args.connection_mbps * 2**20)
+    port = server.start()
+    os.environ["AzureStorageConnectionString"] = (
+        f"DefaultEndpointsProtocol=http;AccountName={account_name};"
+        f"AccountKey={base64.b64encode(b'benchmark').decode()};"
+        f"BlobEndpoint=http://127.0.0.1:{port}/{account_name};"
+    )
+    os.environ["DocumentBlobContainer"] = container_name
+    use_placeholder_settings()
+
+    payloads = [b"%PDF-1.7\n" + os.urandom(args.size_mb * 2**20 - 9) for _ in range(args.files)]
+
+    results = []
+    for mode in modes:
+        runs = []
+        for _ in range(args.repeats):
+            server.requests = 0
+            start = time.perf_counter()
+            runRequest(mode, payloads)
+            runs.append(time.perf_counter() - start)
+        results.append(
+            {
+                "mode": mode,
+                "files": len(payloads),
+                "size_mb": args.size_mb,
+                "seconds_p50": statistics.median(runs),
+                "seconds_min": min(runs),
+                "requests_per_upload": server.requests,
+                "blobs_match": server.check(payloads),
+            }
+        )
+
+    # The shared client lives as long as the worker, close it before the loop goes away
+    from utils import get_async_document_container, run_coroutine
+
+    run_coroutine(get_async_document_container().close())
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(
+            f"{result['mode']:<10} {result['files']}x{result['size_mb']}MB  "
+            f"wall p50 {result['seconds_p50']:6.2f}s  min {result['seconds_min']:6.2f}s  "
+            f"{result['requests_per_upload']:3d} requests  "
+            f"{'ok' if result['blobs_match'] else 'MISMATCH'}"
+        )
+
+
+def runRequest(mode: str, payloads: list[bytes]) -> None:
+    """
+    Uploads the files of one request, the way upload_documents did before and does now.
+    """
+    import io
+
+    from azure.storage.blob import ContentSettings
+    from utils import get_async_blob_client, run_coroutine, upload_blob_blocks
+
+    async def uploadSinglePut(index: int, payload: bytes) -> None:
+        blob_client = get_async_blob_client(blob_name=f"upload-{index}.pdf")
+        try:
+            await blob_client.upload_blob(
+                io.BytesIO(payload),
+                length=len(payload),
+                blob_type="BlockBlob",
+                overwrite=True,
+                content_settings=ContentSettings(content_type="application/pdf"),
+            )
+        finally:
+            await blob_client.close()
+
+    async def uploadFiles() -> None:
+        if mode == "single-put":
+            await asyncio.gather(
+                *[uploadSinglePut(index, payload) for index, payload in enumerate(payloads)]
+            )
+        else:
+            await asyncio.gather(
+                *[
+                    upload_blob_blocks(
+                        f"upload-{index}.pdf", io.BytesIO(payload), len(payload), "application/pdf"
+                    )
+                    for index, payload in enumerate(payloads)
+                ]
+            )
+
+    if mode == "single-put":
+        # A fresh event loop, and so fresh connections, for every request
+        asyncio.run(uploadFiles())
+    else:
+        run_coroutine(uploadFiles())
+
+
+class StandInBlobService:
+    """
+    A local stand-in for the Blob service, handling Put Blob, Put Block and Put Block List
+    with a throttled request body. It runs on its own event loop in a background thread.
+    """
+
+    def __init__(self, latency: float, bytes_per_second: float):
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.blobs = {}
+        self.blocks = {}
+        self.requests = 0
+
+    def start(self) -> int:
+        """
+        Starts the service on a free local port.
+
+        Returns:
+            int: The port.
+        """
+        loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_put("/{account}/{container}/{blob}", self.put)
+        runner = web.AppRunner(app, access_log=None)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        loop.run_until_complete(site.start())
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        return runner.addresses[0][1]
+
+    def check(self, payloads: list[bytes]) -> bool:
+        """
+        Checks that the stored blobs are the uploaded files.
+
+        Returns:
+            bool: True if every file was stored unchanged.
+        """
+        return all(
+            self.blobs.get(f"upload-{index}.pdf") == payload
+            for index, payload in enumerate(payloads)
+        )
+
+    async def put(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        start = time.perf_counter()
+        body = bytearray()
+        async for chunk in request.content.iter_chunked(2**16):
+            body += chunk
+            # Hold the body back to the throughput of a single connection
+            behind = len(body) / self.bytes_per_second - (time.perf_counter() - start)
+            if behind > 0:
+                await asyncio.sleep(behind)
+        await asyncio.sleep(self.latency)
+
+        blob_name = request.match_info["blob"]
+        comp = request.query.get("comp")
+        if comp == "block":
+            self.blocks[(blob_name, request.query["blockid"])] = bytes(body)
+        elif comp == "blocklist":
+            # <BlockList><Latest>id</Latest>...</BlockList>, in the order of the blob
+            block_ids = [element.text for element in ElementTree.fromstring(bytes(body))]
+            self.blobs[blob_name] = b"".join(
+                self.blocks.pop((blob_name, block_id)) for block_id in block_ids
+            )
+        else:
+            self.blobs[blob_name] = bytes(body)
+
+        return web.Response(
+            status=201,
+            headers={
+                "ETag": f'"{uuid.uuid4()}"',
+                "Last-Modified": formatdate(usegmt=True),
+                "x-ms-request-id": str(uuid.uuid4()),
+                "x-ms-version": request.headers.get("x-ms-version", ""),
+                "x-ms-request-server-encrypted": "true",
+            },
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Measures the peak memory of validating uploads in upload_documents: the original
+validation, which read every file three times (type, size and payload) and kept the payload
+in memory until it was uploaded, against spool_upload's single pass into a bounded spool.
+Each mode runs in a fresh process handling concurrent requests of several large files, and
+its peak RSS above the start of the run is reported.
+
+Run from the azure folder:
+
+    python -m benchmarks.upload_memory_benchmark --requests 2 --files 3 --size-mb 30
+
+The upload itself is simulated without any network: the payload is read the way
+upload_blob_blocks reads it, keeping up to UploadConcurrency blocks in flight.
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.memory import peak_rss
+from benchmarks.settings import use_placeholder_settings
+
+modes = ("original", "spooled")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2, help="concurrent requests")
+    parser.add_argument("--files", type=int, default=3, help="files per request")
+    parser.add_argument("--size-mb", type=int, default=30, help="size of each file")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as upload_dir:
+        # A PDF header followed by padding, the validation only sniffs the magic number
+        paths = []
+        for index in range(args.files):
+            path = os.path.join(upload_dir, f"upload-{index}.pdf")
+            with open(path, "wb") as file:
+                file.write(b"%PDF-1.7\n")
+                for _ in range(args.size_mb - 1):
+                    file.write(os.urandom(2**20))
+                file.write(os.urandom(2**20 - 9))
+            paths.append(path)
+
+        results = []
+        for mode in modes:
+            # A fresh interpreter per mode, so each peak RSS is its own
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                results.append(executor.submit(runUploads, mode, paths, args.requests).result())
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(
+            f"{result['mode']:<9} {result['requests']}x{len(paths)} files  "
+            f"wall {result['seconds']:6.2f}s  peak RSS +{result['peak_rss_mb']:7.1f}MB"
+        )
+
+
+def runUploads(mode: str, paths: list[str], requests: int) -> dict:
+    """
+    Validates and "uploads" every file of concurrent requests. Runs in its own process.
+    """
+    use_placeholder_settings()
+    import filetype
+    from utils.blob_proxy import upload_block_size, upload_concurrency
+    from utils.files import max_file_size, spool_upload
+
+    def sendBlocks(file) -> None:
+        # Up to upload_concurrency blocks are held while they are staged
+        in_flight = collections.deque(maxlen=upload_concurrency)
+        while block := file.read(upload_block_size):
+            in_flight.append(block)
+            hashlib.sha256(block).digest()
+
+    def handleRequest() -> None:
+        streams = [open(path, "rb") for path in paths]
+        try:
+            if mode == "original":
+                contents = []
+                for stream in streams:
+                    if filetype.guess(stream.read()).mime != "application/pdf":
+                        raise ValueError("Not a PDF")
+                    stream.seek(0)
+                    if len(stream.read()) > max_file_size:
+                        raise ValueError("Too large")
+                    stream.seek(0)
+                    contents.append(stream.read())
+                for content in contents:
+                    hashlib.sha256(content).digest()
+            else:
+                uploads = [
+                    spool_upload(
+                        stream, os.path.basename(stream.name), "application/pdf", max_file_size
+                    )
+                    for stream in streams
+                ]
+                for upload in uploads:
+                    sendBlocks(upload.file)
+                    upload.close()
+        finally:
+            for stream in streams:
+                stream.close()
+
+    peak_before = peak_rss()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=handleRequest) for _ in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "mode": mode,
+        "requests": requests,
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": (peak_rss() - peak_before) / 2**20,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,2 @@
 from .user import User
-from .errors import InvalidField, MissingField
+from .errors import FileTooLarge, InvalidField, InvalidFileType, InvalidUpload, MissingField
@@ -4,3 +4,15 @@ class InvalidField(ValueError):
 
 class MissingField(ValueError):
     pass
+
+
+class InvalidFileType(ValueError):
+    pass
+
+
+class FileTooLarge(ValueError):
+    pass
+
+
+class InvalidUpload(ValueError):
+    pass
@@ -1,11 +1,37 @@
-import base64
-import json
+import asyncio
+import hashlib
 import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
 
+from azure.core.exceptions import ResourceModifiedError
 from azure.functions import QueueMessage
-from utils import get_blob_client, get_pubsub_client, get_quizzes_container
-from utils.files import convert_to_text
-from utils.gpt import create_quiz
+from utils import (
+    decode_document_jobs,
+    download_blob,
+    get_document_container,
+    get_pubsub_client,
+    get_quizzes_container,
+    run_coroutine,
+)
+from utils.files import (
+    chars_per_token,
+    convert_buffer_to_text_async,
+    keep_unicode_text,
+    text_cache,
+    text_cache_key,
+)
+from utils.gpt import (
+    create_quiz,
+    get_response_cache_stats,
+    get_route_metrics,
+    get_scheduler_metrics,
+    passage_token_budget,
+    select_passages,
+)
 
 # Proxy to CosmosDB
 QuizContainerProxy = get_quizzes_container()
@@ -13,6 +39,17 @@ QuizContainerProxy = get_quizzes_container()
 # PubSub client
 pubsub = get_pubsub_client()
 
+# Estimated tokens of text extracted from each file, 0 reads files in full. Files stop
+# being read once it is met ("first" reads from the start, "even" samples throughout).
+# PDFs of PdfParallelPageThreshold pages or more are still split across the extraction
+# pool, a round of pages at a time until the budget is met.
+extraction_token_budget = int(os.environ.get("ExtractionTokenBudget", 20000))
+extraction_strategy = os.environ.get("ExtractionStrategy", "first")
+
+# Save the questions of each type as soon as they are generated, so the quiz can be viewed
+# before the slowest type is done
+partial_quiz_results = os.environ.get("PartialQuizResults", "true").lower() == "true"
+
 
 def setQuizErrored(quiz_id: str) -> None:
     """
@@ -33,14 +70,38 @@ def setQuizErrored(quiz_id: str) -> None:
         logging.error("Error setting quiz errored field: %s", e, exc_info=True)
 
 
-def sendPubSubMessage(user_id: str, quiz_id: str, message_type: str) -> None:
+def saveQuestionType(
+    quiz: dict, lock: threading.Lock, question_type: str, questions: list[dict]
+) -> None:
+    """
+    Adds the questions of a type that is ready to the quiz and saves it, before the other
+    types are done. The quiz stays unprocessed until all of them are.
+
+    Args:
+        quiz (dict): The quiz document, updated in place.
+        lock (threading.Lock): Serialises the updates of the quiz.
+        question_type (str): The question type that is ready.
+        questions (list[dict]): Its questions, with their final question ids.
+    """
+    with lock:
+        quiz["questions"] = sorted(
+            quiz["questions"] + questions, key=lambda question: question["question_id"]
+        )
+        quiz["type_status"][question_type] = "ready"
+        QuizContainerProxy.replace_item(item=quiz["id"], body=quiz)
+
+    sendPubSubMessage(quiz["user_id"], quiz["id"], "quiz_partial", {"question_type": question_type})
+
+
+def sendPubSubMessage(user_id: str, quiz_id: str, message_type: str, data: dict = None) -> None:
     """
     Sends a Pub/Sub message to a user for a specific quiz.
 
     Args:
         user_id (str): The ID of the user to send the message to.
         quiz_id (str): The ID of the quiz associated with the message.
-        message_type (str): The type of the message. This can be one of: quiz_processed, quiz_errored.
+        message_type (str): The type of the message. This can be one of: quiz_processed, quiz_errored, quiz_progress, quiz_partial.
+        data (dict, optional): Extra fields of the message, e.g. {"ready": 7, "total": 20} for quiz_progress.
 
     Returns:
         None: This function does not return anything.
@@ -51,6 +112,7 @@ def sendPubSubMessage(user_id: str, quiz_id: str, message_type: str) -> None:
             message={
                 "type": message_type,
                 "quiz_id": quiz_id,
+                **(data or {}),
             },
         )
     except Exception as e:
@@ -58,25 +120,160 @@ def sendPubSubMessage(user_id: str, quiz_id: str, message_type: str) -> None:
         return
 
 
+class StageTimings:
+    """
+    Records when each stage of a job starts and ends, relative to the start of the job,
+    so overlapping stages show up in the logs.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        stage_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, stage_start - self.start, time.perf_counter() - self.start))
+
+    def log(self, quiz_id: str) -> None:
+        logging.info(
+            "Stage timings for quiz %s: %s",
+            quiz_id,
+            ", ".join(f"{name} {start:.2f}s-{end:.2f}s" for name, start, end in self.stages),
+        )
+
+
+async def getFileText(
+    file: dict, max_chars: int | None, cache_stats: dict, timings: StageTimings
+) -> str:
+    """
+    Gets the cleaned text of an uploaded file, using the extracted text cache when the
+    file's content hash has been seen before. Files uploaded straight to blob storage have
+    no hash yet, so theirs is computed once they are downloaded.
+
+    Args:
+        file (dict): The file entry from the quiz document.
+        max_chars (int | None): The character budget of the file, None for no budget.
+        cache_stats (dict): Hit and miss counters for the current job, updated in place.
+        timings (StageTimings): The stage timings of the current job.
+
+    Raises:
+        ResourceModifiedError: If the file changed after upload_finalize verified it.
+
+    Returns:
+        str: The cleaned text of the file, or an empty string if it couldn't be converted.
+    """
+    name = file.get("filename", file["blob_name"])
+
+    async def getCachedText(digest: str) -> tuple[str, str | None]:
+        cache_key = text_cache_key(digest, keep_unicode_text, max_chars, extraction_strategy)
+        with timings.stage(f"cache lookup '{name}'"):
+            cached_text = await asyncio.to_thread(text_cache.get, cache_key)
+        cache_stats["hits" if cached_text is not None else "misses"] += 1
+        return cache_key, cached_text
+
+    digest = file.get("sha256")
+    if digest:
+        cache_key, cached_text = await getCachedText(digest)
+        if cached_text is not None:
+            return cached_text
+
+    try:
+        with timings.stage(f"download '{name}'"):
+            data = await asyncio.to_thread(download_blob, file["blob_name"], file.get("etag"))
+
+        if not digest:
+            digest = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+            file["sha256"] = digest
+            cache_key, cached_text = await getCachedText(digest)
+            if cached_text is not None:
+                return cached_text
+
+        with timings.stage(f"extract '{name}'"):
+            # Extraction is CPU bound, so it runs on the worker's shared process pool
+            text = await convert_buffer_to_text_async(
+                data, file["mime"], max_chars=max_chars, strategy=extraction_strategy
+            )
+    except ResourceModifiedError:
+        raise
+    except Exception as e:
+        logging.error("Error converting file to text: %s", e, exc_info=True)
+        return ""
+
+    # Don't cache failed conversions
+    if text:
+        await asyncio.to_thread(text_cache.put, cache_key, text)
+
+    return text
+
+
+async def getFilesText(files: list, cache_stats: dict, timings: StageTimings) -> list[str]:
+    """
+    Downloads and converts all the files of a quiz concurrently.
+
+    Args:
+        files (list): The file entries from the quiz document.
+        cache_stats (dict): Hit and miss counters for the current job, updated in place.
+        timings (StageTimings): The stage timings of the current job.
+
+    Returns:
+        list[str]: The cleaned text of each file, in the same order as the files.
+    """
+    if not files:
+        return []
+
+    # Every file gets the same budget whatever it is uploaded with, so its cached text is
+    # reused across uploads
+    max_chars = extraction_token_budget * chars_per_token if extraction_token_budget > 0 else None
+
+    return await asyncio.gather(
+        *(getFileText(file, max_chars, cache_stats, timings) for file in files)
+    )
+
+
+def deleteBlobs(blob_names: list[str], timings: StageTimings) -> None:
+    """
+    Deletes the uploaded files from blob storage in a single batch request.
+
+    Args:
+        blob_names (list[str]): The names of the blobs to delete.
+        timings (StageTimings): The stage timings of the current job.
+    """
+    if not blob_names:
+        return
+
+    try:
+        with timings.stage("delete blobs"):
+            get_document_container().delete_blobs(*blob_names, delete_snapshots="include")
+    except Exception as e:
+        logging.error("Error deleting blobs: %s", e, exc_info=True)
+
+
 def main(msg: QueueMessage) -> None:
     logging.info("Python queue trigger function processed a queue item")
 
-    # Decode the message body from base64 and json
+    # Decode the jobs from the message body (the trigger already removed the base64)
     try:
-        # decode with base64
-        message = json.loads(msg.get_body().decode("utf-8"))
+        jobs = decode_document_jobs(msg.get_body())
     except Exception as e:
         logging.error("Messaage: %s", msg.get_body())
         logging.error("Error decoding message body: %s", e, exc_info=True)
         return
 
-    # Check message body has quiz_id, user_id and files
-    if not all(key in message for key in ("quiz_id", "user_id", "files")):
-        logging.error("Message body missing required keys")
-        return
+    for job in jobs:
+        processQuiz(job.quiz_id)
 
-    quiz_id = message["quiz_id"]
 
+def processQuiz(quiz_id: str) -> None:
+    """
+    Extracts the text of a quiz's files, generates its questions and saves them.
+
+    Args:
+        quiz_id (str): The id of the quiz to process.
+    """
     logging.info("Quiz ID: %s", quiz_id)
 
     # Get the quiz from the database
@@ -98,43 +295,79 @@ def main(msg: QueueMessage) -> None:
         logging.error("Files is not a list")
         return
 
-    # convert file to text
-    all_content = []
-    for file in files:
-        try:
-            content = convert_to_text(file["url"], file["mime"])
-            all_content.append(content)
-        except Exception as e:
-            logging.error("Error converting file to text: %s", e, exc_info=True)
-            return
-
-    # Remove files from blob
-    for file in files:
-        try:
-            blob_client = get_blob_client(blob_name=file["blob_name"])
-            blob_client.delete_blob(delete_snapshots="include")
-        except Exception as e:
-            logging.error("Error deleting blob: %s", e, exc_info=True)
+    # convert files to text
+    timings = StageTimings()
+    cache_stats = {"hits": 0, "misses": 0}
+    try:
+        all_content = run_coroutine(getFilesText(files, cache_stats, timings))
+    except ResourceModifiedError:
+        # Overwritten with the upload URL after it was verified, so it can't be trusted
+        logging.error("Files of quiz %s changed after the upload was finalized", quiz_id)
+        deleteBlobs([file["blob_name"] for file in files], timings)
+        setQuizErrored(quiz_id)
+        sendPubSubMessage(user_id, quiz_id, "quiz_errored")
+        return
+    logging.info(
+        "Text cache for quiz %s: %d hits, %d misses",
+        quiz_id,
+        cache_stats["hits"],
+        cache_stats["misses"],
+    )
+
+    # Keep the passages most relevant to the topic when the files are over the prompt budget,
+    # leaving room for the text content of the quiz
+    if passage_token_budget > 0:
+        with timings.stage("select passages"):
+            all_content = select_passages(
+                all_content,
+                topic,
+                max(passage_token_budget - len(text_content) // chars_per_token, 1),
+            )
+
+    # Remove files from blob in the background, off the path to create_quiz
+    deletion = threading.Thread(
+        target=deleteBlobs, args=([file["blob_name"] for file in files], timings)
+    )
+    deletion.start()
+
+    # Every type is pending until its questions are saved
+    quiz["questions"] = []
+    quiz["type_status"] = {question_type: "pending" for question_type in question_types}
+    on_type_ready = None
+    if partial_quiz_results:
+        on_type_ready = partial(saveQuestionType, quiz, threading.Lock())
+
+    # How the questions were generated, kept with the quiz
+    generation_report = {}
 
     try:
         # Create quiz from text
-        created_quiz = create_quiz(
-            num_questions=num_questions,
-            question_types=question_types,
-            topic=topic,
-            text_content=text_content,
-            file_contents=all_content,
-        )
+        with timings.stage("create_quiz"):
+            created_quiz = create_quiz(
+                num_questions=num_questions,
+                question_types=question_types,
+                topic=topic,
+                text_content=text_content,
+                file_contents=all_content,
+                fresh=quiz.get("fresh_questions", False),
+                on_progress=lambda ready, total: sendPubSubMessage(
+                    user_id, quiz_id, "quiz_progress", {"ready": ready, "total": total}
+                ),
+                on_type_ready=on_type_ready,
+                report=generation_report,
+            )
 
         # Add sample questions to quiz
         quiz["questions"] = created_quiz
+        quiz["generation_report"] = generation_report
 
         # Update processed flag
         quiz["processed"] = True
+        quiz["type_status"] = {question_type: "ready" for question_type in question_types}
 
         # Update quiz with new questions
         QuizContainerProxy.replace_item(
-            item=message["quiz_id"],
+            item=quiz_id,
             body=quiz,
         )
 
@@ -147,3 +380,9 @@ def main(msg: QueueMessage) -> None:
         # Notify the user that the quiz has errored
         sendPubSubMessage(user_id, quiz_id, "quiz_errored")
         return
+    finally:
+        deletion.join()
+        timings.log(quiz_id)
+        logging.info("OpenAI scheduler after quiz %s: %s", quiz_id, get_scheduler_metrics())
+        logging.info("Model routes after quiz %s: %s", quiz_id, get_route_metrics())
+        logging.info("Response cache after quiz %s: %s", quiz_id, get_response_cache_stats())
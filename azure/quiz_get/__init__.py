@@ -11,6 +11,28 @@ UserContainerProxy = get_user_container()
 QuizContainerProxy = get_quizzes_container()
 
 
+def getQuizStatus(quiz: dict) -> str:
+    """
+    Returns the status of a quiz: awaiting_upload, processing, partial (the questions of
+    some types are ready), processed or errored.
+
+    Args:
+        quiz (dict): The quiz document.
+
+    Returns:
+        str: The status.
+    """
+    if quiz.get("errored", False):
+        return "errored"
+    if quiz.get("processed", False):
+        return "processed"
+    if quiz.get("awaiting_upload", False):
+        return "awaiting_upload"
+    if "ready" in quiz.get("type_status", {}).values():
+        return "partial"
+    return "processing"
+
+
 def main(req: HttpRequest) -> HttpResponse:
     logging.info("Getting quiz by id")
 
@@ -93,6 +115,8 @@ def main(req: HttpRequest) -> HttpResponse:
                     "questions": quiz.get("questions", []),
                     "processed": quiz.get("processed", False),
                     "errored": quiz.get("errored", False),
+                    "status": getQuizStatus(quiz),
+                    "type_status": quiz.get("type_status", {}),
                     "invite_code": quiz.get("invite_code", "Unknown"),
                     "people": list(shared_with_usernames),
                     "top_score": sorted_scores[0]["score"] if sorted_scores else 0,
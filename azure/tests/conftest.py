@@ -0,0 +1,160 @@
+import copy
+import os
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+# Settings read when utils is imported. Nothing connects to them, the tests that need
+# storage or Cosmos DB use the in-memory stand-ins below.
+placeholder_settings = {
+    "AzureCosmosDBConnectionString": "AccountEndpoint=https://localhost:8081/;AccountKey=a2V5;",
+    "Database": "test",
+    "UserContainer": "users",
+    "QuizzesContainer": "quizzes",
+    "AzureStorageConnectionString": "UseDevelopmentStorage=true",
+    "DocumentBlobContainer": "documents",
+    "DocumentQueue": "documents",
+    "PubSubConnectionString": "Endpoint=https://localhost;AccessKey=a2V5;Version=1.0;",
+}
+
+for name, value in placeholder_settings.items():
+    os.environ.setdefault(name, value)
+
+from azure.core import MatchConditions  # noqa: E402
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError  # noqa: E402
+from azure.cosmos.exceptions import (  # noqa: E402
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+
+class BlobStandIn:
+    """A blob in StorageStandIn, as far as the function code uses it."""
+
+    def __init__(self, storage: "StorageStandIn", name: str):
+        self._storage = storage
+        self.blob_name = name
+
+    def upload_blob(self, data: bytes, **kwargs) -> None:
+        # What a client does with its upload URL, a new version gets a new ETag
+        self._storage.blobs[self.blob_name] = (bytes(data), f'"{uuid.uuid4()}"')
+
+    def get_blob_properties(self) -> SimpleNamespace:
+        data, etag = self._get()
+        return SimpleNamespace(size=len(data), etag=etag)
+
+    def download_blob(
+        self, offset: int = 0, length: int = None, etag: str = None, match_condition=None, **kwargs
+    ) -> SimpleNamespace:
+        data, current_etag = self._get()
+        if match_condition == MatchConditions.IfNotModified and etag != current_etag:
+            raise ResourceModifiedError(
+                "The condition specified using HTTP conditional header(s) is not met."
+            )
+        end = len(data) if length is None else offset + length
+        return SimpleNamespace(readall=lambda: data[offset:end])
+
+    def _get(self) -> tuple[bytes, str]:
+        if self.blob_name not in self._storage.blobs:
+            raise ResourceNotFoundError("The specified blob does not exist.")
+        return self._storage.blobs[self.blob_name]
+
+
+class StorageStandIn:
+    """An in-memory stand-in for the document container of the storage emulator."""
+
+    container_name = "documents"
+
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob_client(self, blob_name: str) -> BlobStandIn:
+        return BlobStandIn(self, blob_name)
+
+    def download_blob(self, blob_name: str, **kwargs) -> SimpleNamespace:
+        return self.get_blob_client(blob_name).download_blob(**kwargs)
+
+    def delete_blobs(self, *blob_names: str, **kwargs) -> None:
+        for blob_name in blob_names:
+            self.blobs.pop(blob_name, None)
+
+
+class CosmosContainerStandIn:
+    """An in-memory stand-in for a Cosmos DB container, with ETags on its items."""
+
+    def __init__(self):
+        self.items = {}
+
+    def create_item(self, body: dict, **kwargs) -> dict:
+        item = {"id": str(uuid.uuid4()), **body, "_etag": f'"{uuid.uuid4()}"'}
+        if item["id"] in self.items:
+            raise CosmosResourceExistsError(status_code=409, message="Conflict")
+        self.items[item["id"]] = item
+        return copy.deepcopy(item)
+
+    def read_item(self, item: str, partition_key: str) -> dict:
+        if item not in self.items:
+            raise CosmosResourceNotFoundError(status_code=404, message="Not found")
+        return copy.deepcopy(self.items[item])
+
+    def replace_item(
+        self, item: str, body: dict, etag: str = None, match_condition=None, **kwargs
+    ) -> dict:
+        if item not in self.items:
+            raise CosmosResourceNotFoundError(status_code=404, message="Not found")
+        if match_condition == MatchConditions.IfNotModified and etag != self.items[item]["_etag"]:
+            raise CosmosAccessConditionFailedError(status_code=412, message="Precondition failed")
+        self.items[item] = {**copy.deepcopy(body), "_etag": f'"{uuid.uuid4()}"'}
+        return copy.deepcopy(self.items[item])
+
+    def upsert_item(self, body: dict, **kwargs) -> dict:
+        self.items[body["id"]] = {**copy.deepcopy(body), "_etag": f'"{uuid.uuid4()}"'}
+        return copy.deepcopy(self.items[body["id"]])
+
+
+class QueueStandIn:
+    """An in-memory stand-in for the document queue."""
+
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, content: str, **kwargs) -> None:
+        self.messages.append(content)
+
+
+class DatabaseStandIn:
+    def __init__(self):
+        self.containers = {}
+
+    def get_container_client(self, name: str) -> CosmosContainerStandIn:
+        return self.containers.setdefault(name, CosmosContainerStandIn())
+
+
+# Function modules get their Cosmos DB containers when they are imported
+import utils.db_proxy  # noqa: E402
+
+utils.db_proxy._database = DatabaseStandIn()
+
+
+@pytest.fixture
+def storage(monkeypatch) -> StorageStandIn:
+    """The document container, replaced with an empty in-memory stand-in."""
+    import utils.blob_proxy
+
+    stand_in = StorageStandIn()
+    monkeypatch.setattr(utils.blob_proxy, "DocumentContainer", stand_in)
+    return stand_in
+
+
+@pytest.fixture
+def quizzes() -> CosmosContainerStandIn:
+    """An empty in-memory quizzes container."""
+    return CosmosContainerStandIn()
+
+
+@pytest.fixture
+def queue() -> QueueStandIn:
+    """An empty in-memory document queue."""
+    return QueueStandIn()
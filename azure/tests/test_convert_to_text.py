@@ -0,0 +1,70 @@
+import asyncio
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+import pytest
+from utils.files.convert_to_text import convert_buffer_to_text, convert_buffer_to_text_async
+
+# The module, utils.files exports a function of the same name
+convert_to_text = importlib.import_module("utils.files.convert_to_text")
+
+pdf_mime = "application/pdf"
+
+
+@pytest.fixture(scope="module")
+def pdf_fixture() -> bytes:
+    # Pages of different lengths, some of them blank
+    document = fitz.open()
+    for number in range(40):
+        page = document.new_page()
+        if number % 7 != 3:
+            page.insert_textbox(
+                fitz.Rect(40, 40, 560, 800),
+                f"Page {number}. " + "Rivers carve valleys over time. " * (number % 5 + 1) * 8,
+                fontsize=8,
+            )
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    # Split every PDF across threads, so the shards run in the test process
+    monkeypatch.setattr(convert_to_text, "pdf_extraction_workers", 4)
+    monkeypatch.setattr(convert_to_text, "pdf_parallel_page_threshold", 10)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+@pytest.mark.parametrize("strategy", ["first", "even"])
+@pytest.mark.parametrize("max_chars", [None, 1, 3000, 20000, 10**7])
+def test_sharded_pdf_text_matches_serial_extraction(pdf_fixture, sharded, strategy, max_chars):
+    expected = convert_buffer_to_text(pdf_fixture, pdf_mime, max_chars=max_chars, strategy=strategy)
+
+    text = asyncio.run(
+        convert_buffer_to_text_async(
+            pdf_fixture, pdf_mime, max_chars=max_chars, strategy=strategy, executor=sharded
+        )
+    )
+
+    assert text == expected
+
+
+def test_budgeted_pdf_reads_only_the_pages_it_needs(pdf_fixture, sharded, monkeypatch):
+    read = []
+    text_pdf_pages = convert_to_text.text_pdf_pages
+
+    def recordPages(data, page_numbers, keep_unicode):
+        read.extend(page_numbers)
+        return text_pdf_pages(data, page_numbers, keep_unicode)
+
+    monkeypatch.setattr(convert_to_text, "text_pdf_pages", recordPages)
+
+    asyncio.run(
+        convert_buffer_to_text_async(pdf_fixture, pdf_mime, max_chars=3000, executor=sharded)
+    )
+
+    assert 0 < len(read) < 40
+    assert sorted(read) == list(range(len(read)))
@@ -0,0 +1,56 @@
+import importlib
+import json
+import re
+
+import pytest
+from utils import run_coroutine
+from utils.gpt import backend, close_scheduler, question_bank, response_cache
+from utils.gpt.fake_backend import FakeBackend
+
+# The package exports the function under the same name
+create_quiz = importlib.import_module("utils.gpt.create_quiz")
+
+text = "\n".join(
+    f"The river {name} carries sediment from the mountains towards the estuary."
+    for name in ("Amazon", "Danube", "Mekong", "Zambezi", "Volga", "Yukon")
+)
+
+
+class RepeatingBackend(FakeBackend):
+    """Answers every short answer prompt with the same question, count times over."""
+
+    def _respond(self, rng, system, user):
+        count = int(re.search(r"\d+", system).group())
+        question = {"question": "Which river carries sediment?", "answer": "The Amazon"}
+        return "\n".join(json.dumps(question) for _ in range(count))
+
+
+@pytest.fixture
+def fake(monkeypatch, quizzes):
+    monkeypatch.setattr(question_bank, "get_question_bank_container", lambda: quizzes)
+    monkeypatch.setattr(response_cache, "response_cache_enabled", False)
+    fake = RepeatingBackend(seed=0, latency="fixed", latency_ms=1, malformed_rate=0)
+    monkeypatch.setattr(backend, "_backend", fake)
+    yield fake
+    run_coroutine(close_scheduler())
+
+
+def test_progress_counts_only_accepted_questions(monkeypatch, fake):
+    # Without top-ups, the repeats leave the quiz short
+    monkeypatch.setattr(create_quiz, "question_top_up_rounds", 0)
+    reported = []
+    report = {}
+
+    questions = create_quiz.create_quiz(
+        5,
+        ["short-answer"],
+        topic="rivers",
+        text_content=text,
+        fresh=True,
+        on_progress=lambda ready, total: reported.append(ready),
+        report=report,
+    )
+
+    assert report["discarded"] == {"duplicate question": 4}
+    assert len(questions) == 1
+    assert reported[-1] == 1
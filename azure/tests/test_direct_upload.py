@@ -0,0 +1,172 @@
+import base64
+import json
+
+import pytest
+from azure.core.exceptions import ResourceModifiedError
+from azure.functions import HttpRequest
+from utils import decode_document_jobs, download_blob
+
+pdf_mime = "application/pdf"
+pdf_bytes = b"%PDF-1.7\n" + b"0" * 20000
+
+
+@pytest.fixture
+def upload_finalize(monkeypatch, storage, quizzes, queue):
+    import upload_finalize
+
+    monkeypatch.setattr(upload_finalize, "QuizContainerProxy", quizzes)
+    monkeypatch.setattr(upload_finalize, "QueueProxy", queue)
+    return upload_finalize
+
+
+@pytest.fixture
+def quiz(quizzes) -> dict:
+    # As saved by upload_request
+    return quizzes.create_item(
+        {
+            "user_id": "user",
+            "name": "Quiz",
+            "content": "",
+            "files": [
+                {
+                    "filename": "notes.pdf",
+                    "mime": pdf_mime,
+                    "extension": "pdf",
+                    "blob_name": "notes.pdf",
+                    "size": len(pdf_bytes),
+                }
+            ],
+            "processed": False,
+            "errored": False,
+            "awaiting_upload": True,
+        }
+    )
+
+
+def finalize(upload_finalize, quiz_id: str, user_id: str = "user"):
+    return upload_finalize.main(
+        HttpRequest(
+            method="POST",
+            url="/api/upload_finalize",
+            body=json.dumps({"quiz_id": quiz_id, "user_id": user_id}).encode("utf-8"),
+        )
+    )
+
+
+def test_finalize_verifies_and_queues_the_upload(upload_finalize, storage, quizzes, queue, quiz):
+    storage.get_blob_client("notes.pdf").upload_blob(pdf_bytes)
+
+    response = finalize(upload_finalize, quiz["id"])
+
+    assert response.status_code == 200
+    saved = quizzes.read_item(quiz["id"], quiz["id"])
+    assert saved["awaiting_upload"] is False
+    assert saved["files"][0]["etag"] == storage.blobs["notes.pdf"][1]
+    assert [job.quiz_id for job in decode_document_jobs(decodeMessage(queue.messages[0]))] == [
+        quiz["id"]
+    ]
+
+
+def test_finalize_rejects_a_file_of_the_wrong_type(upload_finalize, storage, quizzes, queue, quiz):
+    storage.get_blob_client("notes.pdf").upload_blob(b"PK\x03\x04" + b"0" * 20000)
+
+    response = finalize(upload_finalize, quiz["id"])
+
+    assert response.status_code == 415
+    assert storage.blobs == {}
+    assert queue.messages == []
+    assertErrored(quizzes.read_item(quiz["id"], quiz["id"]))
+
+
+def test_finalize_rejects_a_file_that_is_too_large(
+    upload_finalize, monkeypatch, storage, quizzes, queue, quiz
+):
+    monkeypatch.setattr(upload_finalize, "max_file_size", len(pdf_bytes) - 1)
+    storage.get_blob_client("notes.pdf").upload_blob(pdf_bytes)
+
+    response = finalize(upload_finalize, quiz["id"])
+
+    assert response.status_code == 400
+    assert storage.blobs == {}
+    assert queue.messages == []
+    assertErrored(quizzes.read_item(quiz["id"], quiz["id"]))
+
+
+def test_finalize_rejects_a_missing_upload(upload_finalize, quizzes, queue, quiz):
+    response = finalize(upload_finalize, quiz["id"])
+
+    assert response.status_code == 400
+    assert queue.messages == []
+    assertErrored(quizzes.read_item(quiz["id"], quiz["id"]))
+
+    # The quiz no longer waits for an upload, the client starts again with upload_request
+    assert finalize(upload_finalize, quiz["id"]).status_code == 409
+
+
+def test_concurrent_finalize_queues_the_quiz_once(
+    upload_finalize, monkeypatch, storage, quizzes, queue, quiz
+):
+    storage.get_blob_client("notes.pdf").upload_blob(pdf_bytes)
+
+    # Both calls read the quiz before either saved it
+    stale_quiz = quizzes.read_item(quiz["id"], quiz["id"])
+    monkeypatch.setattr(quizzes, "read_item", lambda item, partition_key: dict(stale_quiz))
+
+    responses = [finalize(upload_finalize, quiz["id"]) for _ in range(2)]
+
+    assert [response.status_code for response in responses] == [200, 409]
+    assert len(queue.messages) == 1
+
+
+def test_overwrite_after_finalize_is_not_downloaded(upload_finalize, storage, quizzes, quiz):
+    storage.get_blob_client("notes.pdf").upload_blob(pdf_bytes)
+    finalize(upload_finalize, quiz["id"])
+    etag = quizzes.read_item(quiz["id"], quiz["id"])["files"][0]["etag"]
+
+    assert download_blob("notes.pdf", etag) == pdf_bytes
+
+    # The upload URL is still valid, so the client can write the blob again
+    storage.get_blob_client("notes.pdf").upload_blob(b"%PDF-1.7\n" + b"1" * 40_000_000)
+
+    with pytest.raises(ResourceModifiedError):
+        download_blob("notes.pdf", etag)
+
+
+def test_processing_rejects_a_file_changed_after_finalize(
+    upload_finalize, monkeypatch, storage, quizzes, quiz
+):
+    import process_documents
+
+    sent = []
+    monkeypatch.setattr(process_documents, "QuizContainerProxy", quizzes)
+    monkeypatch.setattr(
+        process_documents,
+        "sendPubSubMessage",
+        lambda user_id, quiz_id, message_type, data=None: sent.append(message_type),
+    )
+    monkeypatch.setattr(
+        process_documents,
+        "create_quiz",
+        lambda **kwargs: pytest.fail("create_quiz must not run on unverified files"),
+    )
+
+    storage.get_blob_client("notes.pdf").upload_blob(pdf_bytes)
+    finalize(upload_finalize, quiz["id"])
+    storage.get_blob_client("notes.pdf").upload_blob(pdf_bytes + b"changed")
+
+    process_documents.processQuiz(quiz["id"])
+
+    saved = quizzes.read_item(quiz["id"], quiz["id"])
+    assert saved["errored"] is True
+    assert sent == ["quiz_errored"]
+    assert storage.blobs == {}
+
+
+def decodeMessage(message: str) -> bytes:
+    # The queue trigger removes the base64 encoding before the function sees the message
+    return base64.b64decode(message)
+
+
+def assertErrored(quiz: dict) -> None:
+    assert quiz["errored"] is True
+    assert quiz["awaiting_upload"] is False
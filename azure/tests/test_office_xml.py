@@ -0,0 +1,93 @@
+import io
+
+import pytest
+from utils.files import clean_text
+from utils.files.office_xml import iter_docx_paragraphs, iter_pptx_slides
+
+docx = pytest.importorskip("docx")
+pptx = pytest.importorskip("pptx")
+
+
+@pytest.fixture(scope="module")
+def docx_fixture(tmp_path_factory):
+    document = docx.Document()
+    document.sections[0].header.paragraphs[0].text = "HEADER"
+    document.sections[0].footer.paragraphs[0].text = "FOOTER"
+    document.add_heading("Photosynthesis", level=1)
+    document.add_paragraph("Plants turn light into chemical energy.")
+    paragraph = document.add_paragraph("Chlorophyll ")
+    paragraph.add_run("absorbs").bold = True
+    paragraph.add_run(" red and blue light.")
+    table = document.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "Input"
+    table.cell(0, 1).text = "Carbon dioxide"
+    document.add_paragraph("")
+    document.add_paragraph("Oxygen is released.")
+
+    path = tmp_path_factory.mktemp("fixtures") / "fixture.docx"
+    document.save(path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def pptx_fixture(tmp_path_factory):
+    presentation = pptx.Presentation()
+    for title, lines in (
+        ("Rivers", ["Rivers flow downhill.", "They carve valleys."]),
+        ("Deltas", ["Sediment settles at the mouth."]),
+        ("Summary", []),
+    ):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = title
+        body = slide.placeholders[1].text_frame
+        for index, line in enumerate(lines):
+            paragraph = body.paragraphs[0] if index == 0 else body.add_paragraph()
+            paragraph.text = line
+
+    path = tmp_path_factory.mktemp("fixtures") / "fixture.pptx"
+    presentation.save(path)
+    return path
+
+
+def test_docx_paragraphs_in_reading_order(docx_fixture):
+    with open(docx_fixture, "rb") as file:
+        paragraphs = list(iter_docx_paragraphs(io.BytesIO(file.read())))
+
+    assert paragraphs == [
+        "HEADER",
+        "Photosynthesis",
+        "Plants turn light into chemical energy.",
+        "Chlorophyll absorbs red and blue light.",
+        "Input",
+        "Carbon dioxide",
+        "Oxygen is released.",
+        "FOOTER",
+    ]
+
+
+def test_pptx_slides_in_presentation_order(pptx_fixture):
+    with open(pptx_fixture, "rb") as file:
+        slides = list(iter_pptx_slides(io.BytesIO(file.read())))
+
+    assert slides == [
+        ["Rivers", "Rivers flow downhill.", "They carve valleys."],
+        ["Deltas", "Sediment settles at the mouth."],
+        ["Summary"],
+    ]
+
+
+@pytest.mark.parametrize("fixture_name", ["docx_fixture", "pptx_fixture"])
+def test_matches_textract(fixture_name, request):
+    textract = pytest.importorskip("textract")
+    path = request.getfixturevalue(fixture_name)
+
+    with open(path, "rb") as file:
+        if fixture_name == "docx_fixture":
+            sections = list(iter_docx_paragraphs(file))
+        else:
+            sections = ["\n".join(slide) for slide in iter_pptx_slides(file)]
+
+    # Whitespace differs between the two, the cleaned text must not
+    assert clean_text("\n".join(sections)) == clean_text(
+        textract.process(str(path)).decode("utf-8")
+    )
@@ -0,0 +1,52 @@
+import pytest
+from utils.gpt import question_bank
+
+
+@pytest.fixture
+def bank(monkeypatch, quizzes):
+    monkeypatch.setattr(question_bank, "get_question_bank_container", lambda: quizzes)
+    return quizzes
+
+
+def question(text: str) -> dict:
+    return {
+        "question": text,
+        "options": ["a", "b", "c", "d"],
+        "correct_answer": "a",
+        "type": "multi-choice",
+        "question_id": 1,
+    }
+
+
+def saveDuringRead(monkeypatch, bank, key: str, questions: list[tuple[int, dict]]) -> None:
+    # Another quiz saves its questions between the next read and its save
+    read_item = bank.read_item
+
+    def readThenSave(item, partition_key):
+        entry = read_item(item, partition_key) if item in bank.items else None
+        monkeypatch.setattr(bank, "read_item", read_item)
+        question_bank.save_to_question_bank(key, questions)
+        if entry is None:
+            raise question_bank.CosmosResourceNotFoundError(status_code=404, message="Not found")
+        return entry
+
+    monkeypatch.setattr(bank, "read_item", readThenSave)
+
+
+def test_concurrent_saves_keep_every_question(monkeypatch, bank):
+    question_bank.save_to_question_bank("text", [(0, question("Which river is longest?"))])
+
+    saveDuringRead(monkeypatch, bank, "text", [(1, question("What do cells contain?"))])
+    question_bank.save_to_question_bank("text", [(2, question("Where do volcanoes form?"))])
+
+    saved = question_bank.load_question_bank("text")["multi-choice"]
+    assert sorted(entry["chunk"] for entry in saved) == [0, 1, 2]
+
+
+def test_concurrent_first_saves_keep_every_question(monkeypatch, bank):
+    saveDuringRead(monkeypatch, bank, "text", [(0, question("Which river is longest?"))])
+    question_bank.save_to_question_bank("text", [(1, question("Where do volcanoes form?"))])
+
+    saved = question_bank.load_question_bank("text")["multi-choice"]
+    assert sorted(entry["chunk"] for entry in saved) == [0, 1]
+    assert all("question_id" not in entry and "type" not in entry for entry in saved)
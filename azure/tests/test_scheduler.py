@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+from utils.gpt import backend, scheduler
+from utils.gpt.fake_backend import FakeBackend
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeBackend(seed=0, latency="fixed", latency_ms=50, malformed_rate=0)
+    monkeypatch.setattr(backend, "_backend", fake)
+    # One request at a time, so the others wait in the queue
+    monkeypatch.setattr(scheduler, "openai_max_concurrency", 1)
+    return fake
+
+
+def submit(chat_scheduler: scheduler.ChatScheduler, topic: str) -> asyncio.Task:
+    messages = [
+        {"role": "system", "content": "Give me exactly 1 facts about the topic below."},
+        {"role": "user", "content": topic},
+    ]
+    return asyncio.create_task(chat_scheduler.submit(messages=messages, model="fake"))
+
+
+def test_cancelled_requests_are_not_sent(fake):
+    async def run():
+        chat_scheduler = scheduler.ChatScheduler()
+        first = submit(chat_scheduler, "rivers")
+        cancelled = submit(chat_scheduler, "cells")
+        last = submit(chat_scheduler, "markets")
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+
+        await asyncio.gather(first, last)
+        await chat_scheduler.close()
+        return cancelled
+
+    cancelled = asyncio.run(run())
+
+    assert cancelled.cancelled()
+    assert fake.stats["requests"] == 2
+
+
+def test_close_stops_the_dispatcher_and_cancels_waiting_requests(fake):
+    async def run():
+        chat_scheduler = scheduler.ChatScheduler()
+        requests = [submit(chat_scheduler, topic) for topic in ("rivers", "cells")]
+        await asyncio.sleep(0.01)
+        dispatcher = chat_scheduler._dispatcher
+
+        await chat_scheduler.close()
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        return chat_scheduler, dispatcher, results
+
+    chat_scheduler, dispatcher, results = asyncio.run(run())
+
+    assert dispatcher.done()
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert chat_scheduler.metrics()["in_flight"] == 0
+    assert chat_scheduler.metrics()["queue_depth"] == {}
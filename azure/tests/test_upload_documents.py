@@ -0,0 +1,67 @@
+import pytest
+from azure.functions import HttpRequest
+from utils.files import spool_upload
+
+pdf_mime = "application/pdf"
+boundary = "form-boundary"
+
+
+@pytest.fixture
+def upload_documents(monkeypatch, quizzes, queue):
+    import upload_documents
+
+    users = type(quizzes)()
+    users.create_item({"id": "user"})
+    monkeypatch.setattr(upload_documents, "UserContainerProxy", users)
+    monkeypatch.setattr(upload_documents, "QuizContainerProxy", quizzes)
+    monkeypatch.setattr(upload_documents, "QueueProxy", queue)
+    return upload_documents
+
+
+def multipartRequest(fields: dict[str, str], files: list[tuple[str, str, bytes]]) -> HttpRequest:
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts += [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="files[]"; filename="{filename}"'
+        f"\r\nContent-Type: {mime}\r\n\r\n".encode() + data + b"\r\n"
+        for filename, mime, data in files
+    ]
+    return HttpRequest(
+        method="POST",
+        url="/api/upload_documents",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        body=b"".join(parts) + f"--{boundary}--\r\n".encode(),
+    )
+
+
+def test_rejected_file_closes_the_spools_of_earlier_files(upload_documents, monkeypatch, queue):
+    spooled = []
+
+    def recordSpool(*args):
+        upload = spool_upload(*args)
+        spooled.append(upload)
+        return upload
+
+    monkeypatch.setattr(upload_documents, "spool_upload", recordSpool)
+
+    response = upload_documents.main(
+        multipartRequest(
+            {
+                "quiz_name": "Quiz",
+                "user_id": "user",
+                "num_questions": "5",
+                "question_types": "multi-choice",
+            },
+            [
+                ("notes.pdf", pdf_mime, b"%PDF-1.7\n" + b"0" * 20000),
+                ("fake.pdf", pdf_mime, b"PK\x03\x04" + b"0" * 20000),
+            ],
+        )
+    )
+
+    assert response.status_code == 415
+    assert len(spooled) == 1
+    assert spooled[0].file.closed
+    assert queue.messages == []
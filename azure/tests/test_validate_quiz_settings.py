@@ -0,0 +1,21 @@
+import pytest
+from models import InvalidField
+from utils import validate_quiz_settings
+
+
+def test_valid_settings_return_the_number_of_questions():
+    assert validate_quiz_settings("Quiz", "", "", "10", ["multi-choice", "fill-gaps"]) == 10
+
+
+@pytest.mark.parametrize(
+    "question_types",
+    [["multi-choice", {"type": "fill-gaps"}], [["short-answer"]], "multi-choice", [None]],
+)
+def test_question_types_must_be_a_list_of_strings(question_types):
+    with pytest.raises(InvalidField):
+        validate_quiz_settings("Quiz", "", "", "10", question_types)
+
+
+def test_unknown_question_types_are_invalid():
+    with pytest.raises(InvalidField):
+        validate_quiz_settings("Quiz", "", "", "10", ["essay"])
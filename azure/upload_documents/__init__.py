@@ -1,27 +1,25 @@
 import asyncio
-import base64
 import json
 import logging
 import secrets
+import uuid
+from contextlib import ExitStack
 from datetime import datetime
 
-import filetype
 from azure.functions import HttpRequest, HttpResponse
-from azure.storage.blob import ContentSettings
+from models import FileTooLarge, InvalidField, InvalidFileType
 from utils import (
+    DocumentJob,
     create_error_response,
-    get_async_blob_client,
+    encode_document_jobs,
     get_queue_client,
     get_quizzes_container,
     get_user_container,
+    run_coroutine,
+    upload_blob_blocks,
+    validate_quiz_settings,
 )
-
-supported_filetypes = [
-    "application/pdf",
-    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-]
-max_file_size = 30 * 1024 * 1024  # 30MB
+from utils.files import max_file_size, spool_upload, supported_filetypes
 
 # Proxy to CosmosDB
 UserContainerProxy = get_user_container()
@@ -32,19 +30,14 @@ QueueProxy = get_queue_client()
 async def upload_blob_async(file: dict) -> dict:
     """Uploads a file to blob storage and returns a dict with the url"""
     try:
-        blob_client = get_async_blob_client(filetype=file["extension"])
-        await blob_client.upload_blob(
-            file["content"],
-            blob_type="BlockBlob",
-            overwrite=True,
-            content_settings=ContentSettings(content_type=file["mime"]),
+        blob_name = f"{uuid.uuid4()}.{file['extension']}"
+        file["url"] = await upload_blob_blocks(
+            blob_name, file["content"], file["size"], file["mime"]
         )
-        file["blob_name"] = blob_client.blob_name
-        file["url"] = blob_client.url
-        del file["content"]
+        file["blob_name"] = blob_name
         return file
     finally:
-        await blob_client.close()
+        file.pop("content").close()
 
 
 async def upload_files_to_blob_storage(files: list) -> list:
@@ -66,6 +59,7 @@ def main(req: HttpRequest) -> HttpResponse:
     topic = req.form.get("topic", "")
     num_questions = req.form.get("num_questions")
     question_types = req.form.get("question_types", [])
+    fresh_questions = req.form.get("fresh_questions", "false").lower() == "true"
     # ["multi-choice", "fill-gaps", "short-answer"]
 
     # Check missing form data
@@ -89,25 +83,12 @@ def main(req: HttpRequest) -> HttpResponse:
         return create_error_response("Invalid question types", 400)
 
     # Validate
-    if len(quiz_name) > 50:
-        return create_error_response("Quiz name too long (max 50 characters)", 400)
-    if content and not (400 <= len(content) <= 2000):
-        return create_error_response("Content must be between 400 and 2000 characters", 400)
-    if len(topic) > 100:
-        return create_error_response("Topic too long (max 100 characters)", 400)
-    if not num_questions.isdigit():
-        return create_error_response("Number of questions must be an integer", 400)
-
-    num_questions = int(num_questions)
-    if num_questions < 3 or num_questions > 30:
-        return create_error_response("Number of questions must be between 3 and 30", 400)
-    if not (set(question_types) <= set(["multi-choice", "fill-gaps", "short-answer"])):
-        return create_error_response(
-            "Invalid question types. Must be one of: 'multi-choice', 'fill-gaps', 'short-answer'",
-            400,
+    try:
+        num_questions = validate_quiz_settings(
+            quiz_name, content, topic, num_questions, question_types
         )
-    if len(question_types) == 0:
-        return create_error_response("Must select at least one question type", 400)
+    except InvalidField as e:
+        return create_error_response(str(e), 400)
 
     # Validate if user exists
     try:
@@ -116,44 +97,40 @@ def main(req: HttpRequest) -> HttpResponse:
         return create_error_response(f"User with id {user_id} not found.", 404)
 
     if files:
-        # Validate each file
-        for file in files:
-            # Ensure file is not empty and is a supported file type
-            if not file:
-                return create_error_response("No files uploaded", 400)
-            if file.mimetype not in supported_filetypes:
-                return create_error_response(f"Unsupported file type: {file.mimetype}", 415)
-
-            # Ensure file binary is correct (magic number check)
-            try:
-                file_type = filetype.guess(file.read())
-            except Exception as e:
-                logging.error("Error guessing filetype: ", e)
-                return create_error_response("Error guessing filetype", 415)
-
-            if file_type.mime != file.mimetype:
-                return create_error_response(
-                    f"File '{file.filename}' is not a {file.mimetype} file", 415
+        # Validate each file. Spools are closed if a later file is rejected, otherwise the
+        # uploads close them once they are stored.
+        with ExitStack() as spools:
+            for file in files:
+                # Ensure file is not empty and is a supported file type
+                if not file:
+                    return create_error_response("No files uploaded", 400)
+                if file.mimetype not in supported_filetypes:
+                    return create_error_response(f"Unsupported file type: {file.mimetype}", 415)
+
+                # Check type and size, and spool the contents, in a single pass
+                try:
+                    upload = spool_upload(file, file.filename, file.mimetype, max_file_size)
+                except InvalidFileType as e:
+                    return create_error_response(str(e), 415)
+                except FileTooLarge as e:
+                    return create_error_response(str(e), 400)
+                spools.callback(upload.close)
+
+                # Add file to file_contents
+                file_contents.append(
+                    {
+                        "filename": file.filename,
+                        "content": upload.file,
+                        "size": upload.size,
+                        "mime": upload.mime,
+                        "extension": upload.extension,
+                        "sha256": upload.sha256,
+                    }
                 )
+            spools.pop_all()
 
-            # Ensure file size is not too large
-            file.seek(0)
-            if len(file.read()) > max_file_size:
-                return create_error_response(f"File '{file.filename}' is too large (max 30MB)", 400)
-
-            # Add file to file_contents
-            file.seek(0)
-            file_contents.append(
-                {
-                    "filename": file.filename,
-                    "content": file.read(),
-                    "mime": file_type.mime,
-                    "extension": file_type.extension,
-                }
-            )
-
-        # Store files in blob storage
-        asyncio.run(upload_files_to_blob_storage(file_contents))
+        # Store files in blob storage, on the worker's long-lived event loop
+        run_coroutine(upload_files_to_blob_storage(file_contents))
     else:
         files = []
 
@@ -167,6 +144,7 @@ def main(req: HttpRequest) -> HttpResponse:
         "question_types": question_types,
         "files": file_contents,
         "content": content,
+        "fresh_questions": fresh_questions,
         "processed": False,
         "errored": False,
         "invite_code": secrets.token_hex(3),
@@ -182,18 +160,9 @@ def main(req: HttpRequest) -> HttpResponse:
         logging.error("Error saving document to database: ", e)
         return create_error_response("Error saving document to database", 500)
 
-    # Add processing job to queue as json
-    QueueProxy.send_message(
-        base64.b64encode(
-            json.dumps(
-                {
-                    "quiz_id": created_quiz["id"],
-                    "user_id": user_id,
-                    "files": file_contents,
-                }
-            ).encode("utf-8")
-        ).decode("utf-8")
-    )
+    # Add processing job to queue, the processor reads everything else from the quiz
+    size = sum(file["size"] for file in file_contents) + len(content)
+    QueueProxy.send_message(encode_document_jobs([DocumentJob(created_quiz["id"], size=size)]))
 
     # json response
     return HttpResponse(
@@ -0,0 +1,176 @@
+import json
+import logging
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError, CosmosHttpResponseError
+from azure.functions import HttpRequest, HttpResponse
+from models import FileTooLarge, InvalidFileType, InvalidUpload
+from utils import (
+    DocumentJob,
+    create_error_response,
+    encode_document_jobs,
+    get_document_container,
+    get_queue_client,
+    get_quizzes_container,
+)
+from utils.files import header_size, max_file_size, sniff_file_type
+
+# Proxy to CosmosDB
+QuizContainerProxy = get_quizzes_container()
+QueueProxy = get_queue_client()
+
+
+def verify_upload(file: dict) -> None:
+    """
+    Checks the size and magic number of a file uploaded straight to blob storage, reading
+    only the header of the blob. The blob's ETag is recorded, so the processor only reads
+    the version that was verified even though the upload URL is still valid.
+
+    Args:
+        file (dict): The file entry from the quiz document, its size and etag are updated
+            in place.
+
+    Raises:
+        InvalidUpload: If the file wasn't uploaded, or changed while it was being verified.
+        FileTooLarge: If the file is larger than max_file_size.
+        InvalidFileType: If the file's contents don't match its MIME type.
+    """
+    blob_client = get_document_container().get_blob_client(file["blob_name"])
+
+    try:
+        properties = blob_client.get_blob_properties()
+    except ResourceNotFoundError:
+        raise InvalidUpload(f"File '{file['filename']}' has not been uploaded")
+
+    if properties.size > max_file_size:
+        raise FileTooLarge(f"File '{file['filename']}' is too large (max 30MB)")
+
+    # Ensure file binary is correct (magic number check), on the version that was measured
+    try:
+        header = blob_client.download_blob(
+            offset=0,
+            length=header_size,
+            etag=properties.etag,
+            match_condition=MatchConditions.IfNotModified,
+        ).readall()
+    except ResourceModifiedError:
+        raise InvalidUpload(f"File '{file['filename']}' changed while it was being verified")
+
+    file_type = sniff_file_type(header)
+    if file_type is None or file_type.mime != file["mime"]:
+        raise InvalidFileType(f"File '{file['filename']}' is not a {file['mime']} file")
+
+    file["size"] = properties.size
+    file["etag"] = properties.etag
+
+
+def rejectUpload(quiz: dict, error: str, status_code: int) -> HttpResponse:
+    """
+    Deletes the uploads of a quiz whose files failed verification and marks it errored, so
+    it no longer waits for an upload. The client has to start again with upload_request.
+
+    Args:
+        quiz (dict): The quiz document as it was read.
+        error (str): The error message.
+        status_code (int): The HTTP status code of the error.
+
+    Returns:
+        HttpResponse: The error response.
+    """
+    try:
+        get_document_container().delete_blobs(
+            *[file["blob_name"] for file in quiz.get("files", [])], raise_on_any_failure=False
+        )
+    except Exception as e:
+        logging.error("Error deleting blobs: %s", e, exc_info=True)
+
+    quiz["awaiting_upload"] = False
+    quiz["errored"] = True
+    try:
+        QuizContainerProxy.replace_item(
+            item=quiz["id"],
+            body=quiz,
+            etag=quiz["_etag"],
+            match_condition=MatchConditions.IfNotModified,
+        )
+    except CosmosAccessConditionFailedError:
+        # Finalized by a concurrent call, which owns the quiz now
+        pass
+    except Exception as e:
+        logging.error("Error setting quiz errored: %s", e, exc_info=True)
+
+    return create_error_response(error, status_code)
+
+
+def main(req: HttpRequest) -> HttpResponse:
+    """
+    Second step of a direct upload: verifies the files the client uploaded with the URLs
+    from upload_request, then queues the quiz for processing. If a file is invalid, the
+    uploads are deleted and the quiz is marked errored; the client has to start again with
+    upload_request.
+    """
+    logging.info("Finalizing upload")
+
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        return create_error_response("Request body must be JSON.", 400)
+
+    if not all(key in req_body for key in ("quiz_id", "user_id")):
+        return create_error_response("Invalid request body. Missing 'quiz_id' or 'user_id'", 400)
+
+    quiz_id = req_body["quiz_id"]
+    user_id = req_body["user_id"]
+
+    try:
+        quiz = QuizContainerProxy.read_item(item=quiz_id, partition_key=quiz_id)
+    except CosmosHttpResponseError:
+        return create_error_response(f"Quiz with id {quiz_id} not found.", 404)
+
+    if quiz["user_id"] != user_id:
+        return create_error_response("User is not the author of the quiz", 403)
+    if not quiz.get("awaiting_upload"):
+        return create_error_response("Quiz is not waiting for an upload", 409)
+
+    # Verify every uploaded file, removing the uploads if any is invalid
+    for file in quiz.get("files", []):
+        try:
+            verify_upload(file)
+        except InvalidFileType as e:
+            return rejectUpload(quiz, str(e), 415)
+        except (FileTooLarge, InvalidUpload) as e:
+            return rejectUpload(quiz, str(e), 400)
+        except Exception as e:
+            logging.error("Error verifying upload: %s", e, exc_info=True)
+            return create_error_response("Error verifying upload", 500)
+
+    # Only the first of concurrent finalize calls may queue the quiz
+    quiz["awaiting_upload"] = False
+    try:
+        QuizContainerProxy.replace_item(
+            item=quiz_id,
+            body=quiz,
+            etag=quiz["_etag"],
+            match_condition=MatchConditions.IfNotModified,
+        )
+    except CosmosAccessConditionFailedError:
+        return create_error_response("Quiz is not waiting for an upload", 409)
+    except Exception as e:
+        logging.error("Error saving document to database: %s", e)
+        return create_error_response("Error saving document to database", 500)
+
+    # Add processing job to queue, the processor reads everything else from the quiz
+    size = sum(file["size"] for file in quiz.get("files", [])) + len(quiz["content"])
+    QueueProxy.send_message(encode_document_jobs([DocumentJob(quiz_id, size=size)]))
+
+    return HttpResponse(
+        body=json.dumps(
+            {
+                "id": quiz_id,
+                "name": quiz["name"],
+            }
+        ),
+        status_code=200,
+        mimetype="application/json",
+    )
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import secrets
+import uuid
+from datetime import datetime
+
+from azure.functions import HttpRequest, HttpResponse
+from models import InvalidField
+from utils import (
+    create_error_response,
+    generate_upload_url,
+    get_quizzes_container,
+    get_user_container,
+    validate_quiz_settings,
+)
+from utils.files import max_file_size, supported_filetypes
+
+# How long the client has to upload its files
+upload_url_expiry_minutes = int(os.environ.get("UploadUrlExpiryMinutes", 10))
+
+# Proxy to CosmosDB
+UserContainerProxy = get_user_container()
+QuizContainerProxy = get_quizzes_container()
+
+
+def main(req: HttpRequest) -> HttpResponse:
+    """
+    First step of a direct upload: creates the quiz and returns a write-only upload URL for
+    each file, so the client can send the files straight to blob storage. The quiz is only
+    processed once upload_finalize has verified the uploaded files.
+    """
+    logging.info("Requesting upload urls")
+
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        return create_error_response("Request body must be JSON.", 400)
+
+    quiz_name = str(req_body.get("quiz_name", "")).strip()
+    user_id = req_body.get("user_id")
+    content = str(req_body.get("content", "")).strip()
+    topic = str(req_body.get("topic", ""))
+    num_questions = req_body.get("num_questions")
+    question_types = req_body.get("question_types", [])
+    files = req_body.get("files", [])
+    fresh_questions = req_body.get("fresh_questions", False) is True
+
+    # Check missing data
+    if not quiz_name or not user_id:
+        return create_error_response("Missing quiz name or user id", 400)
+    if not num_questions or not question_types:
+        return create_error_response("Missing num_questions or question_types", 400)
+    if not isinstance(question_types, list) or not isinstance(files, list):
+        return create_error_response("'question_types' and 'files' should be lists", 400)
+    if not files and not content:
+        return create_error_response("Must upload files or provide text content", 400)
+    if len(files) > 3:
+        return create_error_response("Max 3 files", 400)
+
+    # Validate
+    try:
+        num_questions = validate_quiz_settings(
+            quiz_name, content, topic, num_questions, question_types
+        )
+    except InvalidField as e:
+        return create_error_response(str(e), 400)
+
+    # Validate the declared files, the uploads are checked again when finalizing
+    for file in files:
+        if not isinstance(file, dict) or not file.get("filename"):
+            return create_error_response("Each file needs a filename", 400)
+        if file.get("mime") not in supported_filetypes:
+            return create_error_response(f"Unsupported file type: {file.get('mime')}", 415)
+        if not isinstance(file.get("size"), int) or file["size"] > max_file_size:
+            return create_error_response(f"File '{file['filename']}' is too large (max 30MB)", 400)
+
+    # Validate if user exists
+    try:
+        UserContainerProxy.read_item(item=user_id, partition_key=user_id)
+    except Exception:
+        return create_error_response(f"User with id {user_id} not found.", 404)
+
+    file_contents = []
+    for file in files:
+        blob_name = f"{uuid.uuid4()}.{supported_filetypes[file['mime']]}"
+        file_contents.append(
+            {
+                "filename": file["filename"],
+                "mime": file["mime"],
+                "extension": supported_filetypes[file["mime"]],
+                "blob_name": blob_name,
+                "size": file["size"],
+            }
+        )
+
+    # Save document to database, waiting for the uploads
+    process_body = {
+        "user_id": user_id,
+        "shared_with": [],
+        "name": quiz_name,
+        "topic": topic,
+        "num_questions": num_questions,
+        "question_types": question_types,
+        "files": file_contents,
+        "content": content,
+        "fresh_questions": fresh_questions,
+        "processed": False,
+        "errored": False,
+        "awaiting_upload": True,
+        "invite_code": secrets.token_hex(3),
+        "scores": [],
+        "created_at": datetime.utcnow().isoformat() + "Z",
+    }
+    try:
+        created_quiz = QuizContainerProxy.create_item(
+            body=process_body,
+            enable_automatic_id_generation=True,
+        )
+    except Exception as e:
+        logging.error("Error saving document to database: %s", e)
+        return create_error_response("Error saving document to database", 500)
+
+    # json response
+    return HttpResponse(
+        body=json.dumps(
+            {
+                "id": created_quiz["id"],
+                "name": created_quiz["name"],
+                "uploads": [
+                    {
+                        "filename": file["filename"],
+                        "blob_name": file["blob_name"],
+                        "upload_url": generate_upload_url(
+                            file["blob_name"], upload_url_expiry_minutes
+                        ),
+                    }
+                    for file in file_contents
+                ],
+            }
+        ),
+        status_code=200,
+        mimetype="application/json",
+    )
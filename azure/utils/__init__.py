@@ -1,5 +1,17 @@
 from .create_error_response import create_error_response
-from .db_proxy import get_user_container, get_quizzes_container
-from .blob_proxy import get_blob_client, get_async_blob_client
+from .db_proxy import get_user_container, get_quizzes_container, get_question_bank_container
+from .blob_proxy import (
+    download_blob,
+    generate_upload_url,
+    get_async_blob_client,
+    get_async_document_container,
+    get_blob_client,
+    get_document_container,
+    upload_blob_blocks,
+)
 from .queue_proxy import get_queue_client
 from .pubsub_proxy import get_pubsub_client
+from .blob_cache import BlobCache
+from .event_loop import get_event_loop, run_coroutine
+from .validate_quiz_settings import validate_quiz_settings
+from .document_job import DocumentJob, decode_document_jobs, encode_document_jobs
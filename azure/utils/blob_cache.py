@@ -0,0 +1,103 @@
+import gzip
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+from .blob_proxy import get_document_container
+
+
+class BlobCache:
+    """
+    A string cache with an in-process LRU tier in front of gzip-compressed blobs.
+
+    Entries are stored under "<prefix>/<key>.gz" in the document blob container. The
+    in-process tier is bounded by the total number of characters it holds. With a TTL,
+    entries expire in both tiers that many seconds after they were stored.
+    """
+
+    def __init__(self, prefix: str, max_chars: int, ttl: int = None):
+        self.prefix = prefix
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        """
+        Looks up a cached value, first in memory and then in blob storage.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str | None: The cached value, or None on a miss.
+        """
+        with self._lock:
+            if key in self._entries:
+                value, expires_at = self._entries[key]
+                if expires_at is None or expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    return value
+                self._size -= len(self._entries.pop(key)[0])
+
+        try:
+            blob_client = get_document_container().get_blob_client(self._blob_name(key))
+            downloader = blob_client.download_blob()
+            stored_at = downloader.properties.last_modified.timestamp()
+            if self.ttl is not None and stored_at + self.ttl <= time.time():
+                return None
+            value = gzip.decompress(downloader.readall()).decode("utf-8")
+        except ResourceNotFoundError:
+            return None
+        except Exception as e:
+            logging.error("Error reading %s cache entry: %s", self.prefix, e, exc_info=True)
+            return None
+
+        self._remember(key, value, stored_at)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        """
+        Stores a value in memory and in blob storage.
+
+        Args:
+            key (str): The cache key.
+            value (str): The value to cache.
+        """
+        self._remember(key, value, time.time())
+
+        try:
+            blob_client = get_document_container().get_blob_client(self._blob_name(key))
+            blob_client.upload_blob(
+                gzip.compress(value.encode("utf-8")),
+                blob_type="BlockBlob",
+                overwrite=True,
+                content_settings=ContentSettings(content_type="application/gzip"),
+            )
+        except Exception as e:
+            logging.error("Error writing %s cache entry: %s", self.prefix, e, exc_info=True)
+
+    def _remember(self, key: str, value: str, stored_at: float) -> None:
+        # Values larger than the whole cache are only kept in blob storage
+        if len(value) > self.max_chars:
+            return
+
+        expires_at = stored_at + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key)[0])
+            self._entries[key] = (value, expires_at)
+            self._size += len(value)
+
+            # Evict the least recently used entries
+            while self._size > self.max_chars:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _blob_name(self, key: str) -> str:
+        return f"{self.prefix}/{key}.gz"
@@ -1,8 +1,60 @@
+import asyncio
 import os
 import uuid
+from datetime import datetime, timedelta, timezone
+from typing import IO
 
-from azure.storage.blob import BlobClient
+import requests
+from azure.core import MatchConditions
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import (
+    BlobClient,
+    BlobSasPermissions,
+    ContainerClient,
+    ContentSettings,
+    generate_blob_sas,
+)
 from azure.storage.blob.aio import BlobClient as AsyncBlobClient
+from azure.storage.blob.aio import ContainerClient as AsyncContainerClient
+from requests.adapters import HTTPAdapter
+
+# Connection pool and download settings for the shared document container client
+blob_connection_pool_size = int(os.environ.get("BlobConnectionPoolSize", 16))
+blob_download_concurrency = int(os.environ.get("BlobDownloadConcurrency", 4))
+blob_download_chunk_size = int(os.environ.get("BlobDownloadChunkSize", 4 * 1024 * 1024))
+blob_connection_timeout = int(os.environ.get("BlobConnectionTimeout", 10))
+blob_read_timeout = int(os.environ.get("BlobReadTimeout", 60))
+
+# Files larger than one block are uploaded as blocks staged in parallel
+upload_block_size = int(os.environ.get("UploadBlockSize", 4 * 1024 * 1024))
+upload_concurrency = int(os.environ.get("UploadConcurrency", 8))
+
+
+def _create_pooled_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=blob_connection_pool_size, pool_maxsize=blob_connection_pool_size
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared client for the document container. It lives as long as the worker process, so its
+# pooled connections are reused across function invocations. Blobs larger than one chunk
+# are downloaded as parallel ranged reads, and failed requests are retried by the SDK.
+DocumentContainer = ContainerClient.from_connection_string(
+    os.environ["AzureStorageConnectionString"],
+    container_name=os.environ["DocumentBlobContainer"],
+    transport=RequestsTransport(
+        session=_create_pooled_session(),
+        session_owner=False,
+        connection_timeout=blob_connection_timeout,
+        read_timeout=blob_read_timeout,
+    ),
+    max_single_get_size=blob_download_chunk_size,
+    max_chunk_get_size=blob_download_chunk_size,
+)
 
 
 def get_blob_client(filetype: str = None, blob_name: str = None) -> BlobClient:
@@ -50,3 +102,147 @@ def get_async_blob_client(filetype: str = None, blob_name: str = None) -> AsyncB
         container_name=os.environ["DocumentBlobContainer"],
         blob_name=(blob_name_gen + "." + filetype) if blob_name is None else blob_name,
     )
+
+
+def get_document_container() -> ContainerClient:
+    """
+    Returns the shared, connection-pooled ContainerClient for the document container.
+    Don't close it, it is reused across function invocations.
+
+    Returns:
+        ContainerClient: The shared ContainerClient for the document container.
+    """
+    return DocumentContainer
+
+
+# Shared async client for the document container, see get_async_document_container
+_async_document_container = None
+
+
+def get_async_document_container() -> AsyncContainerClient:
+    """
+    Returns the shared AsyncContainerClient for the document container. Its connections are
+    bound to the event loop that first uses them, so only use it from coroutines running on
+    the worker event loop (utils.event_loop). Don't close it.
+
+    Returns:
+        AsyncContainerClient: The shared AsyncContainerClient for the document container.
+    """
+    global _async_document_container
+
+    if _async_document_container is None:
+        _async_document_container = AsyncContainerClient.from_connection_string(
+            os.environ["AzureStorageConnectionString"],
+            container_name=os.environ["DocumentBlobContainer"],
+            connection_timeout=blob_connection_timeout,
+            read_timeout=blob_read_timeout,
+        )
+    return _async_document_container
+
+
+async def upload_blob_blocks(blob_name: str, file: IO[bytes], size: int, content_type: str) -> str:
+    """
+    Uploads a file to the document container using the shared async client. Files larger
+    than one block are staged as blocks, up to `upload_concurrency` at a time, and then
+    committed in order, so at most that many blocks are held in memory.
+
+    Args:
+        blob_name (str): The name of the blob.
+        file (IO[bytes]): The file, positioned at the start.
+        size (int): The size of the file in bytes.
+        content_type (str): The MIME type of the file.
+
+    Returns:
+        str: The URL of the uploaded blob.
+    """
+    blob_client = get_async_document_container().get_blob_client(blob_name)
+    content_settings = ContentSettings(content_type=content_type)
+
+    if size <= upload_block_size:
+        await blob_client.upload_blob(
+            file.read(),
+            blob_type="BlockBlob",
+            overwrite=True,
+            content_settings=content_settings,
+        )
+        return blob_client.url
+
+    # Block ids must all have the same length within a blob
+    block_count = -(-size // upload_block_size)
+    block_ids = [f"{index:05d}" for index in range(block_count)]
+    slots = asyncio.Semaphore(upload_concurrency)
+
+    async def stage_block(block_id: str, data: bytes) -> None:
+        try:
+            await blob_client.stage_block(block_id, data, length=len(data))
+        finally:
+            slots.release()
+
+    tasks = []
+    try:
+        # Read the next block only once a slot is free
+        for block_id in block_ids:
+            await slots.acquire()
+            data = file.read(upload_block_size)
+            tasks.append(asyncio.create_task(stage_block(block_id, data)))
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    await blob_client.commit_block_list(block_ids, content_settings=content_settings)
+    return blob_client.url
+
+
+def download_blob(blob_name: str, etag: str = None) -> bytes:
+    """
+    Downloads a blob from the document container using the shared client. Large blobs are
+    fetched as parallel ranged reads.
+
+    Args:
+        blob_name (str): The name of the blob.
+        etag (str, optional): Only download the blob if it still has this ETag, e.g. the
+            one recorded when it was verified. Defaults to any version.
+
+    Raises:
+        ResourceModifiedError: If the blob no longer has the given ETag.
+
+    Returns:
+        bytes: The contents of the blob.
+    """
+    conditions = {}
+    if etag:
+        conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified}
+    downloader = DocumentContainer.download_blob(
+        blob_name, max_concurrency=blob_download_concurrency, **conditions
+    )
+    return downloader.readall()
+
+
+def generate_upload_url(blob_name: str, expiry_minutes: int) -> str:
+    """
+    Returns a short-lived SAS URL that only allows a client to write the given blob in the
+    document container. Works with any storage account connection string that contains an
+    account key, including the local storage emulator.
+
+    The URL stays valid after the upload is finalized, so the ETag recorded then must be
+    checked when the blob is read (see download_blob).
+
+    Args:
+        blob_name (str): The name of the blob the client may write.
+        expiry_minutes (int): How long the URL stays valid for.
+
+    Returns:
+        str: The URL to upload the blob to.
+    """
+    credential = DocumentContainer.credential
+    sas_token = generate_blob_sas(
+        account_name=credential.account_name,
+        container_name=DocumentContainer.container_name,
+        blob_name=blob_name,
+        account_key=credential.account_key,
+        permission=BlobSasPermissions(create=True, write=True),
+        expiry=datetime.now(timezone.utc) + timedelta(minutes=expiry_minutes),
+    )
+    return f"{DocumentContainer.get_blob_client(blob_name).url}?{sas_token}"
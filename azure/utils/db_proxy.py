@@ -1,9 +1,28 @@
 import os
+import threading
 
-from azure.cosmos import ContainerProxy, CosmosClient
+from azure.cosmos import ContainerProxy, CosmosClient, DatabaseProxy
 
-MyCosmos = CosmosClient.from_connection_string(os.environ["AzureCosmosDBConnectionString"])
-MainDBProxy = MyCosmos.get_database_client(os.environ["Database"])
+# The client connects when it is created, so it is only created once a container is needed
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database() -> DatabaseProxy:
+    """
+    Retrieves the database client, connecting to Cosmos DB on first use.
+
+    Returns:
+        DatabaseProxy: The database client.
+    """
+    global _database
+    with _database_lock:
+        if _database is None:
+            client = CosmosClient.from_connection_string(
+                os.environ["AzureCosmosDBConnectionString"]
+            )
+            _database = client.get_database_client(os.environ["Database"])
+        return _database
 
 
 def get_user_container() -> ContainerProxy:
@@ -13,7 +32,7 @@ def get_user_container() -> ContainerProxy:
     Returns:
         ContainerProxy: The container client for the user container.
     """
-    return MainDBProxy.get_container_client(os.environ["UserContainer"])
+    return get_database().get_container_client(os.environ["UserContainer"])
 
 
 def get_quizzes_container() -> ContainerProxy:
@@ -23,4 +42,16 @@ def get_quizzes_container() -> ContainerProxy:
     Returns:
         ContainerProxy: The container client for the quizzes container.
     """
-    return MainDBProxy.get_container_client(os.environ["QuizzesContainer"])
+    return get_database().get_container_client(os.environ["QuizzesContainer"])
+
+
+def get_question_bank_container() -> ContainerProxy | None:
+    """
+    Retrieves the container client for the question bank container.
+
+    Returns:
+        ContainerProxy | None: The container client for the question bank container, or None
+            if no question bank container is configured.
+    """
+    container = os.environ.get("QuestionBankContainer")
+    return get_database().get_container_client(container) if container else None
@@ -0,0 +1,82 @@
+import base64
+import json
+
+# Version of the document queue envelope written by encode_document_jobs. Version 1 is the
+# original message: {"quiz_id", "user_id", "files"}, with the file list copied from the quiz.
+document_job_version = 2
+
+# Priorities, jobs with a higher priority are processed first within a message
+default_job_priority = 0
+
+
+class DocumentJob:
+    """
+    A request to process the documents of a quiz. Everything else is read from the quiz
+    document, so the job only carries its id.
+
+    Args:
+        quiz_id (str): The id of the quiz to process.
+        priority (int, optional): Higher runs first. Defaults to default_job_priority.
+        size (int, optional): Hint of the amount of input, in bytes. Defaults to 0.
+    """
+
+    def __init__(self, quiz_id: str, priority: int = default_job_priority, size: int = 0):
+        self.quiz_id = quiz_id
+        self.priority = priority
+        self.size = size
+
+    def __repr__(self) -> str:
+        return f"DocumentJob({self.quiz_id!r}, priority={self.priority}, size={self.size})"
+
+
+def encode_document_jobs(jobs: list[DocumentJob]) -> str:
+    """
+    Encodes one or more jobs into a single document queue message.
+
+    Example: {"v":2,"jobs":[["<quiz id>",0,1048576]]}, base64 encoded.
+
+    Args:
+        jobs (list[DocumentJob]): The jobs to send together.
+
+    Returns:
+        str: The base64 encoded message.
+    """
+    envelope = {
+        "v": document_job_version,
+        "jobs": [[job.quiz_id, job.priority, job.size] for job in jobs],
+    }
+    return base64.b64encode(json.dumps(envelope, separators=(",", ":")).encode("utf-8")).decode(
+        "utf-8"
+    )
+
+
+def decode_document_jobs(body: bytes | str) -> list[DocumentJob]:
+    """
+    Decodes a document queue message body (after the queue trigger removed the base64
+    encoding), either a versioned envelope or an original version 1 message.
+
+    Args:
+        body (bytes | str): The JSON message body.
+
+    Raises:
+        ValueError: If the message is not valid JSON or not a known message format.
+
+    Returns:
+        list[DocumentJob]: The jobs, highest priority first, then smallest first.
+    """
+    message = json.loads(body)
+    if not isinstance(message, dict):
+        raise ValueError("Message is not a JSON object")
+
+    version = message.get("v", 1)
+    if version == 1:
+        if "quiz_id" not in message:
+            raise ValueError("Message body missing quiz_id")
+        size = sum(file.get("size", 0) for file in message.get("files") or [])
+        jobs = [DocumentJob(message["quiz_id"], size=size)]
+    elif version == document_job_version:
+        jobs = [DocumentJob(quiz_id, priority, size) for quiz_id, priority, size in message["jobs"]]
+    else:
+        raise ValueError(f"Unknown message version: {version}")
+
+    return sorted(jobs, key=lambda job: (-job.priority, job.size))
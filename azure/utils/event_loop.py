@@ -0,0 +1,42 @@
+import asyncio
+import threading
+from typing import Any, Coroutine
+
+# One event loop per worker process, running in a background thread. Async clients created
+# on it (and their connection pools) outlive a single function invocation, which
+# asyncio.run can't offer since it closes its loop when it returns.
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the worker's long-lived event loop, starting it on first use.
+
+    Returns:
+        asyncio.AbstractEventLoop: The running background event loop.
+    """
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="worker-event-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def run_coroutine(coroutine: Coroutine, timeout: float = None) -> Any:
+    """
+    Runs a coroutine on the worker's event loop and waits for its result. Use this instead
+    of asyncio.run from synchronous function code.
+
+    Args:
+        coroutine (Coroutine): The coroutine to run.
+        timeout (float, optional): Seconds to wait for the result. Defaults to no limit.
+
+    Returns:
+        Any: The result of the coroutine. Exceptions raised by it are re-raised here.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result(timeout)
@@ -1 +1,17 @@
-from .convert_to_text import convert_to_text
+from .convert_to_text import (
+    chars_per_token,
+    convert_buffer_to_text,
+    convert_buffer_to_text_async,
+    convert_to_text,
+    keep_unicode_text,
+)
+from .text_cache import text_cache, text_cache_key
+from .clean_text import TextNormaliser, clean_text
+from .spool_upload import (
+    SpooledUpload,
+    header_size,
+    max_file_size,
+    sniff_file_type,
+    spool_upload,
+    supported_filetypes,
+)
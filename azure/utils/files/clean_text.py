@@ -0,0 +1,70 @@
+import re
+import string
+
+# Characters that are not letters, digits, whitespace or punctuation
+ascii_special_characters = re.compile(r"[^a-zA-Z0-9\s" + re.escape(string.punctuation) + "]+")
+
+# As above, but letters and digits from any script are kept (\w is Unicode aware)
+unicode_special_characters = re.compile(r"[^\w\s" + re.escape(string.punctuation) + "]+")
+
+
+class TextNormaliser:
+    """
+    Removes special characters (except from punctuation) and collapses whitespace.
+
+    Args:
+        keep_unicode (bool, optional): Keep non-ASCII letters and digits, such as accented
+            characters, instead of removing them. Defaults to False.
+    """
+
+    def __init__(self, keep_unicode: bool = False):
+        self.keep_unicode = keep_unicode
+        self._special_characters = (
+            unicode_special_characters if keep_unicode else ascii_special_characters
+        )
+
+    def normalise(self, raw_text: str) -> str:
+        """
+        Normalises a string, such as the text of one page, paragraph or slide.
+
+        Args:
+            raw_text (str): The text to normalise.
+
+        Returns:
+            str: The normalised text, without leading/trailing white space.
+        """
+        # str.split() both collapses and strips whitespace
+        return " ".join(self._special_characters.sub("", raw_text).split())
+
+
+# Shared normalisers
+ascii_normaliser = TextNormaliser()
+unicode_normaliser = TextNormaliser(keep_unicode=True)
+
+
+def get_normaliser(keep_unicode: bool = False) -> TextNormaliser:
+    """
+    Returns the shared normaliser for the given mode.
+
+    Args:
+        keep_unicode (bool, optional): Keep non-ASCII letters and digits. Defaults to False.
+
+    Returns:
+        TextNormaliser: The shared normaliser.
+    """
+    return unicode_normaliser if keep_unicode else ascii_normaliser
+
+
+def clean_text(raw_text: str, keep_unicode: bool = False) -> str:
+    """
+    Removes special characters (except from punctuation), collapses whitespaces and line
+    breaks, and removes leading/trailing white space.
+
+    Args:
+        raw_text (str): The text to clean.
+        keep_unicode (bool, optional): Keep non-ASCII letters and digits. Defaults to False.
+
+    Returns:
+        str: The cleaned text.
+    """
+    return get_normaliser(keep_unicode).normalise(raw_text)
@@ -1,95 +1,489 @@
+import asyncio
+import io
 import logging
 import os
-import re
-import string
-import tempfile
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Iterable, Iterator, Sequence
 
 import fitz
-import requests
-import textract
 
+from ..blob_proxy import download_blob
+from .clean_text import TextNormaliser, get_normaliser
+from .office_xml import PptxSlides, iter_docx_paragraphs, iter_pptx_slides
 
-def convert_to_text(file_url: str, mime: str) -> str:
+# Processes in the worker's shared extraction pool, and how many of them the pages of one
+# PDF can be split across. PDFs with at least the threshold number of pages are split, also
+# when they are read with a budget (e.g. ExtractionTokenBudget in process_documents): then
+# the pages the rest of the budget is estimated to need are split, until it is met.
+extraction_workers = int(os.environ.get("ExtractionWorkers", os.cpu_count() or 1))
+pdf_extraction_workers = int(os.environ.get("PdfExtractionWorkers", extraction_workers))
+pdf_parallel_page_threshold = int(os.environ.get("PdfParallelPageThreshold", 100))
+
+# Rough characters of cleaned text on a PDF page, for the first estimate of how many pages
+# a budget needs
+pdf_chars_per_page_estimate = 2000
+
+# Created on first use and kept for the life of the worker, see get_extraction_pool
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+# Keep non-ASCII letters (e.g. accented text) when cleaning extracted text
+keep_unicode_text = os.environ.get("KeepUnicodeText", "false").lower() == "true"
+
+# Rough number of characters per token, used to turn token budgets into character budgets
+chars_per_token = 4
+
+# How sections are picked when only part of a document fits in the budget:
+# "first" reads from the start, "even" samples evenly across the whole document
+extraction_strategies = ("first", "even")
+
+
+def convert_to_text(
+    blob_name: str,
+    mime: str,
+    keep_unicode: bool = keep_unicode_text,
+    max_chars: int = None,
+    max_tokens: int = None,
+    strategy: str = "first",
+) -> str:
     """
     Converts a file to text.
 
     Args:
-        file_url (str): The URL of the file to be converted. Example: https://a.blob.core.windows.net/blobs/1.pdf
+        blob_name (str): The name of the file in the document container. Example: 1.pdf
         mime (str): The MIME type of the file. Example: application/pdf
+        keep_unicode (bool, optional): Keep non-ASCII letters when cleaning the text.
+            Defaults to the KeepUnicodeText setting.
+        max_chars (int, optional): Stop reading the file once this many characters of text
+            have been extracted. Defaults to no limit.
+        max_tokens (int, optional): As max_chars, but in (estimated) tokens.
+        strategy (str, optional): Which sections to read when a budget is set, one of
+            "first" or "even". Defaults to "first".
 
     Returns:
         str: The converted text.
     """
-    logging.info(f"Converting file to text: {file_url}, {mime}")
+    logging.info(f"Converting file to text: {blob_name}, {mime}")
 
     try:
-        response = requests.get(file_url)  # http request to get the file
-        response.raise_for_status()  # check if successful before continuing
-        file = response.content  # retrieve raw content of the file
-
-        # Determine file extension based on MIME type
-        match mime.lower():
-            case "application/pdf":
-                file_extension = "pdf"
-            case "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                file_extension = "docx"
-            case "application/vnd.openxmlformats-officedocument.presentationml.presentation":
-                file_extension = "pptx"
-            case _:
-                logging.error(f"Unknown MIME type: {mime}")
-                return ""
-
-        # Create temporary file to store the file
-        with tempfile.NamedTemporaryFile(suffix=f".{file_extension}", delete=False) as temp_file:
-            # Write file to temporary file
-            temp_file.write(file)
-            temp_file.seek(0)
-            logging.info(f"File successfully saved path: {temp_file.name}")
-
-            # specific functions for PDF as they don't work with textract
-            if file_extension == "pdf":
-                text = text_pdf(temp_file.name)
-            else:
-                # textract library works flawlessly with DOCX and PPTX
-                text = textract.process(temp_file.name).decode("utf-8")
-
-            # remove all unnecessary characters
-            cleaned_text = clean_text(text)
-            logging.info(f"Text successfully extracted from '{file_url}")
-
-            # Clean up
-            temp_file.close()
-            os.remove(temp_file.name)
-            logging.info(f"Temporary file '{temp_file.name}' deleted")
-
-            return cleaned_text
+        file = download_blob(blob_name)
+        cleaned_text = convert_buffer_to_text(
+            file, mime, keep_unicode, max_chars=max_chars, max_tokens=max_tokens, strategy=strategy
+        )
+        logging.info(f"Text successfully extracted from '{blob_name}")
+
+        return cleaned_text
 
     except Exception as e:
         logging.error(f"Error converting file to text: {e}")
         return ""
 
 
+def convert_buffer_to_text(
+    file: io.BytesIO | bytes,
+    mime: str,
+    keep_unicode: bool = keep_unicode_text,
+    max_chars: int = None,
+    max_tokens: int = None,
+    strategy: str = "first",
+) -> str:
+    """
+    Extracts and cleans the text of a file that has already been downloaded.
+
+    With a budget, pages (PDF), paragraphs (DOCX) or slides (PPTX) stop being read as soon
+    as the cleaned text reaches it, so the rest of a large document is never parsed.
+
+    Args:
+        file (io.BytesIO | bytes): The file contents.
+        mime (str): The MIME type of the file.
+        keep_unicode (bool, optional): Keep non-ASCII letters when cleaning the text.
+            Defaults to the KeepUnicodeText setting.
+        max_chars (int, optional): The character budget. Defaults to no limit.
+        max_tokens (int, optional): The budget in (estimated) tokens, used instead of
+            max_chars when given.
+        strategy (str, optional): "first" reads sections from the start of the document,
+            "even" samples them evenly across the whole document. Defaults to "first".
+
+    Returns:
+        str: The cleaned text, one line per non-empty section.
+    """
+    if strategy not in extraction_strategies:
+        raise ValueError(f"Unknown extraction strategy: {strategy}")
+    if isinstance(file, bytes):
+        file = io.BytesIO(file)
+    if max_tokens is not None:
+        max_chars = max_tokens * chars_per_token
+
+    normaliser = get_normaliser(keep_unicode)
+
+    # Sections stay on separate lines, so later stages can split the text on them
+    if max_chars is None:
+        # remove all unnecessary characters, one page/paragraph/slide at a time
+        sections = map(normaliser.normalise, extract_text(file, mime))
+        return "\n".join(text for text in sections if text)
+
+    with open_sections(file, mime, indexed=strategy == "even") as sections:
+        return "\n".join(select_sections(sections, max_chars, strategy, normaliser))
+
+
+def select_sections(
+    sections: Iterable[str], max_chars: int, strategy: str, normaliser: TextNormaliser
+) -> list[str]:
+    """
+    Reads and cleans sections until their combined length reaches the budget.
+
+    Args:
+        sections (Iterable[str]): The raw sections, which must also be a Sequence for the
+            "even" strategy.
+        max_chars (int): The character budget.
+        strategy (str): "first" or "even".
+        normaliser (TextNormaliser): The normaliser used to clean each section.
+
+    Returns:
+        list[str]: The cleaned sections that were read, in document order.
+    """
+    if strategy == "even":
+        indexed_sections = ((index, sections[index]) for index in spread_order(len(sections)))
+    else:
+        indexed_sections = enumerate(sections)
+
+    selected = {}
+    total_chars = 0
+    for index, raw_text in indexed_sections:
+        text = normaliser.normalise(raw_text)
+        if not text:
+            continue
+
+        selected[index] = text
+        total_chars += len(text) + 1
+        if total_chars >= max_chars:
+            break
+
+    return [selected[index] for index in sorted(selected)]
+
+
+def spread_order(count: int) -> Iterator[int]:
+    """
+    Yields every index in range(count) once, ordered so that any prefix of the order is
+    spread evenly across the range. Example: for 8 it yields 0, 4, 2, 6, 1, 3, 5, 7.
+
+    Args:
+        count (int): The number of indices.
+
+    Yields:
+        int: The next index.
+    """
+    stride = 1
+    while stride * 2 < count:
+        stride *= 2
+
+    seen = set()
+    while stride >= 1:
+        for index in range(0, count, stride):
+            if index not in seen:
+                seen.add(index)
+                yield index
+        stride //= 2
+
+
+class SectionReader:
+    """
+    A lazy sequence of document sections; a section is only extracted when it is read.
+
+    Args:
+        count (int): The number of sections.
+        read_section (Callable[[int], str]): Extracts the raw text of a section by index.
+    """
+
+    def __init__(self, count: int, read_section: Callable[[int], str]):
+        self._count = count
+        self._read_section = read_section
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._read_section(index)
+
+
+@contextmanager
+def open_sections(
+    file: io.BytesIO, mime: str, indexed: bool
+) -> Iterator[Iterable[str] | Sequence[str]]:
+    """
+    Opens a file as a lazily extracted series of sections, closing the document when the
+    context exits.
+
+    Args:
+        file (io.BytesIO): The file contents.
+        mime (str): The MIME type of the file.
+        indexed (bool): Whether random access to the sections is needed.
+
+    Yields:
+        Iterable[str] | Sequence[str]: The sections, a Sequence when indexed is True.
+    """
+    match mime.lower():
+        case "application/pdf":
+            pdf_document = fitz.open(stream=file, filetype="pdf")
+            try:
+                yield SectionReader(
+                    pdf_document.page_count, lambda index: pdf_document[index].get_text()
+                )
+            finally:
+                pdf_document.close()
+        case "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+            # Paragraphs can only be reached by streaming through the document
+            paragraphs = iter_docx_paragraphs(file)
+            try:
+                yield list(paragraphs) if indexed else paragraphs
+            finally:
+                paragraphs.close()
+        case "application/vnd.openxmlformats-officedocument.presentationml.presentation":
+            with PptxSlides(file) as slides:
+                yield SectionReader(len(slides), lambda index: "\n".join(slides[index]))
+        case _:
+            logging.error(f"Unknown MIME type: {mime}")
+            yield []
+
+
+def extract_text(file: io.BytesIO, mime: str) -> Iterable[str]:
+    """
+    Extracts the raw text from an in-memory file.
+
+    Args:
+        file (io.BytesIO): The file contents.
+        mime (str): The MIME type of the file.
+
+    Returns:
+        Iterable[str]: The text of each page (PDF), paragraph (DOCX) or slide (PPTX),
+            or nothing if the MIME type is unknown.
+    """
+    match mime.lower():
+        case "application/pdf":
+            return text_pdf(file)
+        case "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+            return text_docx(file)
+        case "application/vnd.openxmlformats-officedocument.presentationml.presentation":
+            return text_pptx(file)
+        case _:
+            logging.error(f"Unknown MIME type: {mime}")
+            return []
+
+
 def text_pdf(file):
-    # Initialise list of text
-    text = ""
-    pdf_document = fitz.open(file)
+    # Open the pdf straight from memory
+    pdf_document = fitz.open(stream=file, filetype="pdf")
+    try:
+        return [page.get_text() for page in pdf_document]
+    finally:
+        pdf_document.close()
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """
+    Returns the worker's shared process pool for extracting text, creating it on first use.
+    Its processes are reused by every job, so don't shut it down.
+
+    Returns:
+        ProcessPoolExecutor: The shared extraction pool.
+    """
+    global _extraction_pool
+
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            _extraction_pool = ProcessPoolExecutor(max_workers=extraction_workers)
+        return _extraction_pool
+
 
-    # for every page of the pdf
-    for page_number in range(pdf_document.page_count):
-        page = pdf_document[page_number]
-        text += page.get_text()  # add the page text to the running list
+async def convert_buffer_to_text_async(
+    data: bytes,
+    mime: str,
+    keep_unicode: bool = keep_unicode_text,
+    max_chars: int = None,
+    strategy: str = "first",
+    executor: Executor = None,
+) -> str:
+    """
+    Coroutine version of convert_buffer_to_text that runs the extraction on a process pool.
+    The pages of large PDFs are split into shards extracted in parallel, with or without a
+    budget; the pool is never used from inside its own processes.
+
+    Args:
+        data (bytes): The file contents.
+        mime (str): The MIME type of the file.
+        keep_unicode (bool, optional): Keep non-ASCII letters when cleaning the text.
+            Defaults to the KeepUnicodeText setting.
+        max_chars (int, optional): The character budget. Defaults to no limit.
+        strategy (str, optional): "first" or "even", see convert_buffer_to_text.
+        executor (Executor, optional): The pool to run on. Defaults to the shared pool.
+
+    Returns:
+        str: The cleaned text, one line per non-empty section.
+    """
+    if strategy not in extraction_strategies:
+        raise ValueError(f"Unknown extraction strategy: {strategy}")
+    executor = executor or get_extraction_pool()
+    loop = asyncio.get_running_loop()
+
+    if mime.lower() == "application/pdf" and pdf_extraction_workers >= 2:
+        # Opening a PDF only reads its cross-reference table, not its pages
+        page_count = await asyncio.to_thread(pdf_page_count, data)
+        if page_count >= pdf_parallel_page_threshold:
+            return await text_pdf_parallel(
+                data, page_count, keep_unicode, executor, max_chars=max_chars, strategy=strategy
+            )
+
+    return await loop.run_in_executor(
+        executor,
+        partial(
+            convert_buffer_to_text,
+            data,
+            mime,
+            keep_unicode,
+            max_chars=max_chars,
+            strategy=strategy,
+        ),
+    )
+
+
+def pdf_page_count(data: bytes) -> int:
+    pdf_document = fitz.open(stream=data, filetype="pdf")
+    try:
+        return pdf_document.page_count
+    finally:
+        pdf_document.close()
+
+
+async def text_pdf_parallel(
+    data: bytes,
+    page_count: int,
+    keep_unicode: bool,
+    executor: Executor,
+    max_chars: int = None,
+    strategy: str = "first",
+) -> str:
+    """
+    Extracts and cleans the text of a large PDF by sharding its pages across a process pool.
 
-    # Clean up
-    pdf_document.close()
-    return text
+    With a budget, pages are extracted in rounds, in the order the strategy reads them. Each
+    round covers the pages the rest of the budget is estimated to need, from the characters
+    per page seen so far, so at most one round is read past the budget. The text is the
+    same as convert_buffer_to_text's.
+
+    Args:
+        data (bytes): The raw PDF file.
+        page_count (int): The number of pages in the PDF.
+        keep_unicode (bool): Keep non-ASCII letters when cleaning the text.
+        executor (Executor): The pool to run the shards on.
+        max_chars (int, optional): The character budget. Defaults to no limit.
+        strategy (str, optional): "first" or "even", see convert_buffer_to_text.
+
+    Returns:
+        str: The cleaned text, one line per non-empty page, in page order.
+    """
+    workers = min(pdf_extraction_workers, page_count)
+    if strategy == "even":
+        order = list(spread_order(page_count))
+    else:
+        order = list(range(page_count))
+
+    selected = {}
+    total_chars = 0
+    chars_per_page = pdf_chars_per_page_estimate
+    pages_read = 0
+    chars_read = 0
+    position = 0
+    while position < page_count and (max_chars is None or total_chars < max_chars):
+        if max_chars is None:
+            round_size = page_count
+        else:
+            # At least one page for every worker
+            round_size = max(workers, -(-(max_chars - total_chars) // chars_per_page))
+        page_numbers = order[position : position + round_size]
+        position += len(page_numbers)
+
+        texts = await text_pdf_shards(data, page_numbers, keep_unicode, executor, workers)
+
+        # Same selection as select_sections, in reading order
+        for page_number, text in zip(page_numbers, texts):
+            if not text:
+                continue
+            selected[page_number] = text
+            total_chars += len(text) + 1
+            if max_chars is not None and total_chars >= max_chars:
+                break
+
+        pages_read += len(page_numbers)
+        chars_read += sum(len(text) + 1 for text in texts)
+        chars_per_page = max(1, chars_read // pages_read)
+
+    return "\n".join(selected[page_number] for page_number in sorted(selected))
+
+
+async def text_pdf_shards(
+    data: bytes, page_numbers: list[int], keep_unicode: bool, executor: Executor, workers: int
+) -> list[str]:
+    """
+    Extracts and cleans pages of a PDF, split into one shard per worker.
+
+    Args:
+        data (bytes): The raw PDF file.
+        page_numbers (list[int]): The pages to extract.
+        keep_unicode (bool): Keep non-ASCII letters when cleaning the text.
+        executor (Executor): The pool to run the shards on.
+        workers (int): The most shards to split the pages into.
+
+    Returns:
+        list[str]: The cleaned text of each page, in the order of page_numbers.
+    """
+    shard_size = -(-len(page_numbers) // min(workers, len(page_numbers)))
+    shards = [
+        page_numbers[start : start + shard_size]
+        for start in range(0, len(page_numbers), shard_size)
+    ]
+    logging.info(f"Extracting {len(page_numbers)} PDF pages across {len(shards)} processes")
+
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(executor, text_pdf_pages, data, shard, keep_unicode)
+            for shard in shards
+        )
+    )
+    # gather keeps the shards in order
+    return [text for shard in results for text in shard]
+
+
+def text_pdf_pages(data: bytes, page_numbers: Sequence[int], keep_unicode: bool) -> list[str]:
+    """
+    Extracts and cleans the text of some pages. Runs inside a worker process.
+
+    Args:
+        data (bytes): The raw PDF file.
+        page_numbers (Sequence[int]): The pages to extract.
+        keep_unicode (bool): Keep non-ASCII letters when cleaning the text.
+
+    Returns:
+        list[str]: The cleaned text of each page, empty for pages without text.
+    """
+    normaliser = get_normaliser(keep_unicode)
+    pdf_document = fitz.open(stream=data, filetype="pdf")
+    try:
+        return [normaliser.normalise(pdf_document[number].get_text()) for number in page_numbers]
+    finally:
+        pdf_document.close()
 
 
-def clean_text(raw_text):
-    # Remove special characters (except from punctuation), whitespaces, line breaks
-    cleaned_text = re.sub(r"[^a-zA-Z0-9\s" + re.escape(string.punctuation) + "]", "", raw_text)
+def text_docx(file):
+    # One section per paragraph
+    return iter_docx_paragraphs(file)
 
-    # Remove conseuctive whitespaces
-    cleaned_text = re.sub(r"\s+", " ", cleaned_text)
 
-    # Remove leading/trailing white space
-    return cleaned_text.strip()
+def text_pptx(file):
+    # One section per slide, one paragraph per line
+    return ("\n".join(slide) for slide in iter_pptx_slides(file))
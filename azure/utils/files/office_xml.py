@@ -0,0 +1,152 @@
+import posixpath
+import re
+import zipfile
+from typing import IO, Iterator
+from xml.etree import ElementTree
+
+# XML namespaces used by Office Open XML documents
+word_ns = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+drawing_ns = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+presentation_ns = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+relationships_ns = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+package_relationships_ns = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Zip members of DOCX headers and footers, and of PPTX slides
+docx_header_pattern = re.compile(r"word/header(\d+)\.xml")
+docx_footer_pattern = re.compile(r"word/footer(\d+)\.xml")
+pptx_slide_pattern = re.compile(r"ppt/slides/slide(\d+)\.xml")
+
+
+def iter_docx_paragraphs(file: IO[bytes]) -> Iterator[str]:
+    """
+    Streams the paragraphs of a DOCX file in reading order: the headers, then the body, then
+    the footers, like textract (docx2txt) did.
+
+    Args:
+        file (IO[bytes]): The DOCX file, as a seekable binary file-like object.
+
+    Yields:
+        str: The text of each non-empty paragraph.
+    """
+    with zipfile.ZipFile(file) as archive:
+        headers = _numbered_parts(archive, docx_header_pattern)
+        footers = _numbered_parts(archive, docx_footer_pattern)
+        for name in [*headers, "word/document.xml", *footers]:
+            with archive.open(name) as part:
+                yield from _iter_paragraphs(part, word_ns)
+
+
+def iter_pptx_slides(file: IO[bytes]) -> Iterator[list[str]]:
+    """
+    Streams the slides of a PPTX file in presentation order.
+
+    Args:
+        file (IO[bytes]): The PPTX file, as a seekable binary file-like object.
+
+    Yields:
+        list[str]: The text of each non-empty paragraph on a slide, one list per slide.
+    """
+    with PptxSlides(file) as slides:
+        yield from slides
+
+
+class PptxSlides:
+    """
+    Random access to the slides of a PPTX file, in presentation order. A slide is only
+    parsed when it is read.
+
+    Args:
+        file (IO[bytes]): The PPTX file, as a seekable binary file-like object.
+    """
+
+    def __init__(self, file: IO[bytes]):
+        self._archive = zipfile.ZipFile(file)
+        self._slide_names = _slide_names(self._archive)
+
+    def __len__(self) -> int:
+        return len(self._slide_names)
+
+    def __getitem__(self, index: int) -> list[str]:
+        """Returns the text of each non-empty paragraph on a slide."""
+        with self._archive.open(self._slide_names[index]) as part:
+            return list(_iter_paragraphs(part, drawing_ns))
+
+    def close(self) -> None:
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _iter_paragraphs(part: IO[bytes], ns: str) -> Iterator[str]:
+    """
+    Incrementally parses an XML part and yields the text of each paragraph.
+
+    Word and DrawingML use the same local names for paragraphs (p), text (t), tabs (tab)
+    and line breaks (br), only the namespace differs. Paragraphs can be nested (e.g. a
+    text box inside a paragraph), so each open paragraph gets its own buffer.
+    """
+    paragraph, text, tab, line_break = ns + "p", ns + "t", ns + "tab", ns + "br"
+    buffers = []
+
+    for event, element in ElementTree.iterparse(part, events=("start", "end")):
+        if event == "start":
+            if element.tag == paragraph:
+                buffers.append([])
+            continue
+
+        if element.tag == paragraph:
+            content = "".join(buffers.pop()).strip()
+            element.clear()
+            if content:
+                yield content
+        elif buffers:
+            if element.tag == text:
+                buffers[-1].append(element.text or "")
+            elif element.tag == tab:
+                buffers[-1].append("\t")
+            elif element.tag == line_break:
+                buffers[-1].append("\n")
+
+
+def _slide_names(archive: zipfile.ZipFile) -> list[str]:
+    """
+    Returns the zip member names of the slides, in the order they are presented.
+
+    Falls back to the slide file numbering if the presentation part can't be read.
+    """
+    try:
+        # Map relationship ids to slide parts
+        with archive.open("ppt/_rels/presentation.xml.rels") as part:
+            targets = {
+                relationship.get("Id"): relationship.get("Target")
+                for relationship in ElementTree.parse(part).iter(
+                    package_relationships_ns + "Relationship"
+                )
+            }
+
+        # The slide id list holds the presentation order
+        with archive.open("ppt/presentation.xml") as part:
+            slide_ids = ElementTree.parse(part).iter(presentation_ns + "sldId")
+            return [
+                _resolve_target(targets[slide_id.get(relationships_ns + "id")])
+                for slide_id in slide_ids
+            ]
+    except (KeyError, ElementTree.ParseError):
+        return _numbered_parts(archive, pptx_slide_pattern)
+
+
+def _numbered_parts(archive: zipfile.ZipFile, pattern: re.Pattern) -> list[str]:
+    # The zip members matching a pattern, ordered by the number in their name
+    names = [name for name in archive.namelist() if pattern.fullmatch(name)]
+    return sorted(names, key=lambda name: int(pattern.fullmatch(name).group(1)))
+
+
+def _resolve_target(target: str) -> str:
+    # Relationship targets are relative to ppt/ unless they are absolute
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join("ppt", target))
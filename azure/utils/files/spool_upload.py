@@ -0,0 +1,99 @@
+import hashlib
+import os
+import tempfile
+from typing import IO
+
+import filetype
+from models.errors import FileTooLarge, InvalidFileType
+
+# Supported document MIME types and their file extensions
+supported_filetypes = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": "pptx",
+}
+max_file_size = 30 * 1024 * 1024  # 30MB
+
+# filetype only looks at the start of a file to guess its type
+header_size = 8192
+
+# Uploads are kept in memory up to this size, and spilled to a temporary file after that
+spool_threshold = int(os.environ.get("UploadSpoolThreshold", 4 * 1024 * 1024))
+spool_chunk_size = 1024 * 1024  # 1MB
+
+
+class SpooledUpload:
+    """
+    An uploaded file that passed validation, with its contents in a spooled temporary file
+    positioned at the start. Close it once it has been stored.
+    """
+
+    def __init__(self, file: IO[bytes], size: int, sha256: str, mime: str, extension: str):
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+        self.mime = mime
+        self.extension = extension
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def sniff_file_type(header: bytes) -> filetype.Type | None:
+    """
+    Guesses the type of a file from its magic number.
+
+    Args:
+        header (bytes): The first bytes of the file (at least `header_size` if available).
+
+    Returns:
+        filetype.Type | None: The guessed type, or None if it isn't recognised.
+    """
+    return filetype.guess(header)
+
+
+def spool_upload(stream: IO[bytes], filename: str, mime: str, max_size: int) -> SpooledUpload:
+    """
+    Validates an uploaded file in a single pass over its contents: the type is checked
+    against the magic number in the header, and the size and SHA-256 are computed while
+    the file is copied into a bounded spool (memory first, disk over the threshold).
+
+    Args:
+        stream (IO[bytes]): The uploaded file.
+        filename (str): The name of the file, used in error messages.
+        mime (str): The MIME type the file was uploaded as.
+        max_size (int): The maximum size of the file in bytes.
+
+    Raises:
+        InvalidFileType: If the file's contents don't match its MIME type.
+        FileTooLarge: If the file is larger than max_size.
+
+    Returns:
+        SpooledUpload: The validated file.
+    """
+    # Ensure file binary is correct (magic number check)
+    header = stream.read(header_size)
+    file_type = sniff_file_type(header)
+    if file_type is None or file_type.mime != mime:
+        raise InvalidFileType(f"File '{filename}' is not a {mime} file")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+    digest = hashlib.sha256()
+    size = 0
+
+    chunk = header
+    while chunk:
+        # Ensure file size is not too large, without reading past the limit
+        size += len(chunk)
+        if size > max_size:
+            spool.close()
+            raise FileTooLarge(
+                f"File '{filename}' is too large (max {max_size // (1024 * 1024)}MB)"
+            )
+
+        digest.update(chunk)
+        spool.write(chunk)
+        chunk = stream.read(spool_chunk_size)
+
+    spool.seek(0)
+    return SpooledUpload(spool, size, digest.hexdigest(), file_type.mime, file_type.extension)
@@ -0,0 +1,30 @@
+import os
+
+from ..blob_cache import BlobCache
+
+# Cleaned extracted text, keyed by the SHA-256 of the uploaded file
+text_cache = BlobCache(
+    prefix="text-cache",
+    max_chars=int(os.environ.get("TextCacheMaxChars", 20_000_000)),
+)
+
+
+def text_cache_key(
+    digest: str, keep_unicode: bool, max_chars: int = None, strategy: str = "first"
+) -> str:
+    """
+    Builds the text cache key of a file. The same file cleaned in a different mode or read
+    with a different budget gives different text, so those are part of the key.
+
+    Args:
+        digest (str): The SHA-256 of the file.
+        keep_unicode (bool): Whether non-ASCII letters were kept.
+        max_chars (int, optional): The character budget the text was extracted with.
+        strategy (str, optional): The extraction strategy used with the budget.
+
+    Returns:
+        str: The cache key.
+    """
+    mode = "unicode" if keep_unicode else "ascii"
+    budget = "full" if max_chars is None else f"{strategy}-{max_chars}"
+    return f"{digest}-{mode}-{budget}"
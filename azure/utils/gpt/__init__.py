@@ -1,2 +1,13 @@
 from .create_quiz import create_quiz
 from .answer_quiz import answer_quiz
+from .backend import LLMBackend, get_llm_backend, set_llm_backend
+from .client import get_async_openai_client
+from .scheduler import (
+    background_priority,
+    close_scheduler,
+    get_scheduler_metrics,
+    interactive_priority,
+)
+from .response_cache import get_response_cache_stats
+from .routing import get_route_metrics
+from .select_passages import passage_token_budget, select_passages
@@ -1,10 +1,12 @@
+import asyncio
 import json
 import logging
 import re
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from openai import OpenAI
+from ..event_loop import run_coroutine
+from .routing import routed_chat_completion
+from .scheduler import interactive_priority
 
 
 def answer_quiz(answer_body: list[dict]) -> list[dict]:
@@ -16,6 +18,14 @@ def answer_quiz(answer_body: list[dict]) -> list[dict]:
     Returns:
         list[dict]: The answers to the quiz.
     """
+    # Requests are sent by the worker's scheduler, ahead of background quiz generation
+    return run_coroutine(answer_quiz_async(answer_body))
+
+
+async def answer_quiz_async(answer_body: list[dict]) -> list[dict]:
+    """
+    Coroutine version of answer_quiz, must run on the worker event loop.
+    """
     logging.info("answer_quiz")
 
     # Grouping the dictionaries by 'type'
@@ -29,16 +39,8 @@ def answer_quiz(answer_body: list[dict]) -> list[dict]:
     # Converting the grouped dictionary to a list of lists
     sublists = list(grouped_by_type.values())
 
-    func = answer_quiz_2
-    results = []
-    with ThreadPoolExecutor() as executor:
-        # Use a future for each sublist
-        futures = {executor.submit(func, sublist): sublist for sublist in sublists}
-
-        for future in as_completed(futures):
-            # Get the result of the completed future
-            result = future.result()
-            results.append(result)
+    # Check each sublist at the same time
+    results = await asyncio.gather(*[answer_quiz_2(sublist) for sublist in sublists])
 
     # Debugging:
     # logging.info("Results:")
@@ -54,7 +56,7 @@ def answer_quiz(answer_body: list[dict]) -> list[dict]:
     return results
 
 
-def answer_quiz_2(answer_body: list[dict]) -> list[dict]:
+async def answer_quiz_2(answer_body: list[dict]) -> list[dict]:
     """Answer a quiz using OpenAI's API.
 
     Args:
@@ -63,8 +65,6 @@ def answer_quiz_2(answer_body: list[dict]) -> list[dict]:
     Returns:
         list[dict]: The answers to the quiz.
     """
-    client = OpenAI()
-
     question_list = group_by_type(answer_body)
     listOfResponses = []
 
@@ -72,6 +72,9 @@ def answer_quiz_2(answer_body: list[dict]) -> list[dict]:
     for questionGroup in question_list:
         correctQuestionGroup = ""
 
+        # Short answers are graded by the model, the other types only need feedback
+        route = "grade-short" if questionGroup[0]["type"] == "short-answer" else "feedback"
+
         # Check what type of question it is
         if questionGroup[0]["type"] == "fill-gaps":
             questionGroup = update_question_list(questionGroup)
@@ -112,12 +115,13 @@ def answer_quiz_2(answer_body: list[dict]) -> list[dict]:
 
         response = ""
         if questionGroup != []:
-            response = client.chat.completions.create(
-                model="gpt-4-1106-preview",
-                messages=[
+            response = await routed_chat_completion(
+                route,
+                [
                     {"role": "system", "content": message},
                     {"role": "user", "content": json.dumps(questionGroup)},
                 ],
+                priority=interactive_priority,
             )
             response = clean_json_string(response.choices[0].message.content)
 
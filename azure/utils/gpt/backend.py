@@ -0,0 +1,69 @@
+import os
+import threading
+
+from .client import get_async_openai_client
+
+# Where chat completion requests are sent: "openai", or "fake" for the deterministic
+# offline backend in fake_backend.py (e.g. for load tests)
+llm_backends = ("openai", "fake")
+llm_backend_name = os.environ.get("LLMBackend", "openai")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class LLMBackend:
+    """
+    Sends chat completion requests. Implementations take the arguments of OpenAI's
+    chat.completions.create and return the same kind of result: a ChatCompletion, or with
+    stream=True an async iterator of ChatCompletionChunk that has an async close(). Errors
+    are raised as the OpenAI exceptions, so the scheduler can retry them.
+    """
+
+    async def create_chat_completion(self, **kwargs):
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """Sends requests with the worker's shared async OpenAI client."""
+
+    async def create_chat_completion(self, **kwargs):
+        return await get_async_openai_client().chat.completions.create(**kwargs)
+
+
+def get_llm_backend() -> LLMBackend:
+    """
+    Returns the worker's backend, creating the one named by the LLMBackend setting on first
+    use.
+
+    Returns:
+        LLMBackend: The backend.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = _create_backend(llm_backend_name)
+        return _backend
+
+
+def set_llm_backend(backend: LLMBackend) -> None:
+    """
+    Replaces the worker's backend, e.g. with a configured FakeBackend in a benchmark.
+
+    Args:
+        backend (LLMBackend): The backend to send requests to.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _create_backend(name: str) -> LLMBackend:
+    if name not in llm_backends:
+        raise ValueError(f"Unknown LLM backend: {name}")
+    if name == "fake":
+        # Imported here, the fake isn't needed in production
+        from .fake_backend import FakeBackend
+
+        return FakeBackend()
+    return OpenAIBackend()
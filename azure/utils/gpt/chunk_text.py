@@ -0,0 +1,117 @@
+import os
+import re
+
+from ..files import chars_per_token
+
+# Largest chunk of source text sent in a single prompt, in (estimated) tokens
+chunk_max_tokens = int(os.environ.get("ChunkMaxTokens", 3000))
+
+# Where text may be split, from most to least preferred: sections (pages, paragraphs,
+# slides) are on separate lines, then sentences, then words. Each level's pieces are joined
+# back together with its separator.
+chunk_boundaries = [
+    ("\n", re.compile(r"\n+")),
+    (" ", re.compile(r"(?<=[.!?])\s+")),
+    (" ", re.compile(r"\s+")),
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return -(-len(text) // chars_per_token)
+
+
+def chunk_text(texts: list[str], max_tokens: int = chunk_max_tokens) -> list[str]:
+    """
+    Splits texts into chunks of at most `max_tokens` (estimated) tokens. Chunks are cut on
+    the most natural boundary that keeps them under the limit, and small neighbouring pieces
+    are packed together, so there are as few chunks as possible.
+
+    Args:
+        texts (list[str]): The texts to split, e.g. the content of each file.
+        max_tokens (int, optional): The chunk size. Defaults to the ChunkMaxTokens setting.
+
+    Returns:
+        list[str]: The non-empty chunks, in order.
+    """
+    text = "\n".join(text.strip() for text in texts if text and text.strip())
+    if not text:
+        return []
+
+    return split_text(text, max_tokens * chars_per_token)
+
+
+def split_text(text: str, max_chars: int, level: int = 0) -> list[str]:
+    """
+    Recursively splits a text on `chunk_boundaries[level:]` into pieces of at most
+    `max_chars` characters.
+
+    Args:
+        text (str): The text to split.
+        max_chars (int): The maximum length of a piece.
+        level (int, optional): The first boundary to split on. Defaults to 0.
+
+    Returns:
+        list[str]: The pieces, in order.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    # Nothing left to split on, e.g. a very long word
+    if level == len(chunk_boundaries):
+        return [text[start : start + max_chars] for start in range(0, len(text), max_chars)]
+
+    separator, boundary = chunk_boundaries[level]
+    pieces = [
+        piece
+        for part in boundary.split(text)
+        if part.strip()
+        for piece in split_text(part.strip(), max_chars, level + 1)
+    ]
+
+    # Pack neighbouring pieces back together while they fit
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(separator) + len(piece) <= max_chars:
+            chunks[-1] += separator + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def allocate_questions(num_questions: int, chunks: list[str]) -> list[int]:
+    """
+    Shares questions between chunks in proportion to their length. Rounding the running
+    total rather than each share keeps the sum exact and spreads the remainders out.
+
+    Example: 5 questions over chunks of length 4, 4 and 2 gives [2, 2, 1].
+
+    Args:
+        num_questions (int): The number of questions to share.
+        chunks (list[str]): The chunks.
+
+    Returns:
+        list[int]: The number of questions for each chunk, which may be 0.
+    """
+    total_chars = sum(len(chunk) for chunk in chunks)
+    if not total_chars:
+        return [num_questions] + [0] * (len(chunks) - 1) if chunks else []
+
+    counts = []
+    allocated = 0
+    cumulative_chars = 0
+    for chunk in chunks:
+        cumulative_chars += len(chunk)
+        # Round half up, num_questions * cumulative_chars / total_chars
+        target = (2 * num_questions * cumulative_chars + total_chars) // (2 * total_chars)
+        counts.append(target - allocated)
+        allocated = target
+    return counts
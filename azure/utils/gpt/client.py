@@ -0,0 +1,51 @@
+import os
+import threading
+
+import httpx
+from openai import AsyncOpenAI
+
+# Connection pool and timeouts of the shared OpenAI clients
+openai_pool_size = int(os.environ.get("OpenAIPoolSize", 20))
+openai_keepalive_expiry = float(os.environ.get("OpenAIKeepAliveExpiry", 60))
+openai_connect_timeout = float(os.environ.get("OpenAIConnectTimeout", 10))
+openai_read_timeout = float(os.environ.get("OpenAIReadTimeout", 120))
+
+# Send requests to another OpenAI compatible server, e.g. a local stand-in for testing
+openai_base_url = os.environ.get("OpenAIBaseUrl") or None
+
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=openai_pool_size,
+        max_keepalive_connections=openai_pool_size,
+        keepalive_expiry=openai_keepalive_expiry,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(openai_read_timeout, connect=openai_connect_timeout)
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """
+    Returns the shared AsyncOpenAI client used by the request scheduler, creating it on
+    first use. Its connections are bound to the worker event loop (utils.event_loop), so
+    only use it from there. It doesn't retry by itself, the scheduler handles retries so
+    they respect the rate limits.
+
+    Returns:
+        AsyncOpenAI: The shared AsyncOpenAI client.
+    """
+    global _async_client
+
+    with _client_lock:
+        if _async_client is None:
+            _async_client = AsyncOpenAI(
+                base_url=openai_base_url,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=_pool_limits(), timeout=_timeout()),
+            )
+        return _async_client
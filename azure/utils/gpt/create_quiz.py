@@ -1,10 +1,34 @@
+import asyncio
 import json
 import logging
+import os
 import random
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from openai import OpenAI
+from ..event_loop import run_coroutine
+from .chunk_text import allocate_questions, chunk_text, estimate_tokens
+from .near_duplicates import NearDuplicateIndex
+from .question_bank import (
+    load_question_bank,
+    question_bank_key,
+    sample_question_bank,
+    save_to_question_bank,
+)
+from .response_cache import cached_response, fresh_responses, response_cache_key
+from .routing import routed_chat_completion, router
+from .stream_parser import JsonObjectStream, iter_json_objects
+from .validate_question import question_fingerprint, question_problem
+
+# How the options of fill-gaps questions are generated: "sequential" (one request per fact,
+# one after the other), "batched" (one request for all the facts) or "concurrent" (one
+# request per fact, up to FillGapsConcurrency at a time)
+fill_gaps_modes = ("sequential", "batched", "concurrent")
+fill_gaps_mode = os.environ.get("FillGapsMode", "concurrent")
+fill_gaps_concurrency = int(os.environ.get("FillGapsConcurrency", 5))
+
+# Follow-up requests made for the questions of a type that are still missing after the
+# first responses, each asking for just the missing count
+question_top_up_rounds = int(os.environ.get("QuestionTopUpRounds", 2))
 
 
 class Quiz:
@@ -12,12 +36,85 @@ class Quiz:
         self.questions = questions
 
 
+class QuizProgress:
+    """
+    Counts the questions that are ready while a quiz is generated, and reports the count
+    with `on_progress(ready, total)`. The callback runs in a worker thread, one call at a
+    time; counts that change while it runs are merged into the next call.
+
+    Questions streamed back by a prompt are counted as they arrive with a PendingQuestions
+    from `pending`, and replaced by the questions that were accepted with `settle`, so the
+    count goes back down when some of them are rejected.
+    """
+
+    def __init__(self, total, on_progress=None):
+        self.total = total
+        self.ready = 0
+        self._accepted = 0
+        self._pending = []
+        self._on_progress = on_progress
+        self._reported = 0
+        self._reporter = None
+
+    def add(self, count=1):
+        """Counts accepted questions."""
+        self._accepted += count
+        self._update()
+
+    def pending(self):
+        """Returns the counter of the questions of a prompt that haven't been checked yet."""
+        pending = PendingQuestions(self)
+        self._pending.append(pending)
+        return pending
+
+    def settle(self, pending, accepted):
+        """Replaces the questions counted by `pending` with the `accepted` ones."""
+        self._pending.remove(pending)
+        self._accepted += accepted
+        self._update()
+
+    async def flush(self):
+        """Waits until the latest count has been reported."""
+        if self._reporter is not None:
+            await self._reporter
+
+    def _update(self):
+        pending = sum(pending.count for pending in self._pending)
+        self.ready = min(self.total, self._accepted + pending)
+        if self._on_progress and (self._reporter is None or self._reporter.done()):
+            self._reporter = asyncio.create_task(self._report())
+
+    async def _report(self):
+        while self._reported != self.ready:
+            self._reported = self.ready
+            try:
+                await asyncio.to_thread(self._on_progress, self._reported, self.total)
+            except Exception as e:
+                logging.error("Error reporting quiz progress: %s", e, exc_info=True)
+
+
+class PendingQuestions:
+    """The questions of one prompt a QuizProgress counts until they are checked."""
+
+    def __init__(self, progress):
+        self.count = 0
+        self._progress = progress
+
+    def add(self, count=1):
+        self.count += count
+        self._progress._update()
+
+
 def create_quiz(
     num_questions: int,
     question_types: list[str],
     topic: str = "",
     text_content: str = "",
     file_contents: list[str] = [],
+    fresh: bool = False,
+    on_progress=None,
+    on_type_ready=None,
+    report: dict = None,
 ) -> list[dict]:
     """
     Create a quiz from the given content using gpt.
@@ -28,6 +125,10 @@ def create_quiz(
         topic (str, optional): The topic of the quiz. Defaults to "".
         text_content (str, optional): The text content from which to create the quiz. Defaults to "".
         file_contents (list[str], optional): A list of file contents from which to create the quiz. Defaults to [].
+        fresh (bool, optional): Don't reuse cached responses to identical prompts, or questions in the question bank of the content. Defaults to False.
+        on_progress (Callable[[int, int], None], optional): Called with the number of questions ready so far and the number of questions asked for, as questions are streamed back. Runs in a worker thread. Defaults to None.
+        on_type_ready (Callable[[str, list[dict]], None], optional): Called with a question type and its questions as soon as that type is generated, before the other types are done. Their question ids are final unless a type falls short, in which case the ids of the returned quiz are closed up. Runs in a worker thread. Defaults to None.
+        report (dict, optional): Filled in with how the quiz was generated: requested, questions, discarded (the number of questions dropped for each reason), discarded_tokens (their estimated tokens), and from_bank, top_up_rounds and missing (per question type). Defaults to None.
 
     Returns:
         list[dict]: A list of dictionaries representing the quiz questions.
@@ -37,49 +138,196 @@ def create_quiz(
             - 'type': The type of question (e.g., 'multi-choice', 'true-false', etc.).
             - 'options': A list of options for the question (applicable for 'multi-choice' type).
     """
+    # Requests are sent by the worker's scheduler, on its event loop
+    return run_coroutine(
+        create_quiz_async(
+            num_questions,
+            question_types,
+            topic,
+            text_content,
+            file_contents,
+            fresh,
+            on_progress,
+            on_type_ready,
+            report,
+        )
+    )
+
+
+async def create_quiz_async(
+    num_questions: int,
+    question_types: list[str],
+    topic: str = "",
+    text_content: str = "",
+    file_contents: list[str] = [],
+    fresh: bool = False,
+    on_progress=None,
+    on_type_ready=None,
+    report: dict = None,
+) -> list[dict]:
+    """
+    Coroutine version of create_quiz, must run on the worker event loop.
+    """
     logging.info("create_quiz")
 
-    # Create a list of sublists of question types
-    questionTypesCount = generateTypesCount(num_questions, question_types)
-    func = create_quiz_2
-    results = []
-
-    with ThreadPoolExecutor() as executor:
-        # Use a future for each sublist
-        futures = {
-            executor.submit(func, key, value, question_types, topic, text_content, file_contents): (
-                key,
-                value,
-            )
-            for key, value in questionTypesCount.items()
-        }
-
-        for future in as_completed(futures):
-            # Get the result of the completed future
-            result = future.result()
-            results.append(result)
-
-    # Combine the results into one list
-    results = [question for quiz in results for question in quiz.questions]
+    # Seen by every prompt sent for this quiz, including from the tasks started below
+    fresh_responses.set(fresh)
+
+    # Split long content into chunks that each fit in a prompt
+    chunks = chunk_text([text_content] + file_contents) or [""]
+    chunkTypesCount = generateChunkTypesCount(num_questions, question_types, chunks)
+    logging.info(f"Creating quiz - {len(chunks)} chunks, typesCount: {chunkTypesCount}")
+
+    # Give each question type its question ids up front, spread randomly through the quiz,
+    # so questions saved as soon as their type is ready keep their place
+    questionIds = generateQuestionIds(num_questions, question_types)
+    progress = QuizProgress(num_questions, on_progress)
+
+    if report is None:
+        report = {}
+    report.update(
+        requested=num_questions,
+        discarded={},
+        discarded_tokens=0,
+        from_bank={},
+        top_up_rounds={},
+        missing={},
+    )
+    duplicates = NearDuplicateIndex()
+
+    # Questions made from the same content before are reused, only the rest are generated.
+    # Newly generated questions are added to the bank, with the chunk they were made from.
+    bankKey = question_bank_key(chunks)
+    bank = {} if fresh else await asyncio.to_thread(load_question_bank, bankKey)
+    generated = []
+
+    def discard(question, reason):
+        report["discarded"][reason] = report["discarded"].get(reason, 0) + 1
+        report["discarded_tokens"] += estimate_tokens(json.dumps(question))
+
+    def acceptQuestions(questions, accepted, chunk=None):
+        # Keep the valid questions that aren't (near) repeats of a question already in the quiz,
+        # returning how many were kept
+        valid = []
+        for question in questions:
+            problem = question_problem(question)
+            if problem is not None:
+                discard(question, problem)
+            else:
+                valid.append(question)
+
+        added = duplicates.add([question_fingerprint(question) for question in valid])
+        for question, isNew in zip(valid, added):
+            if not isNew:
+                discard(question, "duplicate question")
+                continue
+            accepted.append(question)
+            if chunk is not None:
+                generated.append((chunk, question))
+        return sum(added)
+
+    async def createType(key):
+        ids = questionIds[key]
+        questions = []
+        acceptQuestions(sample_question_bank(bank, key, len(ids)), questions)
+        report["from_bank"][key] = len(questions)
+        progress.add(len(questions))
+
+        # Chunks and the number of questions to generate from each
+        if not questions:
+            typeChunks = [
+                (index, typesCount[key])
+                for index, typesCount in enumerate(chunkTypesCount)
+                if key in typesCount
+            ]
+        else:
+            shortfall = allocate_questions(len(ids) - len(questions), chunks)
+            typeChunks = [(index, count) for index, count in enumerate(shortfall) if count]
+
+        # Generate the question type for each chunk at the same time
+        pending = [progress.pending() for _ in typeChunks]
+        quizzes = await asyncio.gather(
+            *[
+                create_quiz_2(key, count, question_types, topic, chunks[index], progress=share)
+                for (index, count), share in zip(typeChunks, pending)
+            ]
+        )
+        for (index, _), quiz, share in zip(typeChunks, quizzes, pending):
+            progress.settle(share, acceptQuestions(quiz.questions, questions, chunk=index))
+
+        # Ask for just the missing questions, from the chunks with the most questions first.
+        # The same prompt could get the same response back from the cache, so skip it.
+        typeChunks.sort(key=lambda item: -item[1])
+        rounds = 0
+        while len(questions) < len(ids) and rounds < question_top_up_rounds:
+            index = typeChunks[rounds % len(typeChunks)][0]
+            rounds += 1
+            fresh_responses.set(True)
+            share = progress.pending()
+            try:
+                quiz = await create_quiz_2(
+                    key,
+                    len(ids) - len(questions),
+                    question_types,
+                    topic,
+                    chunks[index],
+                    progress=share,
+                )
+            except Exception as e:
+                logging.error("Error topping up %s questions: %s", key, e, exc_info=True)
+                progress.settle(share, 0)
+                break
+            progress.settle(share, acceptQuestions(quiz.questions, questions, chunk=index))
+        report["top_up_rounds"][key] = rounds
+
+        # Questions beyond the type's share are kept to make up for other types
+        random.shuffle(questions)
+        placed, spare = questions[: len(ids)], questions[len(ids) :]
+        if len(placed) < len(ids):
+            report["missing"][key] = len(ids) - len(placed)
+        for question, question_id in zip(placed, ids):
+            question["question_id"] = question_id
+
+        if on_type_ready:
+            try:
+                await asyncio.to_thread(on_type_ready, key, placed)
+            except Exception as e:
+                logging.error("Error saving %s questions: %s", key, e, exc_info=True)
+        return placed, spare
+
+    results = await asyncio.gather(*[createType(key) for key in questionIds])
+    await progress.flush()
+
+    # Combine the results into one list, in question id order
+    placed = sorted(
+        [question for questions, _ in results for question in questions],
+        key=lambda question: question["question_id"],
+    )
+    spare = [question for _, questions in results for question in questions]
+    random.shuffle(spare)
+    results = placed + spare[: num_questions - len(placed)]
+    for question in spare[num_questions - len(placed) :]:
+        discard(question, "surplus")
+    report["questions"] = len(results)
     logging.info(f"Creating quiz - results: {results}")
+    logging.info(f"Creating quiz - report: {report}")
 
-    # Randomize the order of the quiz questions
-    random.shuffle(results)
+    # Every new question goes to the bank, including the ones that didn't make it in the quiz
+    await asyncio.to_thread(save_to_question_bank, bankKey, generated)
 
-    # Add Ids to the questions
+    # Add Ids to the questions, closing the gaps left by missing questions
     results = add_sequential_quiz_id(results)
-
-    results = filter_questions(results,num_questions)
     return results
 
 
-def create_quiz_2(
+async def create_quiz_2(
     key: str,
     num_questions: int,
     question_types: list[str],
     topic: str = "",
     text_content: str = "",
     file_contents: list[str] = [],
+    progress: PendingQuestions = None,
 ) -> list[dict]:
     """
     Create a quiz based on the specified parameters.
@@ -91,6 +339,7 @@ def create_quiz_2(
         topic (str, optional): The topic of the quiz. Defaults to an empty string.
         text_content (str, optional): The text content to include in the quiz. Defaults to an empty string.
         file_contents (list[str], optional): A list of file contents to include in the quiz. Defaults to an empty list.
+        progress (PendingQuestions, optional): Counts the questions as they arrive, before they are checked. Defaults to None.
 
     Returns:
         list[dict]: A list of dictionaries representing the quiz questions.
@@ -99,6 +348,7 @@ def create_quiz_2(
         Exception: If an error occurs while creating the quiz.
     """
     logging.info("Creating quiz - helper function")
+    onQuestion = (lambda question: progress.add()) if progress else None
 
     try:
         # List of quiz questions
@@ -115,11 +365,7 @@ def create_quiz_2(
         # Create the quiz for each question type
         # Multiple-choice questions
         if key == "multi-choice":
-            completionMulti = messageMultiChoice(num_questions, text_content)
-            # logging.info("completion Multi 1")
-            # logging.info(completionMulti)
-
-            completionMulti = completionMulti.choices[0].message.content
+            completionMulti = await messageMultiChoice(num_questions, text_content, onQuestion)
             # logging.info("completion Multi 2")
             # logging.info(completionMulti)
 
@@ -136,20 +382,12 @@ def create_quiz_2(
 
         # Fill in the blanks questions
         if key == "fill-gaps":
-            completionBlanks = messageFillBlanks(num_questions, text_content)
-            quizFill = parse_fill_blanks(completionBlanks.choices[0].message.content)
-
-            # Loop through the questions and create a new question for each
-            questions2fingers = []
-            for question in quizFill.questions:
-                newQuestion = messageFillBlanks2(question["question"])
-                newQuestion = newQuestion.choices[0].message.content
-                newQuestion = clean_json_string(newQuestion)
-                newQuestion = parse_fill_blanks2(
-                    newQuestion, question["question"]
-                )  # returns a question
+            completionBlanks = await messageFillBlanks(num_questions, text_content)
+            quizFill = parse_fill_blanks(completionBlanks)
 
-                questions2fingers.append(newQuestion[0])
+            # Create the options of a new question for each fact
+            facts = [question["question"] for question in quizFill.questions]
+            questions2fingers = await createFillBlanksQuestions(facts, progress=progress)
 
             newQuiz2 = Quiz(questions2fingers)
             quizQuestions.append(newQuiz2)
@@ -158,9 +396,7 @@ def create_quiz_2(
 
         # Short answer questions
         if key == "short-answer":
-            completionShort = messageShortAnswer(num_questions, text_content)
-
-            completionShort = completionShort.choices[0].message.content
+            completionShort = await messageShortAnswer(num_questions, text_content, onQuestion)
             completionShort = clean_json_string(completionShort)
 
             quizShort = parse_short_quiz(completionShort)
@@ -179,15 +415,109 @@ def create_quiz_2(
         logging.error("Error creating quiz: %s", e, exc_info=True)
         raise e
 
-def filter_questions(questions, max_id):
+
+async def createFillBlanksQuestions(facts, mode=None, progress=None):
+    """
+    Turns facts into fill-gaps questions, asking gpt for the options of each fact.
+
+    Args:
+        facts (list[str]): The facts to make questions from.
+        mode (str, optional): One of fill_gaps_modes. Defaults to the FillGapsMode setting.
+        progress (PendingQuestions, optional): Counts the questions as they are ready.
+
+    Returns:
+        list[dict]: The questions, in the order of the facts. Facts gpt didn't give valid
+            options for are left out.
+    """
+    mode = mode or fill_gaps_mode
+    if mode not in fill_gaps_modes:
+        raise ValueError(f"Unknown fill-gaps mode: {mode}")
+
+    async def createCounted(fact):
+        question = await createFillBlanksQuestion(fact)
+        if question is not None and progress:
+            progress.add()
+        return question
+
+    if mode == "batched":
+        questions = await createFillBlanksBatch(facts)
+        if progress:
+            progress.add(sum(question is not None for question in questions))
+    elif mode == "concurrent":
+        slots = asyncio.Semaphore(fill_gaps_concurrency)
+
+        async def createWithSlot(fact):
+            async with slots:
+                return await createCounted(fact)
+
+        questions = await asyncio.gather(*[createWithSlot(fact) for fact in facts])
+    else:
+        questions = [await createCounted(fact) for fact in facts]
+
+    return [question for question in questions if question is not None]
+
+
+async def createFillBlanksQuestion(fact):
+    """
+    Creates a fill-gaps question from a fact with a single request.
+
+    Args:
+        fact (str): The fact to be used in the question.
+
+    Returns:
+        dict | None: The question, or None if the response couldn't be parsed.
+    """
+    newQuestion = await messageFillBlanks2(fact)
+    newQuestion = clean_json_string(newQuestion)
+    newQuestion = parse_fill_blanks2(newQuestion, fact)  # returns a question
+    return newQuestion[0] if newQuestion else None
+
+
+async def createFillBlanksBatch(facts):
     """
-    Removes entries from the list where the question_id is greater than max_id.
+    Creates fill-gaps questions for all the facts with a single request. Facts the response
+    has no valid options for are retried concurrently, one request per fact, with at most
+    `fill_gaps_concurrency` in flight.
+
+    Args:
+        facts (list[str]): The facts to be used in the questions.
 
-    :param questions: List of dictionaries containing question details.
-    :param max_id: The maximum allowed question_id.
-    :return: Filtered list of dictionaries.
+    Returns:
+        list[dict | None]: The questions, None where the response couldn't be parsed.
     """
-    return [question for question in questions if question.get('question_id', 0) <= max_id]
+    if not facts:
+        return []
+
+    optionSets = []
+    try:
+        completion = await messageFillBlanksBatch(facts)
+        optionSets = json.loads(clean_json_string(completion))
+        if not isinstance(optionSets, list):
+            optionSets = []
+    except json.JSONDecodeError as e:
+        logging.info(f"Error decoding JSON in fill-gaps batch: {e}")
+
+    questions = []
+    for index, fact in enumerate(facts):
+        newQuestion = []
+        if index < len(optionSets) and isinstance(optionSets[index], dict):
+            newQuestion = parse_fill_blanks2(json.dumps(optionSets[index]), fact)
+        questions.append(newQuestion[0] if newQuestion else None)
+
+    # Retry the missing facts together rather than one after another
+    missing = [index for index, question in enumerate(questions) if question is None]
+    slots = asyncio.Semaphore(fill_gaps_concurrency)
+
+    async def retryWithSlot(fact):
+        async with slots:
+            return await createFillBlanksQuestion(fact)
+
+    retried = await asyncio.gather(*[retryWithSlot(facts[index]) for index in missing])
+    for index, question in zip(missing, retried):
+        questions[index] = question
+
+    return questions
+
 
 def insertBlankOnPhraseUsed(phraseUsed, phrase):
     """
@@ -217,10 +547,13 @@ def clean_json_string(json_string):
     Returns:
         str: The cleaned JSON string.
     """
-    # Check if the string starts with '''json and ends with '''
+    # Check if the string starts with '''json
     if json_string.startswith("```json"):
-        # Remove '''json from the start and ''' from the end
-        return json_string[7:-3].strip()
+        # Remove '''json from the start, and ''' from the end if the response wasn't cut short
+        json_string = json_string[7:].strip()
+        if json_string.endswith("```"):
+            json_string = json_string[:-3]
+        return json_string.strip()
     else:
         # If the string does not have these patterns, return it as is
         return json_string
@@ -257,6 +590,64 @@ def combine_quizzes(quizzes):
     return Quiz(combined_questions)
 
 
+def generateChunkTypesCount(num_questions, question_types, chunks):
+    """
+    Shares the questions between chunks, in proportion to their length, and between question
+    types, so that the totals per type match generateTypesCount.
+
+    Args:
+        num_questions (int): The total number of questions.
+        question_types (list): A list of question types.
+        chunks (list): The chunks of source text.
+
+    Returns:
+        list: For each chunk, a dictionary with the count of each question type it needs.
+            Types with no questions are left out.
+    """
+    typesCount = generateTypesCount(num_questions, question_types)
+
+    # Interleave the question types, e.g. [multi, fill, short, multi, fill, multi]
+    slots = []
+    while any(typesCount.values()):
+        for question_type in typesCount:
+            if typesCount[question_type] > 0:
+                typesCount[question_type] -= 1
+                slots.append(question_type)
+
+    # Give each chunk its share of the slots, in order
+    result = []
+    for count in allocate_questions(len(slots), chunks):
+        chunkTypesCount = {}
+        for question_type in slots[:count]:
+            chunkTypesCount[question_type] = chunkTypesCount.get(question_type, 0) + 1
+        slots = slots[count:]
+        result.append(chunkTypesCount)
+
+    return result
+
+
+def generateQuestionIds(num_questions, question_types):
+    """
+    Randomly shares the question ids 1..num_questions between the question types, so that
+    each type gets as many ids as generateTypesCount gives it questions.
+
+    Args:
+        num_questions (int): The total number of questions.
+        question_types (list): A list of question types.
+
+    Returns:
+        dict: The sorted question ids of each question type with at least one question.
+    """
+    typesCount = generateTypesCount(num_questions, question_types)
+    slots = [question_type for question_type, count in typesCount.items() for _ in range(count)]
+    random.shuffle(slots)
+
+    result = {question_type: [] for question_type, count in typesCount.items() if count}
+    for question_id, question_type in enumerate(slots, start=1):
+        result[question_type].append(question_id)
+    return result
+
+
 def generateTypesCount(num_questions, question_types):
     """
     Generate a dictionary with the count of each question type.
@@ -304,7 +695,7 @@ def parse_multi_quiz(json_string):
             python_dict["type"] = "multi-choice"  # Add the 'type' attribute
             python_dict["question_id"] = 0  # Add the 'question_id' attribute
             python_dicts.append(python_dict)
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
             logging.info(f"Error decoding JSON pmq: {e}")
             # Handle the error or ignore the faulty JSON object
 
@@ -333,7 +724,7 @@ def parse_short_quiz(json_string):
             python_dict["type"] = "short-answer"  # Add the 'type' attribute
             python_dict["question_id"] = 0  # Add the 'question_id' attribute
             python_dicts.append(python_dict)
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
             logging.info(f"Error decoding JSON psq: {e}")
             # Handle the error or ignore the faulty JSON object
 
@@ -366,7 +757,7 @@ def parse_fill_blanks(json_string):
             python_dict["type"] = "fill-gaps"  # Add the 'type' attribute
             python_dict["question_id"] = 0  # Add the 'question_id' attribute
             python_dicts.append(python_dict)
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
             logging.info(f"Error decoding JSON pfb: {e}")
             # Handle the error or ignore the faulty JSON object
 
@@ -392,71 +783,72 @@ def parse_fill_blanks2(quiz_text, phraseUsed):
         python_dict["type"] = "fill-gaps"  # Add the 'type' attribute
         python_dict["question_id"] = 0  # Add the 'question_id' attribute
         python_dicts.append(python_dict)
-    except json.JSONDecodeError as e:
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
         logging.info(f"Error decoding JSON in pfb2: {e}")
         # Handle the error or ignore the faulty JSON object
 
     return python_dicts
 
 
-def messageMultiChoice(count, text):
+async def messageMultiChoice(count, text, onQuestion=None):
     """
     Asks chatGPT to make a multiple-choice quiz based on the provided text.
 
     Args:
         count (int): The length of the quiz, i.e., the number of questions.
         text (str): The text to base the quiz questions on.
+        onQuestion (Callable[[dict], None], optional): Called with each question as soon as it is received.
 
     Returns:
-        completion: The completion object returned by the OpenAI API.
+        str: The content of the response.
     """
-    client = OpenAI()
     myMessageSystem = (
         "Generate a "
         + str(count)
         + '-question long multiple-choice quiz based on the provided text. Make it so each question has 4 possible options. Format each question as a JSON object like so {"question":"","options":["option1","option2","option3","option4"],"correct_answer":"the correct answer"}. Each JSON object should be separated by only a newLine.'
     )
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": myMessageSystem},
-            {"role": "user", "content": text},
-        ],
-    )
 
-    return completion
+    return await sendQuizPrompt(
+        "multi-choice",
+        count,
+        "generate-multi",
+        myMessageSystem,
+        text,
+        required_keys=("question", "options", "correct_answer"),
+        on_object=onQuestion,
+    )
 
 
-def messageShortAnswer(count, text):
+async def messageShortAnswer(count, text, onQuestion=None):
     """
     Asks chatGPT to make a short answer quiz of length "count" based on the provided "text".
 
     Args:
         count (int): The number of questions to generate for the quiz.
         text (str): The text used as the basis for generating the quiz.
+        onQuestion (Callable[[dict], None], optional): Called with each question as soon as it is received.
 
     Returns:
-        completion: The completion object returned by the OpenAI API.
+        str: The content of the response.
     """
-    client = OpenAI()
     myMessageSystem = (
         "Generate a "
         + str(count)
         + '-question short answer quiz based on the provided text. Format each question as a JSON object like so {"question":""}'
     )
 
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": myMessageSystem},
-            {"role": "user", "content": text},
-        ],
+    return await sendQuizPrompt(
+        "short-answer",
+        count,
+        "generate-short",
+        myMessageSystem,
+        text,
+        required_keys=("question",),
+        on_object=onQuestion,
     )
 
-    return completion
-
 
-def messageFillBlanks(count, text):
+async def messageFillBlanks(count, text):
     """
     Sends a message to the OpenAI chat API to fill in the blanks in a given text.
 
@@ -465,27 +857,20 @@ def messageFillBlanks(count, text):
         text (str): The text containing the blanks to be filled.
 
     Returns:
-        completion (object): The completion object returned by the OpenAI chat API.
+        str: The content of the response.
     """
-    client = OpenAI()
     myMessageSystem = (
         "Give me exactly "
         + str(count)
         + ' facts about the topic below. Format each fact as a JSON object like so {"fact":""}. Do not use the ``` symbol to format your answer. Each JSON should be separated only by a newLine'
     )
 
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": myMessageSystem},
-            {"role": "user", "content": text},
-        ],
+    return await sendQuizPrompt(
+        "fill-gaps", count, "generate-fill", myMessageSystem, text, required_keys=("fact",)
     )
 
-    return completion
-
 
-def messageFillBlanks2(text):
+async def messageFillBlanks2(text):
     """
     Generates a fill-in-the-blanks question based on the given text.
 
@@ -493,18 +878,116 @@ def messageFillBlanks2(text):
         text (str): The fact to be used in the question.
 
     Returns:
-        completion: The completion object generated by the OpenAI chat API.
-    """
-    client = OpenAI()
-    completion = client.chat.completions.create(
-        model="gpt-4-1106-preview",
-        messages=[
-            {
-                "role": "system",
-                "content": 'Using the following fact, create a list of four words suitable for a fill-in-the-blank question. One of the 4 words you pick must come directly from the fact. Format your answer as a single JSON object like this: {"options":["option1","option2","option3","option4"],"correct_answer":"the correct answer"}',
-            },
-            {"role": "user", "content": "The fact: " + text},
-        ],
+        str: The content of the response.
+    """
+    myMessageSystem = 'Using the following fact, create a list of four words suitable for a fill-in-the-blank question. One of the 4 words you pick must come directly from the fact. Format your answer as a single JSON object like this: {"options":["option1","option2","option3","option4"],"correct_answer":"the correct answer"}'
+
+    return await sendQuizPrompt("fill-gaps", 1, "distractors", myMessageSystem, "The fact: " + text)
+
+
+async def messageFillBlanksBatch(facts):
+    """
+    Generates the options of fill-in-the-blanks questions for several facts at once.
+
+    Args:
+        facts (list[str]): The facts to be used in the questions.
+
+    Returns:
+        str: The content of the response.
+    """
+    myMessageSystem = 'For each of the following numbered facts, create a list of four words suitable for a fill-in-the-blank question. One of the 4 words you pick must come directly from the fact. Format your answer as a single JSON array with exactly one object per fact, in the same order as the facts, like this: [{"options":["option1","option2","option3","option4"],"correct_answer":"the correct answer"}]'
+    myMessageUser = "\n".join(
+        f"Fact {number}: {fact}" for number, fact in enumerate(facts, start=1)
     )
 
-    return completion
+    return await sendQuizPrompt(
+        "fill-gaps", len(facts), "distractors-batch", myMessageSystem, myMessageUser
+    )
+
+
+async def sendQuizPrompt(
+    question_type,
+    count,
+    route,
+    system_message,
+    user_message,
+    required_keys=None,
+    on_object=None,
+):
+    """
+    Sends a quiz generation prompt to chatGPT, reusing the response to an identical earlier
+    prompt when there is one in the response cache.
+
+    With `required_keys`, the response is streamed and parsed as it arrives: every JSON
+    object with all the keys counts as valid and is passed to `on_object`, and the stream is
+    closed early if another object starts once `count` valid objects have arrived. The
+    response is made of the objects that were parsed, one per line, and it isn't cached if
+    the stream was closed early.
+
+    Args:
+        question_type (str): The question type the prompt is for.
+        count (int): The number of questions (or option sets) asked for.
+        route (str): The model route of the prompt, see routing.default_routes.
+        system_message (str): The system message.
+        user_message (str): The user message.
+        required_keys (tuple[str], optional): The keys of a valid object. Defaults to None.
+        on_object (Callable[[dict], None], optional): Called with each valid object.
+
+    Returns:
+        str: The content of the response.
+    """
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message},
+    ]
+
+    def isValid(obj):
+        return all(key in obj for key in required_keys)
+
+    # Objects of cached responses are reported once the response is read from the cache
+    streamed = False
+    closedEarly = False
+
+    async def createResponse():
+        nonlocal streamed, closedEarly
+        streamed = True
+        if required_keys is None:
+            completion = await routed_chat_completion(route, messages)
+            return completion.choices[0].message.content
+
+        stream = await routed_chat_completion(route, messages, stream=True)
+        parser = JsonObjectStream()
+        objects = []
+        valid = 0
+        try:
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+
+                for obj in parser.feed(chunk.choices[0].delta.content):
+                    objects.append(obj)
+                    if isValid(obj):
+                        valid += 1
+                        if on_object:
+                            on_object(obj)
+
+                # Enough valid objects, read to the end of the response but don't wait for
+                # (or pay for) another object
+                if valid >= count and parser.in_object:
+                    closedEarly = True
+                    break
+        finally:
+            await stream.close()
+
+        # The text may end in the middle of an object or before a closing ``` fence, so
+        # the response is rebuilt from the complete objects
+        return "\n".join(json.dumps(obj) for obj in objects)
+
+    key = response_cache_key(system_message, user_message, router.model(route), count)
+    response = await cached_response(
+        question_type, key, createResponse, cache_if=lambda response: not closedEarly
+    )
+    if not streamed and on_object and required_keys is not None:
+        for obj in [obj for obj in iter_json_objects(response) if isValid(obj)][:count]:
+            on_object(obj)
+    return response
@@ -0,0 +1,313 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+from openai import RateLimitError
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice
+from openai.types.chat.chat_completion_chunk import ChoiceDelta
+
+from .backend import LLMBackend
+from .chunk_text import estimate_tokens
+
+# Settings of the fake backend (LLMBackend=fake)
+fake_llm_seed = int(os.environ.get("FakeLLMSeed", 0))
+fake_llm_latency = os.environ.get("FakeLLMLatency", "lognormal")
+fake_llm_latency_ms = float(os.environ.get("FakeLLMLatencyMs", 800))
+fake_llm_malformed_rate = float(os.environ.get("FakeLLMMalformedRate", 0.05))
+fake_llm_rate_limit_rate = float(os.environ.get("FakeLLMRateLimitRate", 0))
+
+# How the latency of a response is drawn, around the mean latency
+latency_distributions = ("fixed", "uniform", "exponential", "lognormal")
+
+# Spread of the lognormal latency distribution
+lognormal_sigma = 0.5
+
+# Share of a response's latency spent before its first streamed chunk
+first_chunk_share = 0.3
+
+# Characters per streamed chunk
+stream_chunk_chars = 16
+
+# How a malformed object is broken
+defects = ("truncated", "missing key", "bad options", "duplicate")
+
+filler_words = ("process", "system", "energy", "structure", "method", "result", "theory")
+
+
+class FakeBackend(LLMBackend):
+    """
+    An offline stand-in for OpenAI that answers the prompts of create_quiz and answer_quiz
+    in their expected formats, after a random latency. Each response depends only on the
+    seed, the messages and how many times the same messages were sent before, so a run can
+    be repeated exactly.
+
+    A share of the objects in each response is malformed (cut short, missing a key, with
+    invalid options, or repeated), and responses are sometimes wrapped in ``` fences, to
+    exercise the parsing and top-up paths. Requests can also fail with a RateLimitError.
+
+    Args:
+        seed (int, optional): Defaults to the FakeLLMSeed setting.
+        latency (str, optional): One of latency_distributions. Defaults to the
+            FakeLLMLatency setting.
+        latency_ms (float, optional): The mean latency of a response in milliseconds.
+            Defaults to the FakeLLMLatencyMs setting.
+        malformed_rate (float, optional): The probability of each object being malformed.
+            Defaults to the FakeLLMMalformedRate setting.
+        rate_limit_rate (float, optional): The probability of a request being rate limited.
+            Defaults to the FakeLLMRateLimitRate setting.
+    """
+
+    def __init__(
+        self,
+        seed: int = fake_llm_seed,
+        latency: str = fake_llm_latency,
+        latency_ms: float = fake_llm_latency_ms,
+        malformed_rate: float = fake_llm_malformed_rate,
+        rate_limit_rate: float = fake_llm_rate_limit_rate,
+    ):
+        if latency not in latency_distributions:
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        self.seed = seed
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.malformed_rate = malformed_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._sent = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "rate_limited": 0,
+            "objects": 0,
+            "malformed": 0,
+            "latency_seconds": 0.0,
+        }
+
+    async def create_chat_completion(self, **kwargs):
+        messages = kwargs["messages"]
+        model = kwargs.get("model", "fake")
+        rng = self._random(messages)
+
+        latency = self._latency(rng)
+        with self._lock:
+            self.stats["requests"] += 1
+        if rng.random() < self.rate_limit_rate:
+            await asyncio.sleep(latency * first_chunk_share)
+            with self._lock:
+                self.stats["rate_limited"] += 1
+                self.stats["latency_seconds"] += latency * first_chunk_share
+            raise RateLimitError(
+                "Rate limit reached (fake)",
+                response=httpx.Response(
+                    429,
+                    headers={"retry-after-ms": "200"},
+                    request=httpx.Request("POST", "https://fake.invalid/v1/chat/completions"),
+                ),
+                body=None,
+            )
+
+        content = self._respond(rng, messages[0]["content"], messages[-1]["content"])
+        usage = CompletionUsage(
+            prompt_tokens=sum(estimate_tokens(str(m.get("content", ""))) for m in messages),
+            completion_tokens=estimate_tokens(content),
+            total_tokens=0,
+        )
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+
+        with self._lock:
+            self.stats["latency_seconds"] += latency
+
+        if kwargs.get("stream"):
+            await asyncio.sleep(latency * first_chunk_share)
+            return FakeStream(content, model, latency * (1 - first_chunk_share))
+
+        await asyncio.sleep(latency)
+        return ChatCompletion(
+            id="fake-" + rng.randbytes(8).hex(),
+            choices=[
+                Choice(
+                    finish_reason="stop",
+                    index=0,
+                    message=ChatCompletionMessage(role="assistant", content=content),
+                )
+            ],
+            created=int(time.time()),
+            model=model,
+            object="chat.completion",
+            usage=usage,
+        )
+
+    def _random(self, messages: list[dict]) -> random.Random:
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+        with self._lock:
+            sent = self._sent.get(digest, 0)
+            self._sent[digest] = sent + 1
+        return random.Random(f"{self.seed}:{digest}:{sent}")
+
+    def _latency(self, rng: random.Random) -> float:
+        mean = self.latency_ms / 1000
+        match self.latency:
+            case "fixed":
+                return mean
+            case "uniform":
+                return rng.uniform(0, 2 * mean)
+            case "exponential":
+                return rng.expovariate(1 / mean) if mean > 0 else 0.0
+            case _:
+                if mean <= 0:
+                    return 0.0
+                return rng.lognormvariate(math.log(mean) - lognormal_sigma**2 / 2, lognormal_sigma)
+
+    def _respond(self, rng: random.Random, system: str, user: str) -> str:
+        words = re.findall(r"[A-Za-z]{4,}", user) or list(filler_words)
+        count = int(match.group()) if (match := re.search(r"\d+", system)) else 1
+
+        if "multiple-choice quiz" in system:
+            content = self._lines(rng, count, lambda: self._multi_choice(rng, words))
+        elif "short answer quiz" in system:
+            content = self._lines(rng, count, lambda: self._short_answer(rng, words))
+        elif "facts about" in system:
+            content = self._lines(rng, count, lambda: self._fact(rng, words))
+        elif "numbered facts" in system:
+            facts = re.findall(r"^Fact \d+: (.*)$", user, flags=re.MULTILINE)
+            content = self._array(rng, [self._options(rng, fact, words) for fact in facts])
+        elif "answer-checking" in system:
+            content = self._array(rng, self._answers(rng, user))
+        elif "fill-in-the-blank" in system:
+            fact = user.removeprefix("The fact: ")
+            content = json.dumps(self._options(rng, fact, words))
+        else:
+            content = "I can only help with quizzes."
+
+        # Models sometimes wrap their answer in a code block
+        if rng.random() < self.malformed_rate:
+            content = "```json\n" + content + "\n```"
+        return content
+
+    def _lines(self, rng: random.Random, count: int, create) -> str:
+        lines = []
+        for _ in range(count):
+            obj = create()
+            with self._lock:
+                self.stats["objects"] += 1
+            if rng.random() < self.malformed_rate:
+                with self._lock:
+                    self.stats["malformed"] += 1
+                lines.append(self._break(rng, obj, lines))
+            else:
+                lines.append(json.dumps(obj))
+        return "\n".join(lines)
+
+    def _array(self, rng: random.Random, objects: list[dict]) -> str:
+        with self._lock:
+            self.stats["objects"] += len(objects)
+        content = json.dumps(objects)
+        if objects and rng.random() < self.malformed_rate:
+            with self._lock:
+                self.stats["malformed"] += 1
+            content = content[: len(content) // 2]
+        return content
+
+    def _break(self, rng: random.Random, obj: dict, previous: list[str]) -> str:
+        defect = rng.choice(defects)
+        if defect == "truncated":
+            text = json.dumps(obj)
+            return text[: rng.randint(1, len(text) - 1)]
+        if defect == "missing key":
+            obj.pop(rng.choice(list(obj)))
+        elif defect == "bad options" and "options" in obj:
+            obj["options"] = obj["options"][:2]
+        elif defect == "duplicate" and previous:
+            return previous[-1]
+        return json.dumps(obj)
+
+    def _multi_choice(self, rng: random.Random, words: list[str]) -> dict:
+        options = _distinct(rng, words, 4)
+        return {
+            "question": f"Which term is described by {' '.join(rng.choices(words, k=6))}?",
+            "options": options,
+            "correct_answer": rng.choice(options),
+        }
+
+    def _short_answer(self, rng: random.Random, words: list[str]) -> dict:
+        return {"question": f"Explain how {' '.join(rng.choices(words, k=6))} are related."}
+
+    def _fact(self, rng: random.Random, words: list[str]) -> dict:
+        return {"fact": f"The {' '.join(rng.choices(words, k=8))} is an important idea."}
+
+    def _options(self, rng: random.Random, fact: str, words: list[str]) -> dict:
+        answer = rng.choice(re.findall(r"[A-Za-z]{4,}", fact) or list(filler_words))
+        options = [answer] + [word for word in _distinct(rng, words, 4) if word != answer][:3]
+        options += [word for word in filler_words if word not in options][: 4 - len(options)]
+        rng.shuffle(options)
+        return {"options": options, "correct_answer": answer}
+
+    def _answers(self, rng: random.Random, user: str) -> list[dict]:
+        try:
+            questions = json.loads(user)
+        except json.JSONDecodeError:
+            return []
+        # Answers not checked locally (short-answer) are right half of the time
+        return [
+            {
+                "question_id": question.get("question_id"),
+                "is_correct": str(question.get("is_correct", rng.random() < 0.5)).lower()
+                in ("true", "correct"),
+                "correct_answer": question.get("correct_answer", ""),
+                "feedback": "Review the related section of the material.",
+            }
+            for question in questions
+            if isinstance(question, dict)
+        ]
+
+
+class FakeStream:
+    """
+    The streamed response of FakeBackend: the content in small chunks, spread over the
+    remaining latency. Closing it stops the stream.
+    """
+
+    def __init__(self, content: str, model: str, duration: float):
+        self._pieces = [
+            content[start : start + stream_chunk_chars]
+            for start in range(0, len(content), stream_chunk_chars)
+        ]
+        self._model = model
+        self._delay = duration / max(len(self._pieces), 1)
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for piece in self._pieces:
+            await asyncio.sleep(self._delay)
+            if self.closed:
+                return
+            yield ChatCompletionChunk(
+                id="fake-stream",
+                choices=[ChunkChoice(delta=ChoiceDelta(content=piece), index=0)],
+                created=int(time.time()),
+                model=self._model,
+                object="chat.completion.chunk",
+            )
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def _distinct(rng: random.Random, words: list[str], count: int) -> list[str]:
+    # Up to `count` different words, padded with filler words when the text has too few
+    unique = list(dict.fromkeys(word.lower() for word in words))
+    picked = rng.sample(unique, min(count, len(unique)))
+    picked += [word for word in filler_words if word not in picked][: count - len(picked)]
+    return picked
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Texts whose estimated similarity (the Jaccard similarity of their character shingles) is
+# at least this are near-duplicates
+near_duplicate_threshold = float(os.environ.get("NearDuplicateThreshold", 0.8))
+
+# Shingle length in characters, and the number of hash functions in a MinHash signature
+shingle_length = 5
+signature_size = 64
+
+# Indexed signatures compared at once, bounds the memory used with a large index
+comparison_block_rows = 1024
+
+# Hash functions (a * x + b) mod p, the same in every process
+_prime = (1 << 31) - 1
+_random = np.random.default_rng(5)
+_multipliers = _random.integers(1, _prime, signature_size, dtype=np.int64)
+_offsets = _random.integers(0, _prime, signature_size, dtype=np.int64)
+_shingle_powers = 256 ** np.arange(shingle_length, dtype=np.int64)
+
+
+def minhash_signatures(texts: list[str]) -> np.ndarray:
+    """
+    Computes the MinHash signatures of texts. The share of equal values in two signatures
+    estimates the Jaccard similarity of the texts' sets of character shingles.
+
+    Args:
+        texts (list[str]): The texts, e.g. normalised with question_fingerprint.
+
+    Returns:
+        np.ndarray: A (len(texts), signature_size) array of signatures.
+    """
+    signatures = np.empty((len(texts), signature_size), dtype=np.int64)
+    for row, text in enumerate(texts):
+        # Every window of shingle_length bytes, read as a number
+        data = np.frombuffer(text.encode("utf-8").ljust(shingle_length), dtype=np.uint8)
+        windows = sliding_window_view(data, shingle_length).astype(np.int64)
+        shingles = np.unique(windows @ _shingle_powers % _prime)
+
+        # The smallest hash of the shingles under each hash function
+        hashes = (shingles[:, None] * _multipliers + _offsets) % _prime
+        signatures[row] = hashes.min(axis=0)
+    return signatures
+
+
+class NearDuplicateIndex:
+    """
+    A set of texts that finds near-duplicates of new texts by comparing MinHash signatures.
+
+    Args:
+        threshold (float, optional): The similarity from which texts are near-duplicates.
+            Defaults to the NearDuplicateThreshold setting.
+    """
+
+    def __init__(self, threshold: float = near_duplicate_threshold):
+        self.threshold = threshold
+        self._signatures = np.empty((0, signature_size), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def extend(self, texts: list[str]) -> None:
+        """
+        Adds texts without checking them, e.g. texts that were deduplicated before.
+
+        Args:
+            texts (list[str]): The texts.
+        """
+        if texts:
+            self._signatures = np.vstack([self._signatures, minhash_signatures(texts)])
+
+    def add(self, texts: list[str]) -> list[bool]:
+        """
+        Adds the texts that aren't near-duplicates of a text in the index, or of an earlier
+        text in the list.
+
+        Args:
+            texts (list[str]): The texts.
+
+        Returns:
+            list[bool]: Whether each text was added.
+        """
+        if not texts:
+            return []
+        signatures = minhash_signatures(texts)
+
+        # Similarity to the closest indexed text, one block of the index at a time
+        closest = np.zeros(len(texts))
+        for start in range(0, len(self._signatures), comparison_block_rows):
+            block = self._signatures[start : start + comparison_block_rows]
+            similarity = (signatures[:, None, :] == block[None, :, :]).mean(axis=2)
+            closest = np.maximum(closest, similarity.max(axis=1))
+        added = closest < self.threshold
+
+        # Then to the texts added before it from the same list
+        for row in range(1, len(texts)):
+            earlier = signatures[:row][added[:row]]
+            if added[row] and len(earlier):
+                similarity = (earlier == signatures[row]).mean(axis=1)
+                added[row] = similarity.max() < self.threshold
+
+        self._signatures = np.vstack([self._signatures, signatures[added]])
+        return added.tolist()
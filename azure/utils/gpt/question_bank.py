@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from ..db_proxy import get_question_bank_container
+from .near_duplicates import NearDuplicateIndex
+from .validate_question import question_fingerprint
+
+# Most questions kept for each question type of a source text, the newest are kept
+question_bank_max_per_type = int(os.environ.get("QuestionBankMaxPerType", 100))
+
+# Times a save is retried when another quiz saved to the same bank first
+question_bank_save_attempts = int(os.environ.get("QuestionBankSaveAttempts", 5))
+
+# Bumped when the prompts change, so questions made by the old prompts are no longer used
+question_bank_version = 1
+
+
+def question_bank_key(chunks: list[str]) -> str:
+    """
+    Returns the question bank key of a source text.
+
+    Args:
+        chunks (list[str]): The chunks the source text is split into, see chunk_text.
+
+    Returns:
+        str: A SHA-256 hex digest.
+    """
+    content = json.dumps([question_bank_version, chunks])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def load_question_bank(key: str) -> dict[str, list[dict]]:
+    """
+    Reads the questions generated earlier from a source text.
+
+    Args:
+        key (str): The question bank key of the source text.
+
+    Returns:
+        dict[str, list[dict]]: The questions of each question type, tagged with the index of
+            the chunk they were made from. Empty when the bank has no questions for the text
+            or isn't configured.
+    """
+    container = get_question_bank_container()
+    if container is None:
+        return {}
+
+    try:
+        entry = container.read_item(item=key, partition_key=key)
+    except CosmosResourceNotFoundError:
+        return {}
+    except Exception as e:
+        logging.error("Error reading question bank: %s", e, exc_info=True)
+        return {}
+
+    return entry.get("questions", {})
+
+
+def sample_question_bank(bank: dict[str, list[dict]], question_type: str, count: int) -> list[dict]:
+    """
+    Picks random questions of a type from the bank.
+
+    Args:
+        bank (dict[str, list[dict]]): The bank, see load_question_bank.
+        question_type (str): The question type.
+        count (int): The most questions to pick.
+
+    Returns:
+        list[dict]: Copies of the questions, ready to be added to a quiz.
+    """
+    questions = bank.get(question_type, [])
+    sample = random.sample(questions, min(count, len(questions)))
+    return [
+        {
+            **{field: value for field, value in question.items() if field != "chunk"},
+            "question_id": 0,
+            "type": question_type,
+        }
+        for question in sample
+    ]
+
+
+def save_to_question_bank(key: str, questions: list[tuple[int, dict]]) -> None:
+    """
+    Adds newly generated questions to the bank of their source text. Near-duplicates of
+    questions already in the bank are skipped. Quizzes made from the same text at the same
+    time each save their own questions: the bank is replaced only if it hasn't changed since
+    it was read, and read again otherwise.
+
+    Args:
+        key (str): The question bank key of the source text.
+        questions (list[tuple[int, dict]]): The questions, with the index of the chunk each
+            was made from.
+    """
+    container = get_question_bank_container()
+    if container is None or not questions:
+        return
+
+    try:
+        for _ in range(question_bank_save_attempts):
+            try:
+                entry = container.read_item(item=key, partition_key=key)
+            except CosmosResourceNotFoundError:
+                entry = None
+
+            bank = _add_questions(entry.get("questions", {}) if entry else {}, questions)
+            body = {"id": key, "questions": bank, "updated": int(time.time())}
+            try:
+                if entry is None:
+                    container.create_item(body)
+                else:
+                    container.replace_item(
+                        item=key,
+                        body=body,
+                        etag=entry["_etag"],
+                        match_condition=MatchConditions.IfNotModified,
+                    )
+                return
+            except (CosmosAccessConditionFailedError, CosmosResourceExistsError):
+                # Saved by another quiz since it was read
+                continue
+
+        logging.warning("Question bank %s kept changing, questions not saved", key)
+    except Exception as e:
+        logging.error("Error saving to question bank: %s", e, exc_info=True)
+
+
+def _add_questions(
+    bank: dict[str, list[dict]], questions: list[tuple[int, dict]]
+) -> dict[str, list[dict]]:
+    duplicates = NearDuplicateIndex()
+    duplicates.extend(
+        [
+            question_fingerprint(question)
+            for type_questions in bank.values()
+            for question in type_questions
+        ]
+    )
+    added = duplicates.add([question_fingerprint(question) for _, question in questions])
+
+    for (chunk, question), is_new in zip(questions, added):
+        if not is_new:
+            continue
+
+        entry = {
+            field: value
+            for field, value in question.items()
+            if field not in ("question_id", "type")
+        }
+        bank.setdefault(question["type"], []).append({**entry, "chunk": chunk})
+
+    for question_type in bank:
+        bank[question_type] = bank[question_type][-question_bank_max_per_type:]
+    return bank
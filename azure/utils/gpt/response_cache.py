@@ -0,0 +1,96 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import threading
+
+from ..blob_cache import BlobCache
+
+# Turn off to send every prompt, e.g. when benchmarking against the fake backend
+response_cache_enabled = os.environ.get("ResponseCache", "true").lower() == "true"
+
+# Responses are reused for a week by default, and up to 5M characters are kept in memory
+response_cache_ttl = int(os.environ.get("ResponseCacheTTLSeconds", 7 * 24 * 60 * 60))
+response_cache = BlobCache(
+    prefix="response-cache",
+    max_chars=int(os.environ.get("ResponseCacheMaxChars", 5_000_000)),
+    ttl=response_cache_ttl,
+)
+
+# Set while generating a quiz whose author asked for fresh questions, so cached responses
+# are skipped (new responses are still cached)
+fresh_responses = contextvars.ContextVar("fresh_responses", default=False)
+
+# Hits and misses per question type since the worker started
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def response_cache_key(system_prompt: str, user_content: str, model: str, count: int) -> str:
+    """
+    Returns the cache key of a prompt.
+
+    Args:
+        system_prompt (str): The system message.
+        user_content (str): The user message.
+        model (str): The model the prompt is sent to.
+        count (int): The number of questions (or option sets) asked for.
+
+    Returns:
+        str: A SHA-256 hex digest.
+    """
+    prompt = json.dumps([system_prompt, user_content, model, count])
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+async def cached_response(question_type: str, key: str, create_response, cache_if=None) -> str:
+    """
+    Returns the cached response for a key, or creates, caches and returns it on a miss.
+
+    Args:
+        question_type (str): The question type the response is for, for the hit rates.
+        key (str): The cache key, see response_cache_key.
+        create_response (Callable[[], Awaitable[str]]): Creates the response on a miss.
+        cache_if (Callable[[str], bool], optional): Decides whether a new response is
+            cached. Defaults to caching every response.
+
+    Returns:
+        str: The response.
+    """
+    if not response_cache_enabled:
+        return await create_response()
+
+    if not fresh_responses.get():
+        response = await asyncio.to_thread(response_cache.get, key)
+        _record(question_type, response is not None)
+        if response is not None:
+            return response
+
+    response = await create_response()
+    if cache_if is None or cache_if(response):
+        await asyncio.to_thread(response_cache.put, key, response)
+    return response
+
+
+def get_response_cache_stats() -> dict:
+    """
+    Returns the response cache hits, misses and hit rate of each question type.
+
+    Returns:
+        dict: Example: {"multi-choice": {"hits": 3, "misses": 1, "hit_rate": 0.75}}
+    """
+    with _stats_lock:
+        return {
+            question_type: {
+                **counts,
+                "hit_rate": counts["hits"] / (counts["hits"] + counts["misses"]),
+            }
+            for question_type, counts in _stats.items()
+        }
+
+
+def _record(question_type: str, hit: bool) -> None:
+    with _stats_lock:
+        counts = _stats.setdefault(question_type, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
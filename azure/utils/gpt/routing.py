@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from .chunk_text import estimate_tokens
+from .scheduler import background_priority, chat_completion
+
+# The model, request timeout (seconds) and max_tokens of each task. When the latency of a
+# route's model goes over its latency_slo (seconds, at the 90th percentile of its recent
+# calls), the route uses its fallback model for a while.
+default_routes = {
+    "generate-multi": {"model": "gpt-3.5-turbo", "timeout": 60},
+    "generate-short": {"model": "gpt-3.5-turbo", "timeout": 60},
+    "generate-fill": {"model": "gpt-3.5-turbo", "timeout": 60},
+    "distractors": {
+        "model": "gpt-4-1106-preview",
+        "timeout": 30,
+        "max_tokens": 300,
+        "fallback": "gpt-3.5-turbo",
+        "latency_slo": 10,
+    },
+    # The options of every fact in one request (FillGapsMode "batched"). Its reply grows
+    # with the number of facts, so it has no max_tokens and its own latency.
+    "distractors-batch": {
+        "model": "gpt-4-1106-preview",
+        "timeout": 60,
+        "fallback": "gpt-3.5-turbo",
+        "latency_slo": 30,
+    },
+    "grade-short": {
+        "model": "gpt-4-1106-preview",
+        "timeout": 60,
+        "fallback": "gpt-3.5-turbo",
+        "latency_slo": 20,
+    },
+    "feedback": {
+        "model": "gpt-4-1106-preview",
+        "timeout": 60,
+        "fallback": "gpt-3.5-turbo",
+        "latency_slo": 20,
+    },
+}
+
+# Overrides of the routes as JSON, merged into the defaults per route, e.g.
+# {"distractors": {"model": "gpt-3.5-turbo", "max_tokens": 200}}
+model_routes = json.loads(os.environ.get("ModelRoutes") or "{}")
+
+# US dollars per 1000 prompt and completion tokens, for the cost estimates. Overrides as
+# JSON, e.g. {"gpt-3.5-turbo": [0.0005, 0.0015]}
+default_model_costs = {
+    "gpt-3.5-turbo": (0.001, 0.002),
+    "gpt-4-1106-preview": (0.01, 0.03),
+}
+model_costs = {**default_model_costs, **json.loads(os.environ.get("ModelCosts") or "{}")}
+
+# Recent calls a route's latency is measured over, and how many are needed before it counts
+latency_slo_window = 20
+latency_slo_min_calls = 5
+
+# How long a route stays on its fallback model before trying its model again
+model_fallback_seconds = int(os.environ.get("ModelFallbackSeconds", 120))
+
+
+class ModelRouter:
+    """
+    Picks the model of each request from its route, falls back to the route's faster model
+    while its latency SLO is breached, and keeps the latency, token and cost metrics of every
+    route and model.
+
+    Args:
+        routes (dict): The configuration of each route, see default_routes.
+    """
+
+    def __init__(self, routes: dict):
+        self.routes = routes
+        self._latencies = {route: deque(maxlen=latency_slo_window) for route in routes}
+        self._fallback_until = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def model(self, route: str) -> str:
+        """Returns the configured model of a route, ignoring any fallback."""
+        return self._route(route)["model"]
+
+    def choose(self, route: str) -> str:
+        """Returns the model to send the next request of a route to."""
+        config = self._route(route)
+        with self._lock:
+            if config.get("fallback") and self._fallback_until.get(route, 0) > time.monotonic():
+                return config["fallback"]
+        return config["model"]
+
+    def record(
+        self,
+        route: str,
+        model: str,
+        latency: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        error: bool = False,
+    ) -> None:
+        """
+        Records a call, and moves the route to its fallback model if its model is now over
+        the latency SLO.
+
+        Args:
+            route (str): The route of the call.
+            model (str): The model it was sent to.
+            latency (float): Seconds from sending the request to the end of the response.
+            prompt_tokens (int, optional): Tokens in the prompt. Defaults to 0.
+            completion_tokens (int, optional): Tokens in the response. Defaults to 0.
+            error (bool, optional): Whether the call failed. Defaults to False.
+        """
+        config = self._route(route)
+        prompt_cost, completion_cost = model_costs.get(model, (0, 0))
+
+        with self._lock:
+            metrics = self._metrics.setdefault(route, {}).setdefault(
+                model,
+                {
+                    "calls": 0,
+                    "errors": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cost": 0.0,
+                    "latencies": deque(maxlen=latency_slo_window * 5),
+                },
+            )
+            metrics["calls"] += 1
+            metrics["errors"] += error
+            metrics["prompt_tokens"] += prompt_tokens
+            metrics["completion_tokens"] += completion_tokens
+            metrics["cost"] += (
+                prompt_tokens * prompt_cost + completion_tokens * completion_cost
+            ) / 1000
+            metrics["latencies"].append(latency)
+
+            slo = config.get("latency_slo")
+            if not slo or not config.get("fallback") or model != config["model"]:
+                return
+
+            latencies = self._latencies.setdefault(route, deque(maxlen=latency_slo_window))
+            latencies.append(latency)
+            if len(latencies) < latency_slo_min_calls:
+                return
+            p90 = _percentile(latencies, 0.9)
+            if p90 <= slo:
+                return
+
+            # Start over once the fallback period is over
+            latencies.clear()
+            self._fallback_until[route] = time.monotonic() + model_fallback_seconds
+
+        logging.warning(
+            "Route %s is over its latency SLO (p90 %.1fs > %.1fs), using %s for %ds",
+            route,
+            p90,
+            slo,
+            config["fallback"],
+            model_fallback_seconds,
+        )
+
+    def metrics(self) -> dict:
+        """
+        Returns the metrics of every route and model.
+
+        Returns:
+            dict: {route: {model: {calls, errors, prompt_tokens, completion_tokens, cost,
+                latency_p50, latency_p95}}}, and the routes currently on their fallback model
+                under "fallback".
+        """
+        now = time.monotonic()
+        with self._lock:
+            result = {
+                route: {
+                    model: {
+                        **{name: value for name, value in metrics.items() if name != "latencies"},
+                        "latency_p50": _percentile(metrics["latencies"], 0.5),
+                        "latency_p95": _percentile(metrics["latencies"], 0.95),
+                    }
+                    for model, metrics in models.items()
+                }
+                for route, models in self._metrics.items()
+            }
+            result["fallback"] = [
+                route for route, until in self._fallback_until.items() if until > now
+            ]
+        return result
+
+    def _route(self, route: str) -> dict:
+        if route not in self.routes:
+            raise ValueError(f"Unknown model route: {route}")
+        return self.routes[route]
+
+
+class RecordedStream:
+    """
+    Wraps a streamed response to record its call once the stream is closed.
+    """
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._parts = []
+        self._closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for chunk in self._stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                self._parts.append(chunk.choices[0].delta.content)
+            yield chunk
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        await self._stream.close()
+        self._on_close("".join(self._parts))
+
+
+def _percentile(values, fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+router = ModelRouter(
+    {
+        route: {**default_routes.get(route, {}), **model_routes.get(route, {})}
+        for route in {**default_routes, **model_routes}
+    }
+)
+
+
+async def routed_chat_completion(
+    route: str, messages: list[dict], priority: int = background_priority, stream: bool = False
+):
+    """
+    Sends a chat completion request to the model of a route, with the route's timeout and
+    max_tokens, and records its latency and token usage. Streamed responses are recorded
+    when they are closed, with estimated token counts.
+
+    Args:
+        route (str): The route, a key of default_routes or the ModelRoutes setting.
+        messages (list[dict]): The messages.
+        priority (int, optional): interactive_priority or background_priority.
+            Defaults to background_priority.
+        stream (bool, optional): Stream the response. Defaults to False.
+
+    Returns:
+        ChatCompletion | RecordedStream: The completion, or the stream to read it from.
+    """
+    config = router.routes.get(route, {})
+    model = router.choose(route)
+    kwargs = {"model": model, "messages": messages}
+    if config.get("timeout"):
+        kwargs["timeout"] = config["timeout"]
+    if config.get("max_tokens"):
+        kwargs["max_tokens"] = config["max_tokens"]
+    if stream:
+        kwargs["stream"] = True
+
+    timing = {}
+    try:
+        completion = await chat_completion(priority=priority, timing=timing, **kwargs)
+    except Exception:
+        started = timing.get("started")
+        latency = time.monotonic() - started if started else 0.0
+        router.record(route, model, latency, error=True)
+        raise
+
+    if stream:
+        prompt_tokens = sum(estimate_tokens(str(message["content"])) for message in messages)
+
+        def record_stream(content):
+            router.record(
+                route,
+                model,
+                time.monotonic() - timing["started"],
+                prompt_tokens,
+                estimate_tokens(content),
+            )
+
+        return RecordedStream(completion, record_stream)
+
+    usage = getattr(completion, "usage", None)
+    router.record(
+        route,
+        model,
+        time.monotonic() - timing["started"],
+        usage.prompt_tokens if usage else 0,
+        usage.completion_tokens if usage else 0,
+    )
+    return completion
+
+
+def get_route_metrics() -> dict:
+    """
+    Returns the latency, token and cost metrics of the worker's routes, see
+    ModelRouter.metrics.
+
+    Returns:
+        dict: The metrics.
+    """
+    return router.metrics()
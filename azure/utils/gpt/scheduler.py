@@ -0,0 +1,396 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+from openai import APIConnectionError, APIStatusError, InternalServerError, RateLimitError
+
+from ..event_loop import get_event_loop
+from .chunk_text import estimate_tokens
+from .backend import get_llm_backend
+
+# Account limits shared by every request this worker sends
+openai_requests_per_minute = int(os.environ.get("OpenAIRequestsPerMinute", 500))
+openai_tokens_per_minute = int(os.environ.get("OpenAITokensPerMinute", 150000))
+
+# Maximum number of requests in flight, and attempts per request before giving up
+openai_max_concurrency = int(os.environ.get("OpenAIMaxConcurrency", 16))
+openai_max_attempts = int(os.environ.get("OpenAIMaxAttempts", 5))
+
+# Tokens reserved for the completion when a request doesn't set max_tokens
+openai_completion_token_estimate = int(os.environ.get("OpenAICompletionTokenEstimate", 1000))
+
+# Priority classes, lower goes first
+interactive_priority = 0  # a user is waiting for the result, e.g. answer_quiz
+background_priority = 1  # e.g. quiz generation from a queue job
+
+# Backoff after a failed attempt without a Retry-After header, doubled after each attempt
+retry_base_delay = 1.0
+retry_max_delay = 60.0
+
+
+class TokenBucket:
+    """
+    A token bucket that refills continuously at `rate_per_minute`, up to one minute of
+    tokens. The level may go negative when a request used more than it reserved.
+
+    Args:
+        rate_per_minute (int): Tokens added per minute, also the capacity of the bucket.
+    """
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.level = float(rate_per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: int) -> float:
+        """Returns the seconds until `amount` tokens are available, 0 if they already are."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: int) -> None:
+        """Removes tokens from the bucket, a negative amount gives them back."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+class ChatRequest:
+    """A chat completion request waiting in the scheduler."""
+
+    def __init__(
+        self,
+        kwargs: dict,
+        priority: int,
+        tokens: int,
+        future: asyncio.Future,
+        timing: dict = None,
+    ):
+        self.kwargs = kwargs
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+        self.timing = timing
+        self.submitted = time.monotonic()
+        self.attempts = 0
+
+
+class ScheduledStream:
+    """
+    Wraps a streamed response to hold its request's slot in the scheduler until the stream
+    is closed or exhausted, rather than only until its first chunk.
+    """
+
+    def __init__(self, stream, on_release):
+        self._stream = stream
+        self._on_release = on_release
+        self._released = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            self._release()
+
+    async def close(self) -> None:
+        try:
+            await self._stream.close()
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._on_release()
+
+
+class ChatScheduler:
+    """
+    Sends the chat completion requests of the whole worker process, so they share the
+    account's requests-per-minute and tokens-per-minute limits. Requests are started in
+    priority order as soon as both token buckets allow, with at most
+    `openai_max_concurrency` in flight. Rate limited and failed requests are retried after
+    the server's Retry-After delay (or an exponential backoff), during which no other
+    request is started.
+
+    The scheduler runs on the worker event loop (utils.event_loop), use `submit` from
+    coroutines running there.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+        self._requests = TokenBucket(openai_requests_per_minute)
+        self._tokens = TokenBucket(openai_tokens_per_minute)
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._wakeup = None
+        self._dispatcher = None
+        self._tasks = set()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+
+    async def submit(self, priority: int = background_priority, timing: dict = None, **kwargs):
+        """
+        Queues a chat completion request and waits for its response.
+
+        Args:
+            priority (int, optional): interactive_priority or background_priority.
+                Defaults to background_priority.
+            timing (dict, optional): Set to {"started": time.monotonic()} when the last
+                attempt at the request is sent, to time it without its wait in the queue.
+            **kwargs: The arguments of chat.completions.create.
+
+        Returns:
+            ChatCompletion: The completion.
+        """
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        future = asyncio.get_running_loop().create_future()
+        prompt = "".join(str(message.get("content", "")) for message in kwargs["messages"])
+        tokens = estimate_tokens(prompt) + kwargs.get(
+            "max_tokens", openai_completion_token_estimate
+        )
+
+        request = ChatRequest(kwargs, priority, tokens, future, timing)
+        heapq.heappush(self._heap, (priority, next(self._sequence), request))
+        self._stats["submitted"] += 1
+        self._wakeup.set()
+        return await future
+
+    async def close(self) -> None:
+        """
+        Stops the dispatcher and the requests in flight, and cancels the queued requests.
+        Call it before the event loop goes away, the scheduler starts again on the next
+        request.
+        """
+        tasks = [*self._tasks, *([self._dispatcher] if self._dispatcher else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+
+        for _, _, request in self._heap:
+            request.future.cancel()
+        self._heap.clear()
+
+    def metrics(self) -> dict:
+        """
+        Returns the scheduler's counters and current state.
+
+        Returns:
+            dict: queue_depth (per priority), in_flight, submitted, completed, failed,
+                retries, rate_limited, average_wait and max_wait (seconds in the queue).
+        """
+        queue_depth = {}
+        for priority, _, _ in self._heap:
+            queue_depth[priority] = queue_depth.get(priority, 0) + 1
+
+        started = self._stats["completed"] + self._stats["failed"]
+        return {
+            **self._stats,
+            "queue_depth": queue_depth,
+            "in_flight": self._in_flight,
+            "average_wait": self._stats["total_wait"] / started if started else 0.0,
+        }
+
+    def _delay(self, tokens: int) -> float:
+        return max(
+            self._paused_until - time.monotonic(),
+            self._requests.delay(1),
+            self._tokens.delay(tokens),
+        )
+
+    async def _dispatch(self) -> None:
+        while True:
+            # Wait for the request at the front of the queue to fit in the limits. A new
+            # request wakes the dispatcher up, in case it has a higher priority.
+            delay = None
+            if self._heap and self._heap[0][2].future.done():
+                # Its caller was cancelled while it waited, don't spend the limits on it
+                heapq.heappop(self._heap)
+                continue
+            if self._heap and self._in_flight < openai_max_concurrency:
+                delay = self._delay(self._heap[0][2].tokens)
+                if delay <= 0:
+                    self._start(heapq.heappop(self._heap)[2])
+                    continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, request: ChatRequest) -> None:
+        self._requests.take(1)
+        self._tokens.take(request.tokens)
+        self._in_flight += 1
+
+        if request.timing is not None:
+            request.timing["started"] = time.monotonic()
+        if request.attempts == 0:
+            wait = time.monotonic() - request.submitted
+            self._stats["total_wait"] += wait
+            self._stats["max_wait"] = max(self._stats["max_wait"], wait)
+
+        # The event loop only keeps weak references to tasks
+        task = asyncio.create_task(self._send(request))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, request: ChatRequest) -> None:
+        request.attempts += 1
+        try:
+            completion = await get_llm_backend().create_chat_completion(**request.kwargs)
+        except asyncio.CancelledError:
+            # The scheduler is closing
+            request.future.cancel()
+            self._release()
+            raise
+        except (RateLimitError, InternalServerError, APIConnectionError) as e:
+            if request.attempts >= openai_max_attempts:
+                self._finish(request, error=e)
+                return
+
+            # Hold back every request until the server is ready again, then retry this one
+            delay = _retry_after(e) or _backoff(request.attempts)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._stats["retries"] += 1
+            if isinstance(e, RateLimitError):
+                self._stats["rate_limited"] += 1
+            logging.warning(
+                "OpenAI request failed (%s), retrying in %.1fs (attempt %d)",
+                type(e).__name__,
+                delay,
+                request.attempts,
+            )
+            heapq.heappush(self._heap, (request.priority, next(self._sequence), request))
+            self._release()
+            return
+        except Exception as e:
+            self._finish(request, error=e)
+            return
+
+        # Streams are handed over once the response starts, and keep their reservation.
+        # They hold their slot until they are closed or exhausted.
+        if request.kwargs.get("stream"):
+            stream = ScheduledStream(completion, self._release)
+            if request.future.done():
+                # Nobody is waiting for it any more
+                await stream.close()
+            self._finish(request, completion=stream, release=False)
+            return
+
+        # Correct the reservation with the tokens that were actually used
+        if getattr(completion, "usage", None) is not None:
+            self._tokens.take(completion.usage.total_tokens - request.tokens)
+        self._finish(request, completion=completion)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._wakeup.set()
+
+    def _finish(
+        self, request: ChatRequest, completion=None, error: Exception = None, release: bool = True
+    ) -> None:
+        if release:
+            self._release()
+
+        if request.future.done():
+            return
+        if error is not None:
+            self._stats["failed"] += 1
+            request.future.set_exception(error)
+        else:
+            self._stats["completed"] += 1
+            request.future.set_result(completion)
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Returns the delay the server asked for in its Retry-After headers, if any."""
+    if not isinstance(error, APIStatusError):
+        return None
+    headers = error.response.headers
+
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            try:
+                return float(headers["retry-after"])
+            except ValueError:
+                # HTTP date
+                return max(
+                    0.0, parsedate_to_datetime(headers["retry-after"]).timestamp() - time.time()
+                )
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _backoff(attempt: int) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(retry_max_delay, retry_base_delay * 2 ** (attempt - 1)))
+
+
+# One scheduler per worker process, on the worker event loop
+scheduler = ChatScheduler()
+
+
+async def chat_completion(priority: int = background_priority, timing: dict = None, **kwargs):
+    """
+    Sends a chat completion request through the worker's scheduler.
+
+    Args:
+        priority (int, optional): interactive_priority or background_priority.
+            Defaults to background_priority.
+        timing (dict, optional): See ChatScheduler.submit.
+        **kwargs: The arguments of chat.completions.create.
+
+    Returns:
+        ChatCompletion: The completion.
+    """
+    if asyncio.get_running_loop() is not get_event_loop():
+        raise RuntimeError("chat_completion must run on the worker event loop")
+    return await scheduler.submit(priority, timing, **kwargs)
+
+
+async def close_scheduler() -> None:
+    """
+    Stops the worker's scheduler, see ChatScheduler.close.
+    """
+    await scheduler.close()
+
+
+def get_scheduler_metrics() -> dict:
+    """
+    Returns the metrics of the worker's scheduler, see ChatScheduler.metrics.
+
+    Returns:
+        dict: The metrics.
+    """
+    return scheduler.metrics()
@@ -0,0 +1,220 @@
+import logging
+import os
+import re
+
+import numpy as np
+
+from ..files import chars_per_token
+from .chunk_text import estimate_tokens, split_text
+
+# Estimated tokens of file text sent to the model per quiz. Larger texts are cut down to
+# their most informative passages; 0 sends everything.
+passage_token_budget = int(os.environ.get("PassageTokenBudget", 12000))
+
+# Longest passage, longer sections (pages, paragraphs, slides) are split on sentences
+passage_max_tokens = 200
+
+# BM25 parameters: term frequency saturation and length normalisation
+bm25_k1 = 1.5
+bm25_b = 0.75
+
+# Without a topic, passages are ranked against the document's most salient terms
+salient_term_count = 50
+
+# Weight left to a query term once a selected passage covers it, so later picks favour
+# passages about the rest of the query
+covered_term_weight = 0.5
+
+term_pattern = re.compile(r"\w+")
+stop_words = frozenset(
+    "a about after all also an and any are as at be been but by can could did do does for "
+    "from had has have he her his how i if in into is it its may more most no not of on one "
+    "only or other our she so some such than that the their them then there these they this "
+    "to was we were what when where which while who will with would you your".split()
+)
+
+
+def select_passages(texts: list[str], topic: str = "", max_tokens: int = None) -> list[str]:
+    """
+    Cuts texts that are over a token budget down to their most informative passages.
+    Passages are ranked with BM25 against the topic, or against the most salient terms of
+    the texts when there is no topic (or nothing matches it), and picked best first while
+    they fit. Terms of a picked passage count for less afterwards, so the picks cover the
+    whole query rather than repeating its most common term.
+
+    Args:
+        texts (list[str]): The texts, e.g. the content of each file, with one section per line.
+        topic (str, optional): The topic of the quiz. Defaults to "".
+        max_tokens (int, optional): The budget in (estimated) tokens. Defaults to the
+            PassageTokenBudget setting.
+
+    Returns:
+        list[str]: The selected passages of each text, in their original order and one per
+            line. The texts are returned unchanged when they fit in the budget.
+    """
+    if max_tokens is None:
+        max_tokens = passage_token_budget
+    if max_tokens <= 0 or sum(estimate_tokens(text) for text in texts) <= max_tokens:
+        return texts
+
+    # Split the texts into passages, remembering which text each comes from
+    passages = []
+    sources = []
+    for index, text in enumerate(texts):
+        for line in text.split("\n"):
+            if line.strip():
+                for passage in split_text(line.strip(), passage_max_tokens * chars_per_token, 1):
+                    passages.append(passage)
+                    sources.append(index)
+
+    if not passages:
+        return texts
+
+    terms = PassageTerms(passages)
+    query = terms.query_weights(tokenize(topic))
+    if not query.any():
+        query = terms.salience_weights()
+
+    selected = terms.select(
+        query, [estimate_tokens(passage) + 1 for passage in passages], max_tokens
+    )
+    logging.info(
+        f"Selected {len(selected)} of {len(passages)} passages for a budget of {max_tokens} tokens"
+    )
+
+    results = [[] for _ in texts]
+    for index in sorted(selected):
+        results[sources[index]].append(passages[index])
+    return ["\n".join(text_passages) for text_passages in results]
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits a text into lowercase terms, without stop words and single characters.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list[str]: The terms, in order.
+    """
+    return [
+        term
+        for term in term_pattern.findall(text.lower())
+        if len(term) > 1 and term not in stop_words
+    ]
+
+
+class PassageTerms:
+    """
+    The term counts of a list of passages, stored sparsely as parallel arrays of
+    (passage, term, count), with what BM25 needs to score them.
+
+    Args:
+        passages (list[str]): The passages.
+    """
+
+    def __init__(self, passages: list[str]):
+        self.vocabulary = {}
+        passage_ids = []
+        term_ids = []
+        for passage_id, passage in enumerate(passages):
+            for term in tokenize(passage):
+                passage_ids.append(passage_id)
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+
+        # Count each (passage, term) pair
+        vocabulary_size = max(len(self.vocabulary), 1)
+        pairs, counts = np.unique(
+            np.array(passage_ids, dtype=np.int64) * vocabulary_size
+            + np.array(term_ids, dtype=np.int64),
+            return_counts=True,
+        )
+        self.passage_ids = pairs // vocabulary_size
+        self.term_ids = pairs % vocabulary_size
+        self.counts = counts
+
+        # Passage lengths in terms, and the number of passages each term appears in
+        self.passage_count = len(passages)
+        lengths = np.bincount(self.passage_ids, weights=counts, minlength=len(passages))
+        document_frequency = np.bincount(self.term_ids, minlength=len(self.vocabulary))
+        self.idf = np.log(
+            1 + (self.passage_count - document_frequency + 0.5) / (document_frequency + 0.5)
+        )
+
+        # The saturated, length normalised frequency of every (passage, term) pair
+        average_length = max(lengths.mean(), 1)
+        norms = bm25_k1 * (1 - bm25_b + bm25_b * lengths[self.passage_ids] / average_length)
+        self.frequencies = counts * (bm25_k1 + 1) / (counts + norms)
+
+    def query_weights(self, query_terms: list[str]) -> np.ndarray:
+        """
+        Returns the weight of every vocabulary term in a query: its number of occurrences.
+
+        Args:
+            query_terms (list[str]): The terms of the query.
+
+        Returns:
+            np.ndarray: The weights, zero for terms that aren't in the query.
+        """
+        weights = np.zeros(len(self.vocabulary))
+        for term in query_terms:
+            if term in self.vocabulary:
+                weights[self.vocabulary[term]] += 1
+        return weights
+
+    def salience_weights(self) -> np.ndarray:
+        """
+        Returns a query made of the most salient terms: frequent in the texts, but not in
+        most of the passages.
+
+        Returns:
+            np.ndarray: The weights, zero for terms outside the query.
+        """
+        total_counts = np.bincount(
+            self.term_ids, weights=self.counts, minlength=len(self.vocabulary)
+        )
+        salience = np.log1p(total_counts) * self.idf
+        weights = np.zeros(len(self.vocabulary))
+        top_terms = np.argsort(salience)[::-1][:salient_term_count]
+        weights[top_terms] = salience[top_terms]
+        return weights
+
+    def select(self, query: np.ndarray, costs: list[int], max_cost: int) -> list[int]:
+        """
+        Picks the passages with the best BM25 score against the query while their total
+        cost fits, lowering the weight of the query terms covered after each pick.
+
+        Args:
+            query (np.ndarray): The weight of each vocabulary term, see query_weights.
+            costs (list[int]): The cost (tokens) of each passage.
+            max_cost (int): The budget.
+
+        Returns:
+            list[int]: The indices of the selected passages.
+        """
+        # A dense (passage, query term) matrix of the weighted frequencies
+        query_terms = np.flatnonzero(query)
+        columns = np.full(len(self.vocabulary), -1)
+        columns[query_terms] = np.arange(len(query_terms))
+        matches = columns[self.term_ids] >= 0
+        scores = np.zeros((self.passage_count, len(query_terms)))
+        scores[self.passage_ids[matches], columns[self.term_ids[matches]]] = (
+            self.frequencies[matches] * self.idf[self.term_ids[matches]]
+        )
+
+        costs = np.array(costs)
+        weights = query[query_terms].astype(float)
+        available = costs <= max_cost
+        selected = []
+        remaining = max_cost
+        while available.any():
+            # Ties (e.g. no matching terms) go to the earliest passage
+            passage_scores = np.where(available, scores @ weights, -np.inf)
+            best = int(np.argmax(passage_scores))
+            selected.append(best)
+            remaining -= costs[best]
+            weights[scores[best] > 0] *= covered_term_weight
+            available[best] = False
+            available &= costs <= remaining
+        return selected
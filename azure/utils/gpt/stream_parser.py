@@ -0,0 +1,78 @@
+import json
+import logging
+from typing import Iterator
+
+
+class JsonObjectStream:
+    """
+    Incrementally finds the top-level JSON objects in streamed text, such as newline
+    delimited JSON or a JSON array, and decodes each one as soon as its closing brace
+    arrives. Anything between objects (new lines, commas, brackets, ``` fences) is skipped.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def in_object(self) -> bool:
+        """True if the text fed so far ends inside an object."""
+        return self._depth > 0
+
+    def feed(self, text: str) -> list[dict]:
+        """
+        Adds the next piece of text.
+
+        Args:
+            text (str): The text, it may end in the middle of an object or string.
+
+        Returns:
+            list[dict]: The objects completed by this piece of text. Objects that aren't
+                valid JSON are logged and skipped.
+        """
+        objects = []
+
+        for character in text:
+            if self._depth == 0:
+                if character == "{":
+                    self._depth = 1
+                    self._buffer = ["{"]
+                continue
+
+            self._buffer.append(character)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif character == "\\":
+                    self._escaped = True
+                elif character == '"':
+                    self._in_string = False
+            elif character == '"':
+                self._in_string = True
+            elif character == "{":
+                self._depth += 1
+            elif character == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads("".join(self._buffer)))
+                    except json.JSONDecodeError as e:
+                        logging.info(f"Error decoding streamed JSON object: {e}")
+                    self._buffer = []
+
+        return objects
+
+
+def iter_json_objects(text: str) -> Iterator[dict]:
+    """
+    Yields the top-level JSON objects in a complete text, see JsonObjectStream.
+
+    Args:
+        text (str): The text.
+
+    Yields:
+        dict: Each valid object, in order.
+    """
+    yield from JsonObjectStream().feed(text)
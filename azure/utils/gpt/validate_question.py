@@ -0,0 +1,47 @@
+def question_problem(question: dict) -> str | None:
+    """
+    Checks a generated question before it is added to a quiz.
+
+    Args:
+        question (dict): The parsed question, with its "type" set.
+
+    Returns:
+        str | None: Why the question can't be used, or None if it is valid.
+    """
+    text = question.get("question")
+    if not isinstance(text, str) or not text.strip():
+        return "missing question"
+
+    if question.get("type") == "short-answer":
+        return None
+
+    options = question.get("options")
+    if not isinstance(options, list) or len(options) != 4:
+        return "wrong number of options"
+    if not all(isinstance(option, str) and option.strip() for option in options):
+        return "empty option"
+    if len({option.strip().lower() for option in options}) != len(options):
+        return "duplicate options"
+    if question.get("correct_answer") not in options:
+        return "correct answer not in options"
+
+    # The answer of a fill-gaps question must have been blanked out of the fact
+    if question.get("type") == "fill-gaps" and "_" not in text:
+        return "no gap"
+
+    return None
+
+
+def question_fingerprint(question: dict) -> str:
+    """
+    Returns a key that is the same for questions with the same text, ignoring case,
+    punctuation and spacing.
+
+    Args:
+        question (dict): The question.
+
+    Returns:
+        str: The key.
+    """
+    text = str(question.get("question", "")).lower()
+    return " ".join("".join(c if c.isalnum() or c == "_" else " " for c in text).split())
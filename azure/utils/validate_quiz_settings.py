@@ -0,0 +1,49 @@
+from models import InvalidField
+
+# Question types a quiz can be made of
+question_type_options = ["multi-choice", "fill-gaps", "short-answer"]
+
+
+def validate_quiz_settings(
+    quiz_name: str, content: str, topic: str, num_questions: str, question_types: list[str]
+) -> int:
+    """
+    Validates the settings of a new quiz.
+
+    Args:
+        quiz_name (str): The name of the quiz.
+        content (str): The text content of the quiz, may be empty.
+        topic (str): The topic of the quiz, may be empty.
+        num_questions (str): The number of questions, as submitted.
+        question_types (list[str]): The question types of the quiz.
+
+    Raises:
+        InvalidField: If a setting is invalid.
+
+    Returns:
+        int: The number of questions.
+    """
+    if len(quiz_name) > 50:
+        raise InvalidField("Quiz name too long (max 50 characters)")
+    if content and not (400 <= len(content) <= 2000):
+        raise InvalidField("Content must be between 400 and 2000 characters")
+    if len(topic) > 100:
+        raise InvalidField("Topic too long (max 100 characters)")
+    if not str(num_questions).isdigit():
+        raise InvalidField("Number of questions must be an integer")
+
+    num_questions = int(num_questions)
+    if num_questions < 3 or num_questions > 30:
+        raise InvalidField("Number of questions must be between 3 and 30")
+    if not isinstance(question_types, list) or not all(
+        isinstance(question_type, str) for question_type in question_types
+    ):
+        raise InvalidField("Question types must be a list of strings")
+    if not (set(question_types) <= set(question_type_options)):
+        raise InvalidField(
+            "Invalid question types. Must be one of: 'multi-choice', 'fill-gaps', 'short-answer'"
+        )
+    if len(question_types) == 0:
+        raise InvalidField("Must select at least one question type")
+
+    return num_questions